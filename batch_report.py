@@ -0,0 +1,73 @@
+# --- Отчет пакетной проверки (iptv_checker.py --batch) ---
+# Каждый результат превращается в плоскую запись и сразу пишется в поток (NDJSON или CSV)
+# со сбросом буфера, поэтому отчет можно читать, пока проверка еще идет, а память не зависит
+# от длины плейлиста. BatchSummary считает итоги по исходам и долю неудачных проверок.
+import csv
+import json
+from typing import Any, Dict, IO, List, Optional
+
+from m3u_parser import ChannelInfo, DEFAULT_CHANNEL_NAME, DEFAULT_GROUP
+from stream_probe import CheckOutcome
+
+OUTPUT_FORMATS = ('ndjson', 'csv')
+RESULT_FIELDS = ['playlist', 'number', 'name', 'group', 'url', 'outcome', 'status_code', 'latency_ms', 'kind', 'now_playing', 'details']
+SKIPPED_OUTCOMES = ('not_http',) # Такие ссылки не проверяются по HTTP и не входят в долю неудачных
+
+ResultRecord = Dict[str, Any]
+
+
+def result_record(playlist: str, channel: ChannelInfo, result: CheckOutcome, now_playing: Optional[str] = None) -> ResultRecord:
+    return {'playlist': playlist, 'number': channel.get('number'), 'name': channel.get('tvg_name') or channel.get('name', DEFAULT_CHANNEL_NAME),
+            'group': channel.get('group', DEFAULT_GROUP), 'url': channel.get('url'), 'outcome': result.get('outcome'),
+            'status_code': result.get('status_code'), 'latency_ms': result.get('latency_ms'), 'kind': result.get('kind'),
+            'now_playing': now_playing, 'details': result.get('details') or None}
+
+
+class NdjsonWriter:
+    """Одна JSON-запись на строку."""
+
+    def __init__(self, stream: IO[str]):
+        self.stream = stream
+
+    def write(self, record: ResultRecord) -> None:
+        self.stream.write(json.dumps(record, ensure_ascii=False) + "\n"); self.stream.flush()
+
+
+class CsvWriter:
+    """CSV с заголовком RESULT_FIELDS; details - JSON в одной ячейке, пустые значения - пустые ячейки."""
+
+    def __init__(self, stream: IO[str]):
+        self.stream = stream; self.writer = csv.DictWriter(stream, fieldnames=RESULT_FIELDS, extrasaction='ignore')
+        self.writer.writeheader(); stream.flush()
+
+    def write(self, record: ResultRecord) -> None:
+        details = record.get('details')
+        self.writer.writerow(dict(record, details=json.dumps(details, ensure_ascii=False) if details else None)); self.stream.flush()
+
+
+def make_result_writer(output_format: str, stream: IO[str]):
+    if output_format == 'csv': return CsvWriter(stream)
+    if output_format == 'ndjson': return NdjsonWriter(stream)
+    raise ValueError(f"Неизвестный формат отчета: {output_format}")
+
+
+class BatchSummary:
+    """Итоги прохода: число каналов по исходам, проверенные/неудачные/пропущенные."""
+
+    def __init__(self):
+        self.outcomes: Dict[str, int] = {}; self.checked = 0; self.failed = 0; self.skipped = 0
+
+    def add(self, result: CheckOutcome) -> None:
+        outcome = result.get('outcome') or 'unknown'; self.outcomes[outcome] = self.outcomes.get(outcome, 0) + 1
+        if outcome in SKIPPED_OUTCOMES: self.skipped += 1; return
+        self.checked += 1
+        if outcome != 'ok': self.failed += 1
+
+    @property
+    def failure_rate(self) -> float:
+        return self.failed / self.checked if self.checked else 0.0
+
+    def lines(self) -> List[str]:
+        breakdown = ", ".join(f"{outcome}: {count}" for outcome, count in sorted(self.outcomes.items(), key=lambda item: -item[1]))
+        return [f"Каналов: {self.checked + self.skipped}, проверено: {self.checked}, неудачных: {self.failed} ({self.failure_rate:.1%}), не HTTP: {self.skipped}.",
+                f"По исходам: {breakdown or 'нет'}."]
@@ -0,0 +1,67 @@
+# --- Бенчмарк индекса каналов ---
+# Сравнивает прежний фильтр/поиск (проход по всем каналам с lower() на каждый запрос, sorted(set(...))
+# для групп, линейный поиск по номеру) с ChannelIndex на синтетическом списке.
+# Запуск из корня репозитория: python benchmarks/bench_channel_index.py [--channels 100000]
+import argparse
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from channel_index import ChannelIndex
+
+WORDS = ["Первый", "Россия", "Спорт", "Кино", "Новости", "Music", "News", "Sport", "Kids", "Drama", "Discovery", "History", "Матч", "Юмор", "Travel"]
+
+
+def make_channels(count, seed=1):
+    rnd = random.Random(seed)
+    return [{'number': i + 1, 'name': f"{rnd.choice(WORDS)} {rnd.choice(WORDS)} {i}", 'group': f"Группа {rnd.randrange(60)}"} for i in range(count)]
+
+
+def legacy_query(channels, filter_group=None, search_term=None):
+    result = []
+    for i, channel in enumerate(channels):
+        name = channel.get('tvg_name') or channel.get('name', 'Без имени'); group = channel.get('group', 'Без группы')
+        if filter_group and group != filter_group: continue
+        if search_term and search_term.lower() not in name.lower(): continue
+        result.append(i)
+    return result
+
+
+def legacy_position(channels, number):
+    for i, channel in enumerate(channels):
+        if channel.get('number') == number: return i
+    return None
+
+
+def measure(label, func, repeats):
+    best = None
+    for _ in range(repeats):
+        start = time.perf_counter(); result = func(); elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    size = len(result) if isinstance(result, list) else result
+    print(f"{label:<44} {best * 1000:9.3f} мс  (результат: {size})")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Бенчмарк индекса каналов")
+    parser.add_argument('--channels', type=int, default=100_000); parser.add_argument('--repeats', type=int, default=5)
+    args = parser.parse_args()
+    channels = make_channels(args.channels)
+    start = time.perf_counter(); index = ChannelIndex(channels); print(f"{args.channels} каналов, построение индекса: {(time.perf_counter() - start) * 1000:.0f} мс")
+    number = args.channels * 3 // 4
+
+    for term, group in (("дискав", None), ("Travel 12", None), ("спорт", "Группа 7"), ("12345", None), (None, "Группа 7")):
+        assert legacy_query(channels, group, term) == index.query(group, term), (term, group)
+        label = f"поиск {term!r}" + (f" в {group!r}" if group else "") if term else f"группа {group!r}"
+        measure(f"прежний: {label}", lambda: legacy_query(channels, group, term), args.repeats)
+        measure(f"индекс:  {label}", lambda: index.query(group, term), args.repeats)
+    measure("прежний: список групп", lambda: sorted(set(ch.get('group', 'Без группы') for ch in channels)), args.repeats)
+    measure("индекс:  список групп", index.groups, args.repeats)
+    measure(f"прежний: канал #{number}", lambda: legacy_position(channels, number), args.repeats)
+    measure(f"индекс:  канал #{number}", lambda: index.position_of(number), args.repeats)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,79 @@
+# --- Бенчмарк пула соединений по хостам ---
+# Поднимает несколько локальных HTTP/1.1 серверов (по одному на "хост", разные порты) и проверяет
+# на них синтетический плейлист двумя способами: как раньше (requests.head - новое соединение на каждый
+# канал, без лимита на хост) и через HostPool (keep-alive по хостам + max_per_host в движке).
+# Установка соединения имитируется задержкой при его открытии (--connect-delay-ms ~ TCP+TLS).
+# Запуск из корня репозитория: python benchmarks/bench_host_pool.py [--hosts 8 --channels 800]
+import argparse
+import http.server
+import os
+import sys
+import threading
+import time
+
+import requests
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from check_engine import CheckEngine, iter_check_results
+from host_pool import HostPool
+from stream_probe import check_stream
+
+
+class HostStandIn:
+    """Один "хост": сервер с keep-alive, счетчиком соединений и пиком одновременных запросов."""
+
+    def __init__(self, connect_delay: float, latency: float):
+        stand_in = self; self.lock = threading.Lock(); self.connections = 0; self.active = 0; self.peak = 0
+
+        class Handler(http.server.BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def setup(self):
+                super().setup(); time.sleep(connect_delay)
+                with stand_in.lock: stand_in.connections += 1
+
+            def do_HEAD(self):
+                with stand_in.lock: stand_in.active += 1; stand_in.peak = max(stand_in.peak, stand_in.active)
+                time.sleep(latency)
+                self.send_response(200); self.send_header("Content-Length", "0"); self.end_headers()
+                with stand_in.lock: stand_in.active -= 1
+
+            def log_message(self, *args): pass
+
+        self.server = http.server.ThreadingHTTPServer(('127.0.0.1', 0), Handler); self.server.daemon_threads = True
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        self.port = self.server.server_address[1]
+
+    def reset(self):
+        with self.lock: self.connections = 0; self.peak = 0
+
+
+def run_pass(label, hosts, urls, check_func, concurrency, max_per_host=None):
+    for host in hosts: host.reset()
+    engine = CheckEngine(check_func, concurrency, None, max_per_host=max_per_host)
+    start = time.perf_counter(); results = list(iter_check_results(((i, url) for i, url in enumerate(urls)), check_func, engine=engine))
+    elapsed = time.perf_counter() - start
+    ok = sum(1 for _, result in results if result == 200 or (isinstance(result, dict) and result.get('outcome') == 'ok'))
+    print(f"{label:<34} {elapsed:7.2f} с  OK {ok}/{len(urls)}  соединений {sum(h.connections for h in hosts):5d}  "
+          f"пик на хост {max(h.peak for h in hosts):3d}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Бенчмарк пула соединений по хостам")
+    parser.add_argument('--hosts', type=int, default=8); parser.add_argument('--channels', type=int, default=800)
+    parser.add_argument('--concurrency', type=int, default=32); parser.add_argument('--max-per-host', type=int, default=4)
+    parser.add_argument('--connect-delay-ms', type=float, default=30); parser.add_argument('--latency-ms', type=float, default=5)
+    args = parser.parse_args()
+    hosts = [HostStandIn(args.connect_delay_ms / 1000, args.latency_ms / 1000) for _ in range(args.hosts)]
+    urls = [f"http://127.0.0.1:{hosts[i * args.hosts // args.channels].port}/live/{i}.m3u8" for i in range(args.channels)] # Каналы одного CDN идут подряд, как в плейлистах
+    print(f"{args.channels} каналов на {args.hosts} хостах, {args.concurrency} потоков, открытие соединения {args.connect_delay_ms:.0f} мс, ответ {args.latency_ms:.0f} мс")
+
+    run_pass("requests.head (как раньше)", hosts, urls, lambda url: requests.head(url, timeout=10).status_code, args.concurrency)
+    pool = HostPool(args.max_per_host)
+    run_pass(f"HostPool, до {args.max_per_host} на хост", hosts, urls, lambda url: check_stream(url, timeout=10, pool=pool), args.concurrency, args.max_per_host)
+    totals = pool.totals()
+    print(f"  пул: запросов {totals['requests']}, новых соединений {totals['connections']}, переиспользовано {totals['reused']}, ожиданий {totals['waits']}")
+
+
+if __name__ == "__main__":
+    main()
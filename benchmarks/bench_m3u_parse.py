@@ -0,0 +1,88 @@
+# --- Микробенчмарк парсера M3U ---
+# Сравнивает общий потоковый парсер (m3u_parser) с прежней реализацией parse_m3u
+# (четыре re.search на каждую строку #EXTINF, весь список в памяти) на синтетическом плейлисте.
+# Запуск из корня репозитория: python benchmarks/bench_m3u_parse.py [--entries 200000]
+import argparse
+import os
+import re
+import sys
+import tempfile
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from m3u_parser import iter_m3u_channels, read_m3u
+
+
+def legacy_parse_m3u(filepath):
+    """Прежний parse_m3u из iptv_checker.py (без вывода ошибок) - точка отсчета."""
+    channels = []; current_channel_info = {}; epg_url = None
+    with open(filepath, 'r', encoding='utf-8') as f:
+        for line in f:
+            line = line.strip();
+            if not line: continue
+            if line.startswith('#EXTM3U'):
+                match = re.search(r'url-tvg="([^"]*)"', line);
+                if match: epg_url = match.group(1)
+                continue
+            elif line.startswith('#EXTINF:'):
+                parts = line.split(',', 1); info_part = parts[0]; name_part = parts[1] if len(parts) > 1 else "Без имени"
+                current_channel_info = {'name': name_part.strip()}
+                match = re.search(r'tvg-name="([^"]*)"', info_part); current_channel_info['tvg_name'] = match.group(1) if match else current_channel_info['name']
+                match = re.search(r'tvg-logo="([^"]*)"', info_part); current_channel_info['logo'] = match.group(1) if match else None
+                match = re.search(r'group-title="([^"]*)"', info_part); current_channel_info['group'] = match.group(1) if match else "Без группы"
+                match = re.search(r'tvg-id="([^"]*)"', info_part); current_channel_info['id'] = match.group(1) if match else None
+                current_channel_info['_waiting_for_url'] = True
+            elif not line.startswith('#') and current_channel_info.get('_waiting_for_url'):
+                current_channel_info['url'] = line; del current_channel_info['_waiting_for_url']
+                current_channel_info['number'] = len(channels) + 1
+                channels.append(current_channel_info); current_channel_info = {}
+    return epg_url, channels
+
+
+def write_playlist(filepath, entries):
+    with open(filepath, 'w', encoding='utf-8') as f:
+        f.write('#EXTM3U url-tvg="http://example.com/epg.xml.gz"\n')
+        for i in range(entries):
+            f.write(f'#EXTINF:-1 tvg-id="ch{i}.example" tvg-name="Канал {i}" tvg-logo="http://example.com/logo/{i}.png" group-title="Группа {i % 50}",Канал {i} HD\n')
+            if i % 10 == 0: f.write('#EXTVLCOPT:http-user-agent=Mozilla/5.0\n')
+            f.write(f'http://stream{i % 200}.example.com/live/{i}/index.m3u8\n')
+
+
+def measure(label, func, repeats):
+    best = None
+    for _ in range(repeats):
+        start = time.perf_counter(); count = func(); elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    tracemalloc.start(); func(); _, peak = tracemalloc.get_traced_memory(); tracemalloc.stop()
+    print(f"{label:<32} {best * 1000:9.1f} мс  {count / best / 1000:8.0f} тыс. кан./с  пик памяти {peak / (1024 * 1024):7.1f} MB")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Бенчмарк парсера M3U")
+    parser.add_argument('--entries', type=int, default=200_000); parser.add_argument('--repeats', type=int, default=3)
+    args = parser.parse_args()
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        filepath = os.path.join(tmp_dir, 'bench.m3u'); write_playlist(filepath, args.entries)
+        size_mb = os.path.getsize(filepath) / (1024 * 1024); print(f"Плейлист: {args.entries} каналов, {size_mb:.1f} MB")
+
+        def read_raw():
+            with open(filepath, 'rb') as f:
+                while f.read(1024 * 1024): pass
+            return args.entries
+
+        def stream_only():
+            with open(filepath, 'r', encoding='utf-8-sig') as f: return sum(1 for _ in iter_m3u_channels(f))
+
+        legacy_channels = legacy_parse_m3u(filepath)[1]; new_channels = read_m3u(filepath)[1]
+        assert len(legacy_channels) == len(new_channels)
+        assert all(old[key] == new[key] for old, new in zip(legacy_channels, new_channels) for key in ('name', 'tvg_name', 'logo', 'group', 'id', 'url'))
+
+        measure("чтение файла (предел)", read_raw, args.repeats)
+        measure("прежний parse_m3u (список)", lambda: len(legacy_parse_m3u(filepath)[1]), args.repeats)
+        measure("read_m3u (список)", lambda: len(read_m3u(filepath)[1]), args.repeats)
+        measure("iter_m3u_channels (генератор)", stream_only, args.repeats)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,144 @@
+# --- Кеш списка каналов (channels.json) и его синхронизация с channels.m3u ---
+# В JSON вместе с каналами хранятся URL EPG, атрибуты заголовка #EXTM3U и "отпечатки" плейлистов (размер, mtime, sha256).
+# Плейлистов может быть несколько: они читаются по порядку и сводятся в один список с общей нумерацией.
+# При запуске неизмененный плейлист не парсится вовсе, а измененный сливается с кешем
+# по стабильному ключу канала: ручные правки URL (пункт 5 меню) сохраняются.
+# Статусы привязаны к URL (см. status_store), поэтому для неизмененных URL они остаются.
+import hashlib
+import json
+import os
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple, Union
+
+from m3u_parser import epg_url_from_header
+
+CACHE_FORMAT_VERSION = 2
+PLAYLIST_FIELDS = ('name', 'tvg_name', 'logo', 'group', 'id', 'vlc_opts', 'attributes', 'extinf') # Поля канала, которые берутся из плейлиста (кроме URL)
+
+ChannelInfo = Dict[str, Any]
+ChannelCacheData = Dict[str, Any] # {'channels': [...], 'epg_url': str | None, 'm3u_header': {атрибуты #EXTM3U} | None, 'source': {'files': [отпечатки плейлистов]} | None}
+PlaylistSource = Dict[str, Any] # {'path', 'size', 'mtime', 'sha256'}
+SyncStats = Dict[str, Any]
+ParseFunc = Callable[[str], Tuple[Dict[str, str], List[ChannelInfo]]] # Путь -> (атрибуты #EXTM3U, каналы)
+
+
+def load_channel_cache(filepath: str) -> Optional[ChannelCacheData]:
+    """Читает channels.json. Старый формат (просто список каналов) тоже понимается - с source = None.
+    None - файла нет; ValueError / json.JSONDecodeError - файл битый."""
+    if not os.path.exists(filepath): return None
+    with open(filepath, 'r', encoding='utf-8') as f: raw = json.load(f)
+    if isinstance(raw, list): data = {'channels': raw, 'epg_url': None, 'm3u_header': None, 'source': None}
+    elif isinstance(raw, dict) and isinstance(raw.get('channels'), list): data = {'channels': raw['channels'], 'epg_url': raw.get('epg_url'), 'm3u_header': raw.get('m3u_header'), 'source': raw.get('source')}
+    else: raise ValueError("неверная структура")
+    if not all(isinstance(ch, dict) for ch in data['channels']): raise ValueError("неверная структура каналов")
+    for i, ch in enumerate(data['channels']): ch.setdefault('number', i + 1)
+    return data
+
+
+def save_channel_cache(data: ChannelCacheData, filepath: str) -> None:
+    """Атомарно записывает channels.json (через временный файл). Ошибки записи пробрасываются."""
+    payload = {'version': CACHE_FORMAT_VERSION, 'epg_url': data.get('epg_url'), 'm3u_header': data.get('m3u_header'), 'source': data.get('source'), 'channels': data['channels']}
+    tmp_path = filepath + '.tmp'
+    with open(tmp_path, 'w', encoding='utf-8') as f: json.dump(payload, f, ensure_ascii=False, indent=2)
+    os.replace(tmp_path, filepath)
+
+
+def playlist_stat(filepath: str) -> Optional[PlaylistSource]:
+    try: stat = os.stat(filepath)
+    except OSError: return None
+    return {'path': filepath, 'size': stat.st_size, 'mtime': stat.st_mtime_ns, 'sha256': None}
+
+
+def _cached_files(cached_source: Optional[Dict[str, Any]], m3u_paths: Sequence[str]) -> Optional[List[PlaylistSource]]:
+    if not cached_source: return None
+    if 'files' in cached_source: return cached_source['files']
+    return [dict(cached_source, path=m3u_paths[0])] # Отпечаток одного плейлиста без списка файлов
+
+
+def file_sha256(filepath: str) -> str:
+    digest = hashlib.sha256()
+    with open(filepath, 'rb') as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b''): digest.update(chunk)
+    return digest.hexdigest()
+
+
+def assign_channel_keys(channels: List[ChannelInfo]) -> None:
+    """Стабильный ключ канала: tvg-id, иначе группа + название. Повторы нумеруются по порядку (#2, #3...)."""
+    seen: Dict[str, int] = {}
+    for ch in channels:
+        base = f"id:{ch['id']}" if ch.get('id') else f"name:{ch.get('group') or ''}/{ch.get('tvg_name') or ch.get('name') or ''}"
+        count = seen[base] = seen.get(base, 0) + 1
+        ch['key'] = base if count == 1 else f"{base}#{count}"
+
+
+def set_channel_url(channel: ChannelInfo, new_url: str) -> None:
+    """Ручная замена URL: исходный URL из плейлиста запоминается в 'm3u_url', чтобы правка пережила слияние."""
+    if channel.get('m3u_url') is None: channel['m3u_url'] = channel.get('url')
+    channel['url'] = new_url
+    if channel['url'] == channel['m3u_url']: del channel['m3u_url'] # Вернули как было - это уже не правка
+
+
+def merge_channels(cached: List[ChannelInfo], parsed: List[ChannelInfo], legacy: bool = False) -> Tuple[List[ChannelInfo], SyncStats]:
+    """Сливает заново разобранный плейлист с кешем по ключу канала. Порядок и номера - как в плейлисте.
+
+    Ручная правка URL сохраняется, пока в плейлисте для канала тот же URL, что был при правке;
+    если URL поменяли в самом плейлисте - берется новый. В старом кеше (legacy) правки не помечены,
+    поэтому любой отличающийся URL из JSON считается правкой (как и раньше, JSON побеждает)."""
+    if any('key' not in ch for ch in cached): assign_channel_keys(cached)
+    old_by_key = {ch['key']: ch for ch in cached}; new_keys = set()
+    stats: SyncStats = {'added': 0, 'removed': 0, 'changed': 0, 'unchanged': 0, 'kept_overrides': 0}
+    for ch in parsed:
+        new_keys.add(ch['key']); old = old_by_key.get(ch['key'])
+        if old is None: stats['added'] += 1; continue
+        old_source_url = old.get('m3u_url') if old.get('m3u_url') is not None else old.get('url')
+        if old.get('url') != ch.get('url') and (old.get('m3u_url') == ch.get('url') or (legacy and old.get('m3u_url') is None)):
+            ch['m3u_url'] = ch.get('url'); ch['url'] = old.get('url'); stats['kept_overrides'] += 1
+            if old.get('m3u_url') is None: old_source_url = ch['m3u_url'] # legacy: исходный URL неизвестен
+        if old_source_url != ch.get('m3u_url', ch.get('url')) or any(old.get(field) != ch.get(field) for field in PLAYLIST_FIELDS): stats['changed'] += 1
+        else: stats['unchanged'] += 1
+    stats['removed'] = sum(1 for key in old_by_key if key not in new_keys)
+    return parsed, stats
+
+
+def read_playlists(m3u_paths: Sequence[str], parse_func: ParseFunc) -> Tuple[Dict[str, str], List[ChannelInfo]]:
+    """Читает плейлисты по порядку в один список с общей нумерацией. Атрибуты #EXTM3U сводятся в один заголовок:
+    при повторе берется значение из первого плейлиста, где атрибут указан. При нескольких плейлистах
+    у канала запоминается имя файла ('playlist')."""
+    header: Dict[str, str] = {}; channels: List[ChannelInfo] = []
+    for path in m3u_paths:
+        playlist_header, playlist_channels = parse_func(path)
+        for key, value in playlist_header.items(): header.setdefault(key, value)
+        for ch in playlist_channels:
+            ch['number'] = len(channels) + 1
+            if len(m3u_paths) > 1: ch['playlist'] = os.path.basename(path)
+            channels.append(ch)
+    return header, channels
+
+
+def sync_channel_cache(cached: Optional[ChannelCacheData], m3u_paths: Union[str, Sequence[str]], parse_func: ParseFunc) -> Tuple[Optional[ChannelCacheData], SyncStats]:
+    """Сверяет кеш с плейлистом (или несколькими) и при необходимости перечитывает их.
+
+    stats['action']: 'no_playlist' - ни одного плейлиста нет, используется кеш как есть; 'unchanged' - размеры и mtime
+    совпали, плейлисты не читались; 'touched' - изменился только mtime (хеши те же); 'parsed' - кеша не было;
+    'merged' - плейлисты изменились и слиты с кешем (плюс счетчики merge_channels); 'parse_failed' - каналов не найдено.
+    stats['dirty'] - кеш нужно сохранить. Отсутствующие файлы из нескольких пропускаются."""
+    m3u_paths = [m3u_paths] if isinstance(m3u_paths, str) else list(m3u_paths)
+    files = [stat for stat in map(playlist_stat, m3u_paths) if stat is not None]
+    cached_files = _cached_files(cached.get('source') if cached else None, m3u_paths)
+    if not files: return cached, {'action': 'no_playlist', 'dirty': False}
+    same_paths = cached_files is not None and [f.get('path') for f in cached_files] == [f['path'] for f in files]
+    if same_paths and all(old.get('size') == new['size'] and old.get('mtime') == new['mtime'] for old, new in zip(cached_files, files)):
+        return cached, {'action': 'unchanged', 'dirty': False}
+    for stat in files: stat['sha256'] = file_sha256(stat['path'])
+    source = {'files': files}
+    if same_paths and all(old.get('sha256') == new['sha256'] for old, new in zip(cached_files, files)):
+        cached['source'] = source
+        return cached, {'action': 'touched', 'dirty': True}
+
+    header, parsed = read_playlists([stat['path'] for stat in files], parse_func)
+    if not parsed: return cached, {'action': 'parse_failed', 'dirty': False}
+    assign_channel_keys(parsed)
+    data = {'epg_url': epg_url_from_header(header), 'm3u_header': header, 'source': source}
+    if cached is None: return dict(data, channels=parsed), {'action': 'parsed', 'dirty': True, 'added': len(parsed)}
+    channels, stats = merge_channels(cached['channels'], parsed, legacy=cached_files is None)
+    stats.update(action='merged', dirty=True)
+    return dict(data, channels=channels), stats
@@ -0,0 +1,85 @@
+# --- Индекс списка каналов для поиска, фильтра по группе и перехода по номеру ---
+# Строится один раз после загрузки (и заново после слияния плейлиста), поэтому меню и GUI не сканируют
+# весь список на каждый запрос. URL не индексируется - замена URL канала индекс не меняет.
+# Поиск по названию - по триграммам casefold-названий: запрос берется из самого редкого своего
+# фрагмента с проверкой подстроки. Запросы из 1-2 символов при первом обращении находятся проходом
+# по названиям и запоминаются. Индексы хранят позиции каналов в списке (по возрастанию).
+from array import array
+from typing import Dict, Iterable, List, Optional, Sequence
+
+from m3u_parser import ChannelInfo, DEFAULT_CHANNEL_NAME, DEFAULT_GROUP
+
+GRAM_SIZE = 3 # Длина n-грамм в индексе; более короткие запросы кешируются отдельно
+
+
+def channel_title(channel: ChannelInfo) -> str:
+    """Название канала, по которому ищут и которое показывают (tvg-name, иначе имя)."""
+    return channel.get('tvg_name') or channel.get('name', DEFAULT_CHANNEL_NAME)
+
+
+def channel_group(channel: ChannelInfo) -> str:
+    return channel.get('group', DEFAULT_GROUP)
+
+
+def _grams(text: str) -> set:
+    return {text[start:start + GRAM_SIZE] for start in range(len(text) - GRAM_SIZE + 1)}
+
+
+class ChannelIndex:
+    """Триграммы названий, группа -> позиции, номер канала -> позиция."""
+
+    def __init__(self, channels: Sequence[ChannelInfo] = ()):
+        self.rebuild(channels)
+
+    def rebuild(self, channels: Sequence[ChannelInfo]) -> None:
+        """Полная перестройка (после загрузки или слияния плейлиста)."""
+        self.channels = channels; self._titles: List[str] = []; self._groups_of: List[str] = []
+        self._positions: Dict[int, int] = {}; self._short: Dict[str, array] = {}; self._sorted_groups: Optional[List[str]] = None
+        grams: Dict[str, List[int]] = {}; groups: Dict[str, List[int]] = {} # Позиции идут по возрастанию
+        for position, channel in enumerate(channels):
+            title = channel_title(channel).casefold(); group = channel_group(channel)
+            self._titles.append(title); self._groups_of.append(group)
+            for gram in _grams(title):
+                postings = grams.get(gram)
+                if postings is None: grams[gram] = [position]
+                else: postings.append(position)
+            groups.setdefault(group, []).append(position)
+            self._positions[channel.get('number', position + 1)] = position
+        self._grams: Dict[str, array] = {gram: array('i', postings) for gram, postings in grams.items()}
+        self._groups: Dict[str, array] = {group: array('i', postings) for group, postings in groups.items()}
+
+    def position_of(self, number: int) -> Optional[int]:
+        """Позиция канала в списке по его номеру (или None)."""
+        return self._positions.get(number)
+
+    def groups(self) -> List[str]:
+        """Группы по алфавиту (кешируется до rebuild)."""
+        if self._sorted_groups is None: self._sorted_groups = sorted(self._groups)
+        return self._sorted_groups
+
+    def search(self, term: str) -> List[int]:
+        """Позиции каналов, в названии которых есть term (без учета регистра)."""
+        term = term.casefold(); titles = self._titles
+        if not term: return list(range(len(titles)))
+        if len(term) < GRAM_SIZE:
+            postings = self._short.get(term)
+            if postings is None: postings = self._short[term] = array('i', (position for position, title in enumerate(titles) if term in title))
+            return list(postings)
+        if len(term) == GRAM_SIZE: return list(self._grams.get(term, ()))
+        candidates = min((self._grams.get(term[start:start + GRAM_SIZE], ()) for start in range(len(term) - GRAM_SIZE + 1)), key=len)
+        return [position for position in candidates if term in titles[position]]
+
+    def query(self, group: Optional[str] = None, term: Optional[str] = None) -> List[int]:
+        """Позиции каналов с учетом фильтра по группе и поиска по названию."""
+        if term:
+            if group is None: return self.search(term)
+            members = self._groups.get(group, ()); folded = term.casefold(); titles = self._titles
+            if len(folded) >= GRAM_SIZE: # Проверяем подстроку по меньшему из двух списков кандидатов
+                candidates = min((self._grams.get(folded[start:start + GRAM_SIZE], ()) for start in range(len(folded) - GRAM_SIZE + 1)), key=len)
+                if len(candidates) < len(members): groups_of = self._groups_of; return [position for position in candidates if groups_of[position] == group and folded in titles[position]]
+            return [position for position in members if folded in titles[position]]
+        if group is not None: return list(self._groups.get(group, ()))
+        return list(range(len(self._titles)))
+
+    def channels_at(self, positions: Iterable[int]) -> List[ChannelInfo]:
+        return [self.channels[position] for position in positions]
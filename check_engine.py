@@ -0,0 +1,146 @@
+# --- Асинхронный движок проверки доступности каналов ---
+# Используется и консольной версией (iptv_checker.py), и GUI (gui_app.py).
+# Сама функция проверки остается блокирующей (requests), движок лишь
+# ограничивает число одновременных запросов и отдает результаты по мере готовности.
+# С coalesce_key одинаковые задания (один и тот же поток у нескольких каналов)
+# проверяются один раз за проход, а результат раздается всем каналам.
+# С max_per_host задания к занятому хосту откладываются, и рабочие потоки берут другие хосты.
+import asyncio
+import queue
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, AsyncIterator, Callable, Deque, Dict, Hashable, Iterable, Iterator, List, Optional, Tuple, Union
+
+from host_pool import host_key
+
+DEFAULT_MAX_CONCURRENCY = 32 # Глобальный лимит одновременных проверок
+MAX_DEFERRED_PER_WORKER = 16 # Сколько заданий на поток можно отложить до освобождения хостов (дальше jobs не читаются)
+
+# --- Структуры данных ---
+RequestHeaders = Dict[str, str]
+CheckJob = Union[Tuple[Any, Optional[str]], Tuple[Any, Optional[str], Optional[RequestHeaders]]] # (ключ канала, URL[, заголовки канала])
+CheckResult = Tuple[Any, Any] # (ключ канала, результат функции проверки)
+CheckFunc = Callable[..., Any] # check_func(url) или check_func(url, headers=...), если у задания есть заголовки
+CoalesceKeyFunc = Callable[[str, Optional[RequestHeaders]], Hashable] # Задания с равным ключом - один запрос
+HostKeyFunc = Callable[[Optional[str]], str] # Хост задания для лимита max_per_host ('' - без лимита)
+
+_DONE = object() # Маркер конца потока результатов
+
+
+class CheckEngine:
+    """Проверяет каналы параллельно с ограничением конкурентности и отдает результаты по мере завершения."""
+
+    def __init__(self, check_func: CheckFunc, max_concurrency: int = DEFAULT_MAX_CONCURRENCY, error_result: Any = None,
+                 coalesce_key: Optional[CoalesceKeyFunc] = None, max_per_host: Optional[int] = None, host_key_func: HostKeyFunc = host_key,
+                 max_remembered: Optional[int] = None):
+        self.check_func = check_func
+        self.max_concurrency = max(1, int(max_concurrency))
+        self.error_result = error_result # Результат, если check_func упала с исключением
+        self.coalesce_key = coalesce_key
+        self.max_per_host = max(1, int(max_per_host)) if max_per_host else None; self.host_key_func = host_key_func
+        self.max_remembered = max(1, int(max_remembered)) if max_remembered else None # Сколько готовых результатов помнить для coalesce_key (None - весь проход)
+        self.requests_made = 0; self.requests_saved = 0 # Счетчики последнего прохода: запущено проверок / отдано без запроса
+        self._cancel_event = threading.Event()
+
+    @property
+    def cancelled(self) -> bool:
+        return self._cancel_event.is_set()
+
+    def cancel(self) -> None:
+        """Останавливает выдачу новых заданий. Уже начатые запросы доработают до своего таймаута."""
+        self._cancel_event.set()
+
+    def _run_job(self, key: Any, url: Optional[str], headers: Optional[RequestHeaders] = None) -> CheckResult:
+        try: return key, self.check_func(url) if headers is None else self.check_func(url, headers=headers)
+        except Exception: return key, self.error_result
+
+    async def iter_results(self, jobs: Iterable[CheckJob]) -> AsyncIterator[CheckResult]:
+        """Асинхронный генератор (ключ, результат). Задания берутся из jobs лениво, в работе не больше max_concurrency.
+        Дубликаты по coalesce_key не запускаются: они ждут уже идущую проверку или сразу получают готовый результат.
+        При max_per_host задание к хосту, у которого уже столько проверок в работе, ждет в очереди этого хоста;
+        отложенных заданий не больше MAX_DEFERRED_PER_WORKER на поток, так что память не растет с длиной jobs."""
+        loop = asyncio.get_running_loop()
+        jobs_iter = iter(jobs); pending: set = set(); self.requests_made = 0; self.requests_saved = 0
+        waiters: Dict[Hashable, List[Any]] = {} # Ключ запроса -> ключи каналов, ждущих его результата
+        finished: Dict[Hashable, Any] = {} # Готовые результаты этого прохода
+        ready: List[CheckResult] = []; request_keys: Dict[Any, Optional[Hashable]] = {} # future -> ключ запроса
+        active_hosts: Dict[str, int] = {}; deferred: Dict[str, Deque[Tuple[Any, ...]]] = {} # Хост -> проверок в работе / отложенные задания
+        released: Deque[Tuple[Any, ...]] = deque() # Отложенные задания, чей хост освободился
+        future_hosts: Dict[Any, str] = {}; deferred_limit = self.max_concurrency * MAX_DEFERRED_PER_WORKER; deferred_count = 0
+        executor = ThreadPoolExecutor(max_workers=self.max_concurrency, thread_name_prefix="iptv-check")
+
+        def start(key: Any, url: Optional[str], headers: Optional[RequestHeaders], request_key: Optional[Hashable]) -> None:
+            nonlocal deferred_count
+            host = self.host_key_func(url) if self.max_per_host else ''
+            if host and active_hosts.get(host, 0) >= self.max_per_host:
+                deferred.setdefault(host, deque()).append((key, url, headers, request_key)); deferred_count += 1; return
+            if host: active_hosts[host] = active_hosts.get(host, 0) + 1
+            future = loop.run_in_executor(executor, self._run_job, key, url, headers); request_keys[future] = request_key; future_hosts[future] = host
+            pending.add(future); self.requests_made += 1
+
+        def fill() -> None:
+            while len(pending) < self.max_concurrency and not self.cancelled:
+                if released: start(*released.popleft()); continue
+                if deferred_count >= deferred_limit: return # Все потоки заняты хостами с очередью - не читаем jobs дальше
+                try: key, url, *extra = next(jobs_iter)
+                except StopIteration: return
+                headers = extra[0] if extra else None
+                request_key = self.coalesce_key(url, headers) if self.coalesce_key is not None and url else None
+                if request_key is not None:
+                    if request_key in finished: self.requests_saved += 1; ready.append((key, finished[request_key])); continue
+                    if request_key in waiters: self.requests_saved += 1; waiters[request_key].append(key); continue
+                    waiters[request_key] = [key]
+                start(key, url, headers, request_key)
+
+        def release_host(host: str) -> None:
+            nonlocal deferred_count
+            if not host: return
+            active_hosts[host] -= 1
+            queued = deferred.get(host)
+            if queued:
+                released.append(queued.popleft()); deferred_count -= 1
+                if not queued: del deferred[host]
+
+        try:
+            fill()
+            while pending or ready:
+                while ready: yield ready.pop()
+                if not pending: fill(); continue
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for future in done:
+                    key, result = future.result(); request_key = request_keys.pop(future); release_host(future_hosts.pop(future))
+                    if request_key is None: yield key, result; continue
+                    finished[request_key] = result
+                    if self.max_remembered and len(finished) > self.max_remembered: del finished[next(iter(finished))] # Забываем самый старый
+                    for waiting_key in waiters.pop(request_key): yield waiting_key, result
+                fill()
+        finally:
+            executor.shutdown(wait=False, cancel_futures=True)
+
+    async def run(self, jobs: Iterable[CheckJob], on_result: Callable[[Any, Any], None]) -> None:
+        """Прогоняет все задания, вызывая on_result(ключ, результат) для каждого готового."""
+        async for key, result in self.iter_results(jobs): on_result(key, result)
+
+
+def iter_check_results(jobs: Iterable[CheckJob], check_func: CheckFunc, max_concurrency: int = DEFAULT_MAX_CONCURRENCY,
+                       error_result: Any = None, engine: Optional[CheckEngine] = None, coalesce_key: Optional[CoalesceKeyFunc] = None,
+                       max_per_host: Optional[int] = None) -> Iterator[CheckResult]:
+    """Синхронная обертка: крутит цикл asyncio в фоновом потоке и выдает результаты по мере готовности."""
+    engine = engine or CheckEngine(check_func, max_concurrency, error_result, coalesce_key, max_per_host)
+    results_queue: "queue.Queue[Any]" = queue.Queue(); errors: list = []
+
+    def runner() -> None:
+        try: asyncio.run(engine.run(jobs, lambda key, result: results_queue.put((key, result))))
+        except Exception as e: errors.append(e)
+        finally: results_queue.put(_DONE)
+
+    thread = threading.Thread(target=runner, name="iptv-check-loop", daemon=True); thread.start()
+    try:
+        while True:
+            item = results_queue.get()
+            if item is _DONE: break
+            yield item
+    finally:
+        engine.cancel() # Если потребитель прервал итерацию - не запускаем новые проверки
+    if errors: raise errors[0]
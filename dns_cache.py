@@ -0,0 +1,129 @@
+# --- Кеш DNS для проверок каналов ---
+# Перед проходом уникальные хосты из списка каналов резолвятся параллельно, ответы хранятся
+# в памяти с TTL, и соединения проверок берут адрес из кеша, а не спрашивают резолвер заново.
+# Хост, который не резолвится, сразу получает статус "DNS" - без попытки TCP-соединения.
+# Резолвер подставляется (функция имя -> адреса), чтобы прогонять проверки без настоящего DNS.
+import ipaddress
+import socket
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, Iterable, List, Optional, Set, Tuple
+from urllib.parse import urlsplit
+
+from requests.adapters import HTTPAdapter
+from urllib3.connection import HTTPConnection, HTTPSConnection
+from urllib3.connectionpool import HTTPConnectionPool, HTTPSConnectionPool
+from urllib3.exceptions import ConnectTimeoutError, NewConnectionError
+from urllib3.util.connection import create_connection
+
+DNS_TTL_SECONDS = 300 # Сколько живет удачный ответ
+DNS_NEGATIVE_TTL_SECONDS = 60 # Сколько помним, что имя не резолвится
+DNS_PREFETCH_WORKERS = 16 # Параллельных запросов к резолверу при предварительном проходе
+
+Resolver = Callable[[str], List[str]] # Имя хоста -> адреса; ошибка - исключение (socket.gaierror и т.п.)
+DnsStats = Dict[str, Any]
+
+
+class DnsResolutionError(Exception):
+    """Имя хоста не резолвится (ответ может быть взят из кеша)."""
+
+
+def system_resolver(hostname: str) -> List[str]:
+    """Адреса хоста через системный резолвер (getaddrinfo), без повторов, в порядке ответа."""
+    addresses: List[str] = []
+    for *_, sockaddr in socket.getaddrinfo(hostname, None, type=socket.SOCK_STREAM):
+        if sockaddr[0] not in addresses: addresses.append(sockaddr[0])
+    return addresses
+
+
+def url_hostnames(urls: Iterable[Optional[str]]) -> Set[str]:
+    """Уникальные имена хостов HTTP(S)-ссылок (для предварительного прохода)."""
+    hostnames: Set[str] = set()
+    for url in urls:
+        if not url or not url.lower().startswith(('http://', 'https://')): continue
+        try: hostname = urlsplit(url).hostname
+        except ValueError: continue
+        if hostname: hostnames.add(hostname)
+    return hostnames
+
+
+def _is_ip_literal(hostname: str) -> bool:
+    try: ipaddress.ip_address(hostname.strip('[]')); return True
+    except ValueError: return False
+
+
+class DnsCache:
+    """Потокобезопасный кеш ответов резолвера с TTL (отдельный, более короткий TTL - для ошибок)."""
+
+    def __init__(self, resolver: Resolver = system_resolver, ttl_seconds: float = DNS_TTL_SECONDS,
+                 negative_ttl_seconds: float = DNS_NEGATIVE_TTL_SECONDS, clock: Callable[[], float] = time.monotonic):
+        self.resolver = resolver; self.ttl_seconds = ttl_seconds; self.negative_ttl_seconds = negative_ttl_seconds; self.clock = clock
+        self._lock = threading.Lock(); self._entries: Dict[str, Tuple[float, Optional[List[str]], Optional[str]]] = {} # имя -> (истекает, адреса, ошибка)
+        self.hits = 0; self.misses = 0
+
+    def _cached(self, hostname: str) -> Optional[Tuple[float, Optional[List[str]], Optional[str]]]:
+        with self._lock:
+            entry = self._entries.get(hostname)
+            if entry is None or entry[0] <= self.clock(): self.misses += 1; return None
+            self.hits += 1; return entry
+
+    def resolve(self, hostname: str) -> List[str]:
+        """Адреса хоста из кеша или от резолвера. DnsResolutionError - имя не резолвится."""
+        hostname = hostname.lower().rstrip('.')
+        if _is_ip_literal(hostname): return [hostname.strip('[]')]
+        entry = self._cached(hostname)
+        if entry is None:
+            try: addresses, error = self.resolver(hostname), None
+            except (OSError, UnicodeError, ValueError) as e: addresses, error = None, str(e) or type(e).__name__
+            if not addresses and error is None: error = "нет адресов"
+            ttl = self.ttl_seconds if error is None else self.negative_ttl_seconds
+            entry = (self.clock() + ttl, addresses or None, error)
+            with self._lock: self._entries[hostname] = entry
+        if entry[2] is not None: raise DnsResolutionError(f"{hostname}: {entry[2]}")
+        return entry[1]
+
+    def prefetch(self, hostnames: Iterable[str], max_workers: int = DNS_PREFETCH_WORKERS) -> DnsStats:
+        """Резолвит уникальные имена параллельно (уже закешированные не трогает).
+        Возвращает {'hosts', 'resolved', 'failed', 'seconds'}."""
+        unique = sorted({hostname.lower().rstrip('.') for hostname in hostnames if hostname})
+        started = time.monotonic(); failed = 0
+
+        def resolve_one(hostname: str) -> bool:
+            try: self.resolve(hostname); return True
+            except DnsResolutionError: return False
+
+        if unique:
+            with ThreadPoolExecutor(max_workers=max(1, min(max_workers, len(unique))), thread_name_prefix="iptv-dns") as executor:
+                failed = sum(1 for ok in executor.map(resolve_one, unique) if not ok)
+        return {'hosts': len(unique), 'resolved': len(unique) - failed, 'failed': failed, 'seconds': time.monotonic() - started}
+
+
+def _connection_class(base: type, dns_cache: DnsCache) -> type:
+    class CachedDnsConnection(base):
+        """Соединение, которое берет адрес хоста из DnsCache (имя для TLS/SNI и заголовка Host не меняется)."""
+
+        def _new_conn(self) -> socket.socket:
+            try: address = dns_cache.resolve(self.host)[0]
+            except DnsResolutionError: return super()._new_conn() # Пусть urllib3 сам сообщит об ошибке
+            try: return create_connection((address, self.port), self.timeout, source_address=self.source_address, socket_options=self.socket_options)
+            except socket.timeout as e: raise ConnectTimeoutError(self, f"Connection to {self.host} timed out. (connect timeout={self.timeout})") from e
+            except OSError as e: raise NewConnectionError(self, f"Failed to establish a new connection: {e}") from e
+
+    return CachedDnsConnection
+
+
+class DnsCachingAdapter(HTTPAdapter):
+    """HTTPAdapter, чьи пулы соединений резолвят хосты через DnsCache."""
+
+    def __init__(self, dns_cache: DnsCache, **kwargs: Any):
+        self.dns_cache = dns_cache
+        self._pool_classes = {
+            'http': type('CachedDnsHTTPConnectionPool', (HTTPConnectionPool,), {'ConnectionCls': _connection_class(HTTPConnection, dns_cache)}),
+            'https': type('CachedDnsHTTPSConnectionPool', (HTTPSConnectionPool,), {'ConnectionCls': _connection_class(HTTPSConnection, dns_cache)}),
+        }
+        super().__init__(**kwargs)
+
+    def init_poolmanager(self, *args: Any, **kwargs: Any) -> None:
+        super().init_poolmanager(*args, **kwargs)
+        self.poolmanager.pool_classes_by_scheme = self._pool_classes
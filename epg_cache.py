@@ -0,0 +1,194 @@
+# --- Дисковый кеш EPG ---
+# Хранит уже отфильтрованное расписание (см. parse_epg_stream) в компактном бинарном виде
+# рядом с channels.json, вместе с ETag / Last-Modified для условной перепроверки фида.
+#
+# Формат файла (порядок байт платформы, записан в метаданных):
+#   MAGIC (8 байт) | u32 длина метаданных | метаданные (JSON, utf-8) | выравнивание до 8
+#   int64 starts[N] | int64 stops[N] | u32 title_ends[N] | названия (utf-8 подряд)
+# Программы одного канала лежат подряд, отсортированы по началу; диапазоны каналов - в метаданных.
+# Массивы каналов копируются из mmap в array('q') одним куском, без разбора по программам.
+import json
+import mmap
+import os
+import struct
+import sys
+import time
+from array import array
+from typing import Any, Collection, Dict, List, Optional, Tuple
+
+import requests
+
+from epg_loader import ChannelSchedule, EPGIndex, EPGStats, TimeWindow, open_gzip_stream, parse_epg_stream
+
+CACHE_MAGIC = b'IPTVEPG\x01'
+CACHE_WINDOW_EXTRA_SECONDS = 24 * 3600 # В кеш идет расписание на сутки дальше запрошенного окна: после 304 его хватает еще на сутки
+_HEADER = struct.Struct('=8sI')
+
+
+def _aligned(offset: int) -> int:
+    return (offset + 7) & ~7
+
+
+class EPGCacheEntry:
+    """Загруженный из кеша EPG и его метаданные."""
+
+    def __init__(self, epg: EPGIndex, meta: Dict[str, Any]):
+        self.epg = epg; self.meta = meta
+
+    @property
+    def age_seconds(self) -> float:
+        return time.time() - self.meta.get('fetched_at', 0)
+
+    def covers(self, time_window: Optional[TimeWindow]) -> bool:
+        """Хватает ли кешированного расписания до конца окна. 'covered_until' = None - в фиде не было программ
+        позже сохраненных, так что пока фид не изменился (304), кеш покрывает любое окно."""
+        cached_window = self.meta.get('time_window')
+        if cached_window is None: return True
+        if time_window is None: return False
+        covered_until = self.meta.get('covered_until', cached_window[1])
+        return covered_until is None or covered_until >= time_window[1]
+
+    def revalidation_headers(self) -> Dict[str, str]:
+        """Заголовки для условного запроса (ответ 304 - фид не изменился)."""
+        headers = {}
+        if self.meta.get('etag'): headers['If-None-Match'] = self.meta['etag']
+        if self.meta.get('last_modified'): headers['If-Modified-Since'] = self.meta['last_modified']
+        return headers
+
+
+class EPGCache:
+    """Чтение/запись кеша EPG в одном файле."""
+
+    def __init__(self, filepath: str):
+        self.filepath = filepath
+
+    def _read_meta(self, buffer) -> Optional[Tuple[Dict[str, Any], int]]:
+        if len(buffer) < _HEADER.size: return None
+        magic, meta_len = _HEADER.unpack_from(buffer, 0)
+        if magic != CACHE_MAGIC: return None
+        meta = json.loads(bytes(buffer[_HEADER.size:_HEADER.size + meta_len]).decode('utf-8'))
+        return meta, _aligned(_HEADER.size + meta_len)
+
+    def load(self, url: str, channel_ids: Optional[Collection[str]] = None) -> Optional[EPGCacheEntry]:
+        """Возвращает кеш, если он для того же URL и покрывает запрошенные каналы, иначе None.
+        Возраст и окно не проверяются: старый кеш нужен для условного запроса и как запасной вариант без сети
+        (хватает ли его на окно - EPGCacheEntry.covers)."""
+        if not os.path.exists(self.filepath): return None
+        try:
+            with open(self.filepath, 'rb') as f:
+                if os.fstat(f.fileno()).st_size == 0: return None
+                with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+                    view = memoryview(mapped)
+                    try:
+                        header = self._read_meta(view)
+                        if header is None: return None
+                        meta, offset = header
+                        if meta.get('url') != url or meta.get('byteorder') != sys.byteorder: return None
+                        cached_ids = meta.get('channel_ids')
+                        if cached_ids is not None and (channel_ids is None or not set(channel_ids) <= set(cached_ids)): return None
+                        epg = self._read_programs(view, offset, meta)
+                    finally:
+                        view.release()
+            return EPGCacheEntry(epg, meta)
+        except Exception as e:
+            print(f"[EPG CACHE WARNING] Не удалось прочитать кеш '{self.filepath}': {e}")
+            return None
+
+    def _read_programs(self, view: memoryview, offset: int, meta: Dict[str, Any]) -> EPGIndex:
+        count = meta['programs']
+        starts_offset = offset; stops_offset = starts_offset + 8 * count; ends_offset = stops_offset + 8 * count
+        titles_offset = ends_offset + 4 * count
+        title_ends = view[ends_offset:titles_offset].cast('I')
+        try:
+            schedules: Dict[str, ChannelSchedule] = {}
+            for channel_id, first, length in meta['channels']:
+                starts, stops = array('q'), array('q')
+                starts.frombytes(view[starts_offset + 8 * first:starts_offset + 8 * (first + length)])
+                stops.frombytes(view[stops_offset + 8 * first:stops_offset + 8 * (first + length)])
+                blob_start = title_ends[first - 1] if first else 0; blob_end = title_ends[first + length - 1] if length else blob_start
+                blob = bytes(view[titles_offset + blob_start:titles_offset + blob_end]); titles = []; title_start = 0
+                for i in range(first, first + length):
+                    title_end = title_ends[i] - blob_start; titles.append(blob[title_start:title_end].decode('utf-8')); title_start = title_end
+                schedules[channel_id] = ChannelSchedule(starts, stops, titles)
+        finally:
+            title_ends.release()
+        return EPGIndex(schedules)
+
+    def save(self, url: str, epg: EPGIndex, channel_ids: Optional[Collection[str]] = None, time_window: Optional[TimeWindow] = None,
+             etag: Optional[str] = None, last_modified: Optional[str] = None, fetched_at: Optional[float] = None,
+             covered_until: Any = False) -> bool:
+        """Атомарно перезаписывает кеш (через временный файл). covered_until - до какого времени расписание фида
+        сохранено полностью (None - до конца фида; по умолчанию - конец time_window)."""
+        starts, stops, title_ends = array('q'), array('q'), array('I'); titles = bytearray(); channels: List[List[Any]] = []
+        for channel_id, schedule in epg.schedules.items():
+            channels.append([channel_id, len(starts), len(schedule)])
+            starts.extend(schedule.starts); stops.extend(schedule.stops)
+            for title in schedule.titles: titles.extend(title.encode('utf-8')); title_ends.append(len(titles))
+        meta = {'url': url, 'byteorder': sys.byteorder, 'etag': etag, 'last_modified': last_modified, 'fetched_at': fetched_at if fetched_at is not None else time.time(),
+                'channel_ids': sorted(channel_ids) if channel_ids is not None else None, 'time_window': list(time_window) if time_window else None,
+                'covered_until': (time_window[1] if time_window else None) if covered_until is False else covered_until,
+                'channels': channels, 'programs': len(starts), 'titles_size': len(titles)}
+        meta_bytes = json.dumps(meta, ensure_ascii=False).encode('utf-8')
+        padding = _aligned(_HEADER.size + len(meta_bytes)) - _HEADER.size - len(meta_bytes)
+        tmp_path = self.filepath + '.tmp'
+        try:
+            with open(tmp_path, 'wb') as f:
+                f.write(_HEADER.pack(CACHE_MAGIC, len(meta_bytes))); f.write(meta_bytes); f.write(b'\0' * padding)
+                for values in (starts, stops, title_ends): f.write(values.tobytes())
+                f.write(titles)
+            os.replace(tmp_path, self.filepath)
+            return True
+        except Exception as e:
+            print(f"[EPG CACHE WARNING] Не удалось сохранить кеш '{self.filepath}': {e}")
+            try: os.remove(tmp_path)
+            except OSError: pass
+            return False
+
+    def touch(self, entry: EPGCacheEntry, etag: Optional[str] = None, last_modified: Optional[str] = None) -> None:
+        """Отмечает кеш свежим после ответа 304. Фид не изменился, поэтому окно и его покрытие
+        (covered_until) переносятся как есть; валидаторы обновляются, если сервер прислал новые."""
+        meta = entry.meta; cached_window = meta.get('time_window')
+        meta['etag'] = etag or meta.get('etag'); meta['last_modified'] = last_modified or meta.get('last_modified')
+        self.save(meta['url'], entry.epg, meta.get('channel_ids'), cached_window, meta['etag'], meta['last_modified'],
+                  covered_until=meta.get('covered_until', cached_window[1] if cached_window else None))
+        meta['fetched_at'] = time.time()
+
+
+def fetch_epg(url: str, cache: Optional[EPGCache], channel_ids: Optional[Collection[str]], time_window: Optional[TimeWindow],
+              max_age_seconds: float, timeout: float, headers: Dict[str, str], http_get=requests.get) -> Tuple[EPGIndex, EPGStats]:
+    """Возвращает EPG из кеша, если он моложе max_age_seconds и покрывает окно, иначе запрашивает фид:
+    условно (ETag/Last-Modified), если кеш покрывает окно, и целиком, если нет.
+
+    stats['source']: 'cache' - взято из кеша без запроса, 'not_modified' - сервер ответил 304,
+    'network' - фид скачан и разобран заново, 'stale_cache' - сеть недоступна, отдан устаревший кеш.
+    Для 'network' еще время этапов: 'download_seconds', 'decompress_seconds', 'xml_parse_seconds'
+    (этапы идут одним потоком, время делится по тому, где ждал read()).
+    Сетевые ошибки и ошибки разбора пробрасываются, если кеша нет."""
+    entry = cache.load(url, channel_ids) if cache else None
+    usable = entry if entry and entry.covers(time_window) else None # Старый кеш, которого не хватает на окно, годится только без сети
+    if usable and usable.age_seconds < max_age_seconds:
+        return usable.epg, {'source': 'cache', 'programs': usable.meta['programs'], 'age_seconds': int(usable.age_seconds)}
+
+    request_headers = dict(headers)
+    if usable: request_headers.update(usable.revalidation_headers())
+    try:
+        request_started = time.perf_counter(); response = http_get(url, stream=True, timeout=timeout, headers=request_headers)
+        if usable and response.status_code == 304:
+            response.close(); cache.touch(usable, response.headers.get('ETag'), response.headers.get('Last-Modified'))
+            return usable.epg, {'source': 'not_modified', 'programs': usable.meta['programs']}
+        response.raise_for_status()
+    except requests.exceptions.RequestException:
+        if entry: return entry.epg, {'source': 'stale_cache', 'programs': entry.meta['programs'], 'age_seconds': int(entry.age_seconds)}
+        raise
+
+    stored_window = (time_window[0], time_window[1] + CACHE_WINDOW_EXTRA_SECONDS) if time_window else None
+    xml_stream = open_gzip_stream(response.raw); parse_started = time.perf_counter()
+    try: epg_data, stats = parse_epg_stream(xml_stream, channel_ids=channel_ids, time_window=stored_window)
+    finally: response.close()
+    stats['source'] = 'network'; stats['xml_bytes'] = xml_stream.bytes_read
+    stats['download_seconds'] = parse_started - request_started + xml_stream.source.seconds
+    stats['decompress_seconds'] = xml_stream.seconds - xml_stream.source.seconds
+    stats['xml_parse_seconds'] = time.perf_counter() - parse_started - xml_stream.seconds
+    if cache: cache.save(url, epg_data, channel_ids, stored_window, response.headers.get('ETag'), response.headers.get('Last-Modified'),
+                         covered_until=None if stored_window and not stats['dropped_after_window'] else (stored_window[1] if stored_window else None))
+    return epg_data, stats
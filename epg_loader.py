@@ -0,0 +1,198 @@
+# --- Потоковая загрузка EPG (XMLTV) ---
+# Общий код для iptv_checker.py и gui_app.py. XML не собирается целиком в памяти:
+# gzip-поток читается кусками и сразу отдается инкрементальному парсеру,
+# а каждый <programme> очищается после чтения, поэтому размер фида не ограничен.
+import gzip
+import time
+import xml.etree.ElementTree as ET
+from array import array
+from bisect import bisect_right
+from datetime import date, timezone
+from typing import Any, BinaryIO, Collection, Dict, Iterable, List, Optional, Tuple
+from dateutil.parser import parse as parse_datetime
+
+# --- Структуры данных ---
+Programme = Tuple[int, int, str] # (начало, конец, название) - UTC epoch секунды
+NowAndNext = Tuple[Optional[str], Optional[str]] # (сейчас в эфире, далее)
+EPGStats = Dict[str, Any]
+TimeWindow = Tuple[int, int] # (от, до) - UTC epoch секунды
+
+_UNIX_EPOCH_ORDINAL = date(1970, 1, 1).toordinal()
+_DAYS_IN_MONTH = (31, 28, 31, 30, 31, 30, 31, 31, 30, 31, 30, 31)
+
+
+class ChannelSchedule:
+    """Расписание одного канала: параллельные массивы начала/конца (отсортированы по началу) и названий."""
+    __slots__ = ('starts', 'stops', 'titles')
+
+    def __init__(self, starts: array, stops: array, titles: List[str]):
+        self.starts = starts; self.stops = stops; self.titles = titles
+
+    @classmethod
+    def from_programs(cls, programs: Iterable[Programme]) -> "ChannelSchedule":
+        ordered = sorted(programs, key=lambda x: x[0])
+        return cls(array('q', [p[0] for p in ordered]), array('q', [p[1] for p in ordered]), [p[2] for p in ordered])
+
+    def __len__(self) -> int:
+        return len(self.starts)
+
+    def now_and_next(self, at: float) -> NowAndNext:
+        position = bisect_right(self.starts, at) # Первая программа, начинающаяся позже at
+        current = self.titles[position - 1] if position and at < self.stops[position - 1] else None
+        upcoming = self.titles[position] if position < len(self.titles) else None
+        return current, upcoming
+
+
+class EPGIndex:
+    """EPG для поиска "сейчас в эфире" бинарным поиском: tvg-id -> ChannelSchedule."""
+
+    def __init__(self, schedules: Optional[Dict[str, ChannelSchedule]] = None):
+        self.schedules: Dict[str, ChannelSchedule] = schedules if schedules is not None else {}
+
+    @classmethod
+    def from_programs(cls, programs_by_channel: Dict[str, List[Programme]]) -> "EPGIndex":
+        return cls({channel_id: ChannelSchedule.from_programs(programs) for channel_id, programs in programs_by_channel.items()})
+
+    def __len__(self) -> int:
+        return len(self.schedules)
+
+    def __contains__(self, channel_id: object) -> bool:
+        return channel_id in self.schedules
+
+    @property
+    def program_count(self) -> int:
+        return sum(len(schedule) for schedule in self.schedules.values())
+
+    def current_program(self, channel_id: Optional[str], at: Optional[float] = None) -> Optional[str]:
+        schedule = self.schedules.get(channel_id) if channel_id else None
+        if schedule is None: return None
+        return schedule.now_and_next(time.time() if at is None else at)[0]
+
+    def now_and_next(self, channel_ids: Iterable[Optional[str]], at: Optional[float] = None) -> Dict[str, NowAndNext]:
+        """Текущая и следующая программа сразу для всех переданных каналов (одно время на всю выборку)."""
+        at = time.time() if at is None else at; result: Dict[str, NowAndNext] = {}
+        for channel_id in channel_ids:
+            if not channel_id or channel_id in result: continue
+            schedule = self.schedules.get(channel_id)
+            if schedule is not None: result[channel_id] = schedule.now_and_next(at)
+        return result
+
+
+class CountingReader:
+    """Обертка над файловым объектом, считающая прочитанные байты и время, проведенное в read().
+    source - такой же счетчик на нижележащем потоке (сырые байты до распаковки), если есть."""
+
+    def __init__(self, stream: BinaryIO, source: Optional["CountingReader"] = None):
+        self.stream = stream; self.source = source; self.bytes_read = 0; self.seconds = 0.0
+
+    def read(self, size: int = -1) -> bytes:
+        started = time.perf_counter(); chunk = self.stream.read(size)
+        self.seconds += time.perf_counter() - started; self.bytes_read += len(chunk)
+        return chunk
+
+
+class XMLTVTimeParser:
+    """Быстрый разбор времени XMLTV вида 'YYYYmmddHHMMSS ±HHMM' сразу в UTC epoch секунды.
+
+    Все, что не укладывается в этот формат, отдается dateutil (как раньше); такие случаи
+    считаются в fallback_count, чтобы было видно качество фида."""
+
+    def __init__(self):
+        self.fallback_count = 0
+        self._month_start_days: Dict[str, Optional[Tuple[int, int]]] = {} # 'YYYYmm' -> (дни от epoch до 1-го числа, дней в месяце)
+
+    def _month_info(self, year_month: str) -> Optional[Tuple[int, int]]:
+        info = self._month_start_days.get(year_month, False)
+        if info is False:
+            year, month = int(year_month[:4]), int(year_month[4:6])
+            if 1 <= year and 1 <= month <= 12:
+                days = _DAYS_IN_MONTH[month - 1] + (1 if month == 2 and year % 4 == 0 and (year % 100 != 0 or year % 400 == 0) else 0)
+                info = (date(year, month, 1).toordinal() - _UNIX_EPOCH_ORDINAL, days)
+            else: info = None
+            self._month_start_days[year_month] = info
+        return info
+
+    def _fast_parse(self, value: str) -> Optional[int]:
+        length = len(value)
+        if length == 20 and value[14] == ' ': offset_part = value[15:]
+        elif length == 19: offset_part = value[14:]
+        elif length == 14: offset_part = None
+        else: return None
+        digits = value[:14]
+        if not (digits.isascii() and digits.isdigit()): return None
+        month_info = self._month_info(digits[:6])
+        if month_info is None: return None
+        day, hour, minute, second = int(digits[6:8]), int(digits[8:10]), int(digits[10:12]), int(digits[12:14])
+        if not (1 <= day <= month_info[1] and hour < 24 and minute < 60 and second < 60): return None
+        offset = 0
+        if offset_part is not None:
+            sign, tz_digits = offset_part[0], offset_part[1:]
+            if sign not in '+-' or not (tz_digits.isascii() and tz_digits.isdigit()): return None
+            offset = int(tz_digits[:2]) * 3600 + int(tz_digits[2:]) * 60
+            if sign == '-': offset = -offset
+        return (month_info[0] + day - 1) * 86400 + hour * 3600 + minute * 60 + second - offset
+
+    def __call__(self, value: str) -> int:
+        timestamp = self._fast_parse(value)
+        if timestamp is not None: return timestamp
+        self.fallback_count += 1
+        parsed = parse_datetime(value) # Бросает исключение на совсем битых значениях
+        if parsed.tzinfo is None: parsed = parsed.replace(tzinfo=timezone.utc) # Без смещения считаем UTC
+        return int(parsed.timestamp())
+
+
+def epg_time_window(past_hours: float, future_hours: float, now: Optional[float] = None) -> TimeWindow:
+    """Окно времени [now - past_hours, now + future_hours] в UTC epoch секундах."""
+    now = time.time() if now is None else now
+    return int(now - past_hours * 3600), int(now + future_hours * 3600)
+
+
+def parse_epg_stream(stream: BinaryIO, channel_ids: Optional[Collection[str]] = None,
+                     time_window: Optional[TimeWindow] = None) -> Tuple[EPGIndex, EPGStats]:
+    """Парсит XMLTV из потока (уже распакованного) и возвращает (EPGIndex, статистика).
+
+    channel_ids - tvg-id каналов из плейлиста: программы остальных каналов отбрасываются сразу,
+    до разбора названия и времени. time_window - (от, до) в epoch секундах: сохраняются только
+    программы, пересекающие окно.
+
+    В статистике: 'programs' - сколько программ сохранено, 'dropped_channel' / 'dropped_window' -
+    сколько отброшено фильтрами (из них 'dropped_after_window' - начинающихся после конца окна), 'time_fallbacks' - сколько времен пришлось разбирать через dateutil.
+
+    Обрыв gzip-потока (EOFError) не считается фатальным: возвращается то, что успели разобрать.
+    Ошибки XML (ET.ParseError) и битый gzip пробрасываются вызывающему коду."""
+    programs_by_channel: Dict[str, List[Programme]] = {}; program_count = 0; dropped_channel = 0; dropped_window = 0; dropped_after = 0
+    root = None; parse_time = XMLTVTimeParser()
+    wanted_ids = set(channel_ids) if channel_ids is not None else None
+    window_start, window_end = time_window if time_window is not None else (None, None)
+    try:
+        for event, elem in ET.iterparse(stream, events=('start', 'end')):
+            if event == 'start':
+                if root is None: root = elem # <tv>, от него отцепляем уже обработанные элементы
+                continue
+            if elem.tag == 'programme':
+                channel_id = elem.get('channel')
+                if wanted_ids is not None and channel_id not in wanted_ids: dropped_channel += 1; root.clear(); continue
+                start_str = elem.get('start'); stop_str = elem.get('stop'); title_elem = elem.find('title')
+                if channel_id and start_str and stop_str and title_elem is not None and title_elem.text:
+                    try:
+                        stop_time = parse_time(stop_str)
+                        if window_start is not None and stop_time <= window_start: dropped_window += 1; root.clear(); continue
+                        start_time = parse_time(start_str)
+                        if window_end is not None and start_time >= window_end: dropped_window += 1; dropped_after += 1; root.clear(); continue
+                        title = title_elem.text.strip()
+                        if channel_id not in programs_by_channel: programs_by_channel[channel_id] = []
+                        programs_by_channel[channel_id].append((start_time, stop_time, title)); program_count += 1
+                    except Exception: pass
+                root.clear()
+            elif elem.tag == 'channel' and root is not None: root.clear()
+    except EOFError: pass # Фид оборвался - оставляем уже прочитанное
+
+    return EPGIndex.from_programs(programs_by_channel), {'programs': program_count, 'dropped_channel': dropped_channel, 'dropped_window': dropped_window, 'dropped_after_window': dropped_after,
+                      'time_fallbacks': parse_time.fallback_count}
+
+
+def open_gzip_stream(raw_stream: BinaryIO) -> CountingReader:
+    """Оборачивает сырой поток ответа в gzip-распаковку со счетчиками байт и времени.
+    reader.source.seconds - ожидание сети, reader.seconds - сеть + распаковка."""
+    source = CountingReader(raw_stream)
+    return CountingReader(gzip.GzipFile(fileobj=source), source)
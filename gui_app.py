@@ -4,18 +4,31 @@ import platform
 import os
 import sys # <--- Добавили sys для определения _MEIPASS
 import json
-import re
 import requests
 import subprocess
 import threading
+import queue
+import asyncio
+import functools
+import time
 import gzip
 import xml.etree.ElementTree as ET
-from datetime import datetime, timezone
-from dateutil.parser import parse as parse_datetime
-from typing import List, Dict, Optional, Tuple, Any
+from typing import List, Dict, Optional, Set, Tuple, Any, Callable
 # Убедись, что установил: pip install packaging
 from packaging import version as packaging_version
 
+from channel_cache import ChannelCacheData, load_channel_cache, save_channel_cache, sync_channel_cache
+from channel_index import ChannelIndex
+from check_engine import CheckEngine
+from epg_cache import EPGCache, fetch_epg
+from epg_loader import EPGIndex, epg_time_window
+from dns_cache import DnsCache, url_hostnames
+from host_pool import HostCircuitBreaker, HostLatencyTracker, HostPool
+from m3u_parser import read_m3u
+from metrics import Metrics, record_epg_phases
+from status_store import StatusStore, needs_recheck
+from stream_probe import CheckOutcome, check_coalesce_key, check_stream, headers_from_vlc_opts, make_outcome
+
 # --- Rich Console (используется только для print) ---
 from rich.console import Console
 console = Console()
@@ -53,34 +66,44 @@ APP_DIR = get_executable_dir() # Папка, где лежит EXE или PY
 M3U_FILE_PATH = resource_path("channels.m3u") # Путь к M3U внутри EXE или рядом с PY
 JSON_CACHE_FILE_PATH = os.path.join(APP_DIR, "channels.json") # Путь к JSON рядом с EXE/PY
 CONFIG_FILE_PATH = os.path.join(APP_DIR, "config.json") # Путь к конфигу рядом с EXE/PY
+EPG_CACHE_FILE_PATH = os.path.join(APP_DIR, "epg_cache.bin") # Кеш EPG рядом с EXE/PY
+STATUS_DB_FILE_PATH = os.path.join(APP_DIR, "status_history.sqlite") # История проверок рядом с EXE/PY
+METRICS = Metrics() # Время фаз, задержки по хостам и исходы проверок (в config.json: metrics_file / metrics_port)
 
 EPG_PROCESSING_TIMEOUT_SECONDS = 30
-MAX_EPG_XML_SIZE_MB = 75
-CHECK_TIMEOUT_SECONDS = 5
+EPG_WINDOW_PAST_HOURS = 2 # Окно EPG: от (сейчас - 2ч) до (сейчас + 24ч)
+EPG_WINDOW_FUTURE_HOURS = 24
+EPG_CACHE_MAX_AGE_SECONDS = 3600 # Пока кеш моложе - фид не запрашивается
+CHECK_TIMEOUT_FLOOR_SECONDS = 1.5 # По умолчанию; в config.json - "check_timeout_floor_seconds" / "check_timeout_ceiling_seconds":
+CHECK_TIMEOUT_CEILING_SECONDS = 10 # таймаут проверки подстраивается под задержки хоста в этих пределах (без трекера - потолок)
+HLS_PROBE_BYTE_BUDGET = 256 * 1024 # Лимит байт на канал: глубокая проверка HLS (включается в настройках) и DASH-манифесты
+CHECK_MAX_CONCURRENCY = 32 # Размер пула потоков для проверки статусов
+CHECK_MAX_PER_HOST = 4 # По умолчанию; в config.json - "max_requests_per_host" (одновременных проверок одного хоста)
+STATUS_UI_REFRESH_MS = 150 # Как часто главный поток забирает пачку готовых статусов
+STATUS_RECHECK_TTL_MINUTES = 30 # По умолчанию; в config.json - "status_recheck_ttl_minutes"
+CHANNEL_ROW_HEIGHT = 28 # Высота строки списка каналов (до масштабирования CTk)
+CHANNEL_ROW_PADDING = 1 # Отступ строки сверху и снизу
+CHANNEL_LIST_WHEEL_ROWS = 3 # На сколько строк прокручивает один щелчок колеса мыши
 
 # --- Структуры данных ---
 ChannelInfo = Dict[str, Any]
-EPGData = Dict[str, List[Tuple[datetime, datetime, str]]]
 ChannelStatus = Tuple[str, Optional[int], str] # (text, code, color)
 
 # --- Вспомогательные функции ---
 
 # --- Функции для работы с JSON (теперь используют правильные пути) ---
-def load_channels_from_json(filepath: str = JSON_CACHE_FILE_PATH) -> Optional[List[ChannelInfo]]:
-    if not os.path.exists(filepath): return None
+def load_channels_from_json(filepath: str = JSON_CACHE_FILE_PATH) -> Optional[ChannelCacheData]:
     try:
-        with open(filepath, 'r', encoding='utf-8') as f: channels = json.load(f)
-        if isinstance(channels, list) and all(isinstance(ch, dict) for ch in channels):
-             print(f"[INFO] Загружено из '{filepath}'.")
-             for i, ch in enumerate(channels): ch.setdefault('number', i + 1)
-             return channels
-        else: print(f"[WARNING] Файл '{filepath}' имеет неверную структуру."); return None
+        with METRICS.phase('json_load'): data = load_channel_cache(filepath)
+        if data is not None: print(f"[INFO] Загружено из '{filepath}'.")
+        return data
     except json.JSONDecodeError: print(f"[WARNING] Не удалось декодировать JSON из '{filepath}'."); return None
+    except ValueError: print(f"[WARNING] Файл '{filepath}' имеет неверную структуру."); return None
     except Exception as e: print(f"[ERROR] Чтение JSON кеша '{filepath}': {e}"); return None
 
-def save_channels_to_json(channels: List[ChannelInfo], filepath: str = JSON_CACHE_FILE_PATH):
+def save_channels_to_json(data: ChannelCacheData, filepath: str = JSON_CACHE_FILE_PATH):
     try:
-        with open(filepath, 'w', encoding='utf-8') as f: json.dump(channels, f, ensure_ascii=False, indent=2)
+        with METRICS.phase('json_save'): save_channel_cache(data, filepath)
         print(f"[INFO] Список каналов сохранен в '{filepath}'.")
     except Exception as e: print(f"[ERROR] Ошибка сохранения JSON '{filepath}': {e}")
 
@@ -99,30 +122,11 @@ def save_config(config_data: Dict, filepath: str = CONFIG_FILE_PATH):
     except Exception as e: print(f"[ERROR] Ошибка сохранения config.json: {e}")
 
 # --- Функция парсинга M3U (теперь использует resource_path) ---
-def parse_m3u_simplified(filepath: str = M3U_FILE_PATH) -> tuple[str | None, list]:
-    channels = []; current_channel_info = {}; epg_url = None
+def parse_m3u_simplified(filepath: str = M3U_FILE_PATH) -> tuple[dict, list]:
     try:
         # --- Используем filepath, который уже обработан resource_path ---
         print(f"[DEBUG] Trying to parse M3U from: {filepath}") # Отладочный вывод
-        with open(filepath, 'r', encoding='utf-8') as f:
-            for i, line in enumerate(f):
-                line = line.strip();
-                if not line: continue
-                if line.startswith('#EXTM3U'):
-                    match = re.search(r'url-tvg="([^"]*)"', line);
-                    if match: epg_url = match.group(1)
-                    continue
-                elif line.startswith('#EXTINF:'):
-                    parts = line.split(',', 1); info_part = parts[0]; name_part = parts[1] if len(parts) > 1 else f"Канал {len(channels)+1}"
-                    current_channel_info = {'name': name_part.strip(), 'number': len(channels) + 1}
-                    match = re.search(r'tvg-name="([^"]*)"', info_part); current_channel_info['tvg_name'] = match.group(1) if match else current_channel_info['name']
-                    match = re.search(r'tvg-logo="([^"]*)"', info_part); current_channel_info['logo'] = match.group(1) if match else None
-                    match = re.search(r'group-title="([^"]*)"', info_part); current_channel_info['group'] = match.group(1) if match else "Без группы"
-                    match = re.search(r'tvg-id="([^"]*)"', info_part); current_channel_info['id'] = match.group(1) if match else None
-                    current_channel_info['_waiting_for_url'] = True
-                elif not line.startswith('#') and current_channel_info.get('_waiting_for_url'):
-                    current_channel_info['url'] = line; del current_channel_info['_waiting_for_url']
-                    channels.append(current_channel_info); current_channel_info = {}
+        with METRICS.phase('m3u_parse'): return read_m3u(filepath)
     except FileNotFoundError:
          # Добавляем информацию о том, где искали файл
          print(f"ERROR: M3U file not found at expected location: '{filepath}'")
@@ -131,81 +135,61 @@ def parse_m3u_simplified(filepath: str = M3U_FILE_PATH) -> tuple[str | None, lis
          if os.path.exists(alt_path):
              print(f"WARNING: Found M3U at alternate path: {alt_path}. Check PyInstaller packaging.")
              # Можно попробовать прочитать отсюда, но лучше исправить сборку
-         return None, []
-    except Exception as e: print(f"ERROR reading M3U '{filepath}': {e}"); return None, []
-    return epg_url, channels
+         return {}, []
+    except Exception as e: print(f"ERROR reading M3U '{filepath}': {e}"); return {}, []
 
 # --- Остальные вспомогательные функции (EPG, Status, Player, Table) без изменений в логике, но используют новые пути ---
-def download_and_parse_epg_worker(url: Optional[str], result_dict: Dict) -> None:
-    # ... (код как в предыдущем примере) ...
-    if not url: result_dict['epg'] = {}; return
-    epg_data: EPGData = {}
+def download_and_parse_epg_worker(url: Optional[str], result_dict: Dict, channel_ids: Optional[Set[str]] = None) -> None:
+    if not url: result_dict['epg'] = EPGIndex(); return
     try:
-        print(f"[EPG THREAD] Starting download from {url}...")
+        print(f"[EPG THREAD] Loading EPG from {url} (cache: {EPG_CACHE_FILE_PATH})...")
         headers = {'User-Agent': 'IPTV Checker GUI'}
-        response = requests.get(url, stream=True, timeout=EPG_PROCESSING_TIMEOUT_SECONDS, headers=headers)
-        response.raise_for_status(); print(f"[EPG THREAD] Download started. Decompressing...")
-        decompressed_data = bytearray(); gzip_stream = gzip.GzipFile(fileobj=response.raw)
-        while True:
-            try: chunk = gzip_stream.read(8192);
-            except EOFError: break
-            except gzip.BadGzipFile: print("[EPG THREAD ERROR] Bad Gzip file."); result_dict['epg'] = {}; return
-            except Exception as e: print(f"[EPG THREAD ERROR] Read error: {e}"); result_dict['epg'] = {}; return
-            if not chunk: break; decompressed_data.extend(chunk)
-        xml_size_mb = len(decompressed_data) / (1024 * 1024); print(f"[EPG THREAD] Decompressed size: {xml_size_mb:.2f} MB")
-        if xml_size_mb > MAX_EPG_XML_SIZE_MB: print(f"[EPG THREAD WARNING] EPG XML too large. Skipping parse."); result_dict['epg'] = {}; return
-        if not decompressed_data: result_dict['epg'] = {}; return
-        print(f"[EPG THREAD] Parsing XML..."); root = ET.fromstring(decompressed_data); program_count = 0; programs_list = root.findall('programme')
-        print(f"[EPG THREAD] Found {len(programs_list)} programs. Processing...")
-        for programme in programs_list:
-            channel_id=programme.get('channel');start_str=programme.get('start');stop_str=programme.get('stop');title_elem=programme.find('title')
-            if channel_id and start_str and stop_str and title_elem is not None and title_elem.text:
-                try:
-                    start_time=parse_datetime(start_str);stop_time=parse_datetime(stop_str);title=title_elem.text.strip()
-                    if channel_id not in epg_data: epg_data[channel_id]=[]
-                    epg_data[channel_id].append((start_time,stop_time,title));program_count+=1
-                except Exception: pass
-        for channel_id in epg_data: epg_data[channel_id].sort(key=lambda x:x[0])
-        print(f"[EPG THREAD] Finished. Parsed {program_count} programs for {len(epg_data)} channels.")
+        time_window = epg_time_window(EPG_WINDOW_PAST_HOURS, EPG_WINDOW_FUTURE_HOURS)
+        try:
+            fetch_started = time.perf_counter()
+            epg_data, epg_stats = fetch_epg(url, EPGCache(EPG_CACHE_FILE_PATH), channel_ids, time_window, EPG_CACHE_MAX_AGE_SECONDS,
+                                            EPG_PROCESSING_TIMEOUT_SECONDS, headers)
+            record_epg_phases(METRICS, epg_stats, time.perf_counter() - fetch_started)
+        except gzip.BadGzipFile: print("[EPG THREAD ERROR] Bad Gzip file."); result_dict['epg'] = EPGIndex(); return
+        if epg_stats['source'] == 'network':
+            print(f"[EPG THREAD] Decompressed size: {epg_stats['xml_bytes'] / (1024 * 1024):.2f} MB")
+            print(f"[EPG THREAD] Dropped {epg_stats['dropped_channel']} programs not in playlist, {epg_stats['dropped_window']} outside time window.")
+        print(f"[EPG THREAD] Finished ({epg_stats['source']}). {epg_stats['programs']} programs for {len(epg_data)} channels.")
         result_dict['epg'] = epg_data
-    except requests.exceptions.Timeout: print(f"[EPG THREAD ERROR] Timeout"); result_dict['epg'] = {}
-    except requests.exceptions.RequestException as e: print(f"[EPG THREAD ERROR] Network error: {e}"); result_dict['epg'] = {}
-    except ET.ParseError as e: print(f"[EPG THREAD ERROR] XML Parse error: {e}"); result_dict['epg'] = {}
-    except Exception as e: print(f"[EPG THREAD ERROR] Unknown error: {e}"); result_dict['epg'] = {}
+    except requests.exceptions.Timeout: print(f"[EPG THREAD ERROR] Timeout"); result_dict['epg'] = EPGIndex()
+    except requests.exceptions.RequestException as e: print(f"[EPG THREAD ERROR] Network error: {e}"); result_dict['epg'] = EPGIndex()
+    except ET.ParseError as e: print(f"[EPG THREAD ERROR] XML Parse error: {e}"); result_dict['epg'] = EPGIndex()
+    except Exception as e: print(f"[EPG THREAD ERROR] Unknown error: {e}"); result_dict['epg'] = EPGIndex()
 
 
-def find_current_program(channel_id: Optional[str], epg_data: EPGData) -> Optional[str]:
-    # ... (код как в предыдущем примере) ...
-    if not channel_id or channel_id not in epg_data: return None
-    now = datetime.now(timezone.utc); programs = epg_data.get(channel_id, [])
-    for start, stop, title in programs:
-        try:
-            start_aware = start.astimezone(timezone.utc) if start.tzinfo else start.replace(tzinfo=timezone.utc)
-            stop_aware = stop.astimezone(timezone.utc) if stop.tzinfo else stop.replace(tzinfo=timezone.utc)
-            if start_aware <= now < stop_aware: return title
-        except Exception: continue
-    return None
 
-def check_channel_availability_worker(channel_num: int, url: Optional[str], result_dict: Dict) -> None:
-    # ... (код как в предыдущем примере) ...
-    status_text = "Не HTTP(S)"; status_code = None; status_color = "gray"
-    if url and url.lower().startswith(('http://', 'https://')):
-        headers = {'User-Agent': 'IPTV Checker GUI'}
-        try:
-            if url.lower().endswith('.mpd'): status_text, status_code, status_color = "DASH (.mpd)", None, "cyan"
-            else:
-                response = requests.head(url, timeout=CHECK_TIMEOUT_SECONDS, headers=headers, allow_redirects=True, stream=False)
-                status_code = response.status_code
-                if 200 <= status_code < 300: status_text, status_color = "OK", "green"
-                elif status_code == 404: status_text, status_color = "Не найден", "red"
-                elif status_code == 403: status_text, status_color = "Запрещен", "orange"
-                elif status_code == 405: status_text, status_color = "Метод HEAD X", "orange"
-                else: status_text, status_color = f"Ошибка {status_code}", "orange"
-        except requests.exceptions.Timeout: status_text, status_color = "Таймаут", "orange"
-        except requests.exceptions.ConnectionError: status_text, status_color = "Нет соедин.", "red"
-        except requests.exceptions.RequestException: status_text, status_color = "Ошибка зап.", "magenta"
-        except Exception: status_text, status_color = "Неизвестно", "gray"
-    result_dict[channel_num] = (status_text, status_code, status_color)
+STATUS_LOOKS: Dict[str, Tuple[str, str]] = {
+    'ok': ("OK", "green"), 'not_found': ("Не найден", "red"), 'forbidden': ("Запрещен", "orange"), 'head_not_allowed': ("Метод HEAD X", "orange"),
+    'timeout': ("Таймаут", "orange"), 'connection_error': ("Нет соедин.", "red"), 'request_error': ("Ошибка зап.", "magenta"),
+    'unknown': ("Неизвестно", "gray"), 'not_http': ("Не HTTP(S)", "gray"), 'too_large': ("Плейлист > лимита", "orange"),
+    'host_down': ("Хост недоступен", "red"), 'dns_error': ("DNS", "red"),
+}
+
+
+def run_channel_check(url: Optional[str], deep: bool = False, headers: Optional[Dict[str, str]] = None, pool: Optional[HostPool] = None) -> CheckOutcome:
+    request_headers = {'User-Agent': 'IPTV Checker GUI'}
+    if headers: request_headers.update(headers) # Заголовки канала из #EXTVLCOPT
+    timeout = pool.latency.ceiling if pool is not None and pool.latency is not None else CHECK_TIMEOUT_CEILING_SECONDS
+    return check_stream(url, timeout=timeout, headers=request_headers, deep=deep, byte_budget=HLS_PROBE_BYTE_BUDGET, pool=pool)
+
+
+def status_from_outcome(result: CheckOutcome) -> ChannelStatus:
+    outcome = result['outcome']; kind = result.get('kind'); details = result.get('details') or {}; status_code = result.get('status_code')
+    if outcome == 'ok' and kind == 'DASH': status_text, status_color = f"DASH OK{' (live)' if details.get('mpd_type') == 'dynamic' else ''}, {details.get('segment_ttfb_ms')} мс", "green"
+    elif outcome == 'ok' and kind == 'HLS': status_text, status_color = f"HLS OK ({details.get('segments')} сегм., {details.get('ttfb_ms')} мс)", "green"
+    elif outcome == 'ok' and details.get('method') == 'GET': status_text, status_color = "OK (GET)", "green"
+    elif outcome == 'empty': status_text, status_color = f"{kind} без сегментов", "orange"
+    elif outcome == 'stale': status_text, status_color = f"{kind} не обновляется", "orange"
+    elif outcome == 'segment_error': status_text, status_color = f"{kind}: сегмент {details.get('segment_status')}", "red"
+    elif outcome == 'invalid': status_text, status_color = f"Не {kind} плейлист", "red"
+    elif outcome == 'http_error': status_text, status_color = f"Ошибка {status_code}", "orange"
+    else: status_text, status_color = STATUS_LOOKS.get(outcome, STATUS_LOOKS['unknown'])
+    return status_text, status_code, status_color
 
 
 def open_in_player(url: Optional[str], console_print_func, custom_player_path: Optional[str] = None):
@@ -237,12 +221,14 @@ class SettingsWindow(ctk.CTkToplevel):
     def __init__(self, master):
         super().__init__(master)
         self.app = master
-        self.title("Настройки"); self.geometry("500x200"); self.transient(master); self.grab_set()
+        self.title("Настройки"); self.geometry("500x240"); self.transient(master); self.grab_set()
         self.grid_columnconfigure(0, weight=1); self.grid_rowconfigure(2, weight=1)
         ctk.CTkLabel(self, text="Путь к исполняемому файлу плеера (.exe):").grid(row=0, column=0, padx=20, pady=(20, 5), columnspan=2, sticky="w")
         self.path_entry = ctk.CTkEntry(self, width=350); self.path_entry.grid(row=1, column=0, padx=(20, 5), pady=5, sticky="ew")
         self.path_entry.insert(0, self.app.config.get("player_path", ""))
         self.browse_button = ctk.CTkButton(self, text="Обзор...", width=80, command=self.browse_file); self.browse_button.grid(row=1, column=1, padx=(0, 20), pady=5)
+        self.deep_check_var = ctk.BooleanVar(value=bool(self.app.config.get("deep_hls_check", False)))
+        self.deep_check_box = ctk.CTkCheckBox(self, text="Глубокая проверка HLS (скачивать плейлисты)", variable=self.deep_check_var); self.deep_check_box.grid(row=2, column=0, columnspan=2, padx=20, pady=10, sticky="nw")
         self.button_frame = ctk.CTkFrame(self, fg_color="transparent"); self.button_frame.grid(row=3, column=0, columnspan=2, padx=20, pady=(10, 20), sticky="e")
         self.save_button = ctk.CTkButton(self.button_frame, text="Сохранить", command=self.save_settings); self.save_button.grid(row=0, column=0, padx=5)
         self.cancel_button = ctk.CTkButton(self.button_frame, text="Отмена", fg_color="gray", command=self.destroy); self.cancel_button.grid(row=0, column=1, padx=5)
@@ -252,8 +238,90 @@ class SettingsWindow(ctk.CTkToplevel):
         if filepath: self.path_entry.delete(0, "end"); self.path_entry.insert(0, filepath)
     def save_settings(self):
         new_path = self.path_entry.get().strip()
-        self.app.config["player_path"] = new_path
-        self.app.save_app_config(); print(f"[SETTINGS] Player path set to: {new_path if new_path else 'Default'}"); self.destroy()
+        self.app.config["player_path"] = new_path; self.app.config["deep_hls_check"] = bool(self.deep_check_var.get())
+        self.app.save_app_config(); print(f"[SETTINGS] Player path set to: {new_path if new_path else 'Default'}, deep HLS check: {self.app.config['deep_hls_check']}"); self.destroy()
+
+
+# --- Виртуальный список каналов ---
+class VirtualChannelList(ctk.CTkFrame):
+    """Список каналов с фиксированным пулом строк: кнопок ровно столько, сколько строк помещается в окне,
+    при прокрутке они перепривязываются к другим каналам. Запуск, прокрутка и обновление статусов стоят
+    одинаково при любом размере плейлиста. Строка перерисовывается, только если ее вид изменился."""
+    DEFAULT_TEXT_COLOR = ("gray10", "gray90"); SELECTED_COLOR = ("gray75", "gray25")
+
+    def __init__(self, master, on_select: Callable[[ChannelInfo], None], status_of: Callable[[ChannelInfo], Optional[ChannelStatus]], **kwargs):
+        super().__init__(master, **kwargs)
+        self.on_select = on_select; self.status_of = status_of
+        self.items: List[ChannelInfo] = []; self.first = 0; self.selected_number: Optional[int] = None
+        self.rows: List[ctk.CTkButton] = []; self.row_looks: List[Optional[Tuple[Any, ...]]] = [] # Что сейчас нарисовано в строке
+        self.grid_columnconfigure(0, weight=1); self.grid_rowconfigure(0, weight=1)
+        self.rows_frame = ctk.CTkFrame(self, fg_color="transparent"); self.rows_frame.grid(row=0, column=0, sticky="nsew"); self.rows_frame.grid_columnconfigure(0, weight=1)
+        self.scrollbar = ctk.CTkScrollbar(self, command=self._on_scrollbar); self.scrollbar.grid(row=0, column=1, sticky="ns")
+        self.rows_frame.grid_propagate(False) # Размер задает окно, а не число строк
+        self.rows_frame.bind("<Configure>", self._on_resize); self._bind_wheel(self.rows_frame)
+
+    def _bind_wheel(self, widget) -> None:
+        for sequence in ("<MouseWheel>", "<Button-4>", "<Button-5>"): widget.bind(sequence, self._on_wheel)
+
+    def _on_resize(self, event) -> None:
+        row_pitch = self._apply_widget_scaling(CHANNEL_ROW_HEIGHT + 2 * CHANNEL_ROW_PADDING)
+        visible = max(1, int(event.height // row_pitch))
+        if visible == len(self.rows): return
+        while len(self.rows) > visible: self.rows.pop().destroy(); self.row_looks.pop()
+        while len(self.rows) < visible:
+            row_index = len(self.rows)
+            row = ctk.CTkButton(self.rows_frame, text="", height=CHANNEL_ROW_HEIGHT, fg_color="transparent", text_color=self.DEFAULT_TEXT_COLOR, hover=False, anchor="w",
+                                command=lambda i=row_index: self._on_row_click(i))
+            row.grid(row=row_index, column=0, padx=5, pady=(CHANNEL_ROW_PADDING, CHANNEL_ROW_PADDING), sticky="ew"); self._bind_wheel(row)
+            self.rows.append(row); self.row_looks.append(None)
+        self.scroll_to(self.first)
+
+    def _on_row_click(self, row_index: int) -> None:
+        index = self.first + row_index
+        if index >= len(self.items): return
+        channel = self.items[index]; self.selected_number = channel.get('number', index + 1); self.refresh(); self.on_select(channel)
+
+    def _on_wheel(self, event) -> None:
+        if getattr(event, 'num', None) == 4: direction = -1
+        elif getattr(event, 'num', None) == 5: direction = 1
+        else: direction = -1 if event.delta > 0 else 1
+        self.scroll_to(self.first + direction * CHANNEL_LIST_WHEEL_ROWS)
+
+    def _on_scrollbar(self, *args) -> None:
+        if not args: return
+        if args[0] == 'moveto': self.scroll_to(int(float(args[1]) * len(self.items)))
+        elif args[0] == 'scroll':
+            step = max(1, len(self.rows) - 1) if len(args) > 2 and args[2] == 'pages' else 1; amount = float(args[1])
+            self.scroll_to(self.first + (step if amount > 0 else -step))
+
+    def set_items(self, items: List[ChannelInfo]) -> None:
+        """Новый список (например, после загрузки или поиска). Прокрутка - в начало, выделение сохраняется по номеру."""
+        self.items = items; self.first = 0; self.refresh()
+
+    def scroll_to(self, first: int) -> None:
+        self.first = max(0, min(first, len(self.items) - len(self.rows))); self.refresh()
+
+    def see(self, index: int) -> None:
+        """Прокручивает так, чтобы строка index была видна."""
+        if index < self.first: self.scroll_to(index)
+        elif index >= self.first + len(self.rows): self.scroll_to(index - len(self.rows) + 1)
+
+    def clear_selection(self) -> None:
+        self.selected_number = None; self.refresh()
+
+    def refresh(self) -> None:
+        """Перепривязывает видимые строки к данным (название, цвет статуса, выделение)."""
+        for row_index, row in enumerate(self.rows):
+            index = self.first + row_index
+            if index < len(self.items):
+                channel = self.items[index]; number = channel.get('number', index + 1); status = self.status_of(channel)
+                look = (f"{number}. {channel.get('tvg_name') or channel.get('name', f'Канал {number}')}", status[2] if status else self.DEFAULT_TEXT_COLOR,
+                        self.SELECTED_COLOR if number == self.selected_number else "transparent", "normal")
+            else: look = ("", self.DEFAULT_TEXT_COLOR, "transparent", "disabled")
+            if look != self.row_looks[row_index]:
+                row.configure(text=look[0], text_color=look[1], fg_color=look[2], state=look[3]); self.row_looks[row_index] = look
+        total = len(self.items)
+        self.scrollbar.set(self.first / total, min(1.0, (self.first + len(self.rows)) / total)) if total else self.scrollbar.set(0.0, 1.0)
 
 
 # --- Основной класс приложения ---
@@ -263,20 +331,34 @@ class App(ctk.CTk):
         self.title(f"IPTV Checker by jeliktontech (v{CURRENT_VERSION})"); self.geometry("950x650")
         ctk.set_appearance_mode("Dark"); ctk.set_default_color_theme("dark-blue")
         self.config = load_config() # Загружаем конфиг ДО виджетов
-        self.channels: List[ChannelInfo] = []; self.epg_data: EPGData = {}; self.channel_statuses: Dict[int, ChannelStatus] = {}
-        self.channel_widgets: List[ctk.CTkButton] = []; self.selected_channel_widget: Optional[ctk.CTkButton] = None
+        self.channels: List[ChannelInfo] = []; self.epg_data: EPGIndex = EPGIndex(); self.channel_statuses: Dict[int, ChannelStatus] = {}
+        self.channel_index = ChannelIndex(); self.applied_search_term: Optional[str] = None # Поиск по названию для строки поиска
         self.selected_channel_data: Optional[ChannelInfo] = None; self.epg_thread: Optional[threading.Thread] = None
-        self.status_threads: List[threading.Thread] = []; self.stop_status_check: bool = False; self.settings_window: Optional[SettingsWindow] = None
+        self.status_engine: Optional[CheckEngine] = None; self.status_thread: Optional[threading.Thread] = None
+        self.status_results: "queue.Queue[Any]" = queue.Queue(); self.settings_window: Optional[SettingsWindow] = None
+        self.known_results: Dict[str, CheckOutcome] = {} # URL -> последний сохраненный результат проверки
+        self.max_per_host = max(1, int(self.config.get("max_requests_per_host", CHECK_MAX_PER_HOST)))
+        latency = HostLatencyTracker(float(self.config.get("check_timeout_floor_seconds", CHECK_TIMEOUT_FLOOR_SECONDS)),
+                                     float(self.config.get("check_timeout_ceiling_seconds", CHECK_TIMEOUT_CEILING_SECONDS)))
+        self.host_pool = HostPool(self.max_per_host, breaker=HostCircuitBreaker(), latency=latency, # Keep-alive по хостам, автомат для мертвых хостов, таймауты по задержкам,
+                                  dns=DnsCache()) # адреса из кеша DNS
+        if self.config.get('metrics_port') is not None:
+            try: print(f"[INFO] Метрики: http://127.0.0.1:{METRICS.serve(int(self.config['metrics_port']))}/metrics")
+            except (OSError, ValueError) as e: print(f"[WARNING] Не удалось открыть порт метрик: {e}")
+        try: self.status_store: Optional[StatusStore] = StatusStore(STATUS_DB_FILE_PATH)
+        except Exception as e: print(f"[STATUS STORE ERROR] {e}"); self.status_store = None
 
         # --- Макет ---
         self.grid_columnconfigure(0, weight=1, minsize=250); self.grid_columnconfigure(1, weight=2)
         self.grid_rowconfigure(0, weight=1); self.grid_rowconfigure(1, weight=0)
         # Левая панель
         self.left_frame = ctk.CTkFrame(self, width=250); self.left_frame.grid(row=0, column=0, padx=(10, 5), pady=10, sticky="nsew")
-        self.left_frame.grid_rowconfigure(1, weight=1); self.left_frame.grid_columnconfigure(0, weight=1)
+        self.left_frame.grid_rowconfigure(2, weight=1); self.left_frame.grid_columnconfigure(0, weight=1)
         ctk.CTkLabel(self.left_frame, text="Каналы", font=ctk.CTkFont(size=16, weight="bold")).grid(row=0, column=0, padx=10, pady=(10, 5), sticky="ew")
-        self.channel_list_frame = ctk.CTkScrollableFrame(self.left_frame, fg_color="transparent")
-        self.channel_list_frame.grid(row=1, column=0, padx=5, pady=(0, 5), sticky="nsew"); self.channel_list_frame.grid_columnconfigure(0, weight=1)
+        self.channel_list = VirtualChannelList(self.left_frame, on_select=self.select_channel, status_of=lambda channel: self.channel_statuses.get(channel.get('number')), fg_color="transparent")
+        self.search_entry = ctk.CTkEntry(self.left_frame, placeholder_text="Поиск по названию...")
+        self.search_entry.grid(row=1, column=0, padx=10, pady=(0, 5), sticky="ew"); self.search_entry.bind("<KeyRelease>", lambda event: self.apply_search())
+        self.channel_list.grid(row=2, column=0, padx=5, pady=(0, 5), sticky="nsew")
         # Правая панель
         self.right_frame = ctk.CTkFrame(self); self.right_frame.grid(row=0, column=1, padx=(5, 10), pady=10, sticky="nsew")
         self.right_frame.grid_columnconfigure(0, weight=1); self.right_frame.grid_rowconfigure(3, weight=1)
@@ -303,60 +385,68 @@ class App(ctk.CTk):
     # --- Методы ---
     def load_initial_data(self):
         self.update_statusbar("Загрузка списка каналов...")
-        loaded_channels = load_channels_from_json() # Использует JSON_CACHE_FILE_PATH
-        self.epg_url_from_m3u = None # EPG URL из M3U, если его парсили
-        if loaded_channels is None:
-            # --- Используем M3U_FILE_PATH, определенный через resource_path ---
-            m3u_path_to_check = M3U_FILE_PATH
-            if os.path.exists(m3u_path_to_check): # Проверяем существование файла по правильному пути
-                self.update_statusbar(f"Чтение из {os.path.basename(m3u_path_to_check)}...")
-                print(f"[INFO] Чтение из {m3u_path_to_check}...")
-                self.epg_url_from_m3u, channels_from_m3u = parse_m3u_simplified(m3u_path_to_check)
-                if channels_from_m3u:
-                    self.update_statusbar(f"Спарсено {len(channels_from_m3u)} кан. Сохранение...")
-                    loaded_channels = channels_from_m3u
-                    save_channels_to_json(loaded_channels) # Сохраняет в JSON_CACHE_FILE_PATH
-                else: self.update_statusbar(f"Не удалось прочитать из {os.path.basename(m3u_path_to_check)}"); loaded_channels = []
-            else:
-                 self.update_statusbar(f"Не найдены файлы {os.path.basename(JSON_CACHE_FILE_PATH)} и {os.path.basename(M3U_FILE_PATH)}")
-                 loaded_channels = []
-        self.channels = loaded_channels if loaded_channels is not None else []
-        self.populate_channel_list()
+        # --- JSON-кеш сверяется с M3U (M3U_FILE_PATH через resource_path): неизмененный плейлист не парсится ---
+        # Дополнительные плейлисты из конфига ("extra_playlists") сводятся с основным в один список
+        playlist_paths = [M3U_FILE_PATH] + [str(path) for path in self.config.get("extra_playlists", [])]
+        channel_data, sync_stats = sync_channel_cache(load_channels_from_json(), playlist_paths, parse_m3u_simplified)
+        action = sync_stats['action']
+        if action == 'merged':
+            print(f"[INFO] M3U изменился: +{sync_stats['added']} -{sync_stats['removed']} ~{sync_stats['changed']}, ручных URL сохранено: {sync_stats['kept_overrides']}")
+            self.update_statusbar(f"Плейлист обновлен: +{sync_stats['added']} / -{sync_stats['removed']} / ~{sync_stats['changed']} кан. Сохранение...")
+        elif action == 'parsed': self.update_statusbar(f"Спарсено {len(channel_data['channels'])} кан. Сохранение...")
+        elif action == 'parse_failed': self.update_statusbar(f"Не удалось прочитать из {os.path.basename(M3U_FILE_PATH)}")
+        elif channel_data is None: self.update_statusbar(f"Не найдены файлы {os.path.basename(JSON_CACHE_FILE_PATH)} и {os.path.basename(M3U_FILE_PATH)}")
+        if sync_stats['dirty']: save_channels_to_json(channel_data) # Сохраняет в JSON_CACHE_FILE_PATH
+        self.channel_data: Optional[ChannelCacheData] = channel_data
+        self.epg_url_from_m3u = channel_data['epg_url'] if channel_data else None # EPG URL хранится в JSON вместе с каналами
+        self.channels = channel_data['channels'] if channel_data else []
+        self.channel_index.rebuild(self.channels); self.populate_channel_list()
         if self.channels:
-            self.update_statusbar(f"Загружено каналов: {len(self.channels)}. Проверка статусов...")
-            self.refresh_statuses_threaded()
+            known_count = self.load_known_statuses(); self.channel_list.refresh()
+            self.update_statusbar(f"Загружено каналов: {len(self.channels)}, статусов из истории: {known_count}. Проверка устаревших...")
+            self.refresh_statuses_threaded(only_stale=True)
 
-    def populate_channel_list(self):
-        # ... (код как в предыдущем примере) ...
-        for widget in self.channel_widgets: widget.destroy()
-        self.channel_widgets = []; self.selected_channel_widget = None
-        self.reset_info_panel()
+    def load_known_statuses(self) -> int:
+        """Подставляет последние сохраненные статусы, возвращает их число."""
+        known_results = self.status_store.latest() if self.status_store else {}; self.known_results = known_results
         for i, channel in enumerate(self.channels):
-            num = channel.get('number', i + 1); name = channel.get('tvg_name') or channel.get('name', f'Канал {num}')
-            channel_button = ctk.CTkButton(self.channel_list_frame, text=f"{num}. {name}", fg_color="transparent", text_color=("gray10", "gray90"), hover=False, anchor="w")
-            channel_button.configure(command=lambda w=channel, btn=channel_button: self.select_channel(widget_button=btn, channel_data=w))
-            channel_button.grid(row=i, column=0, padx=5, pady=(1, 1), sticky="ew"); self.channel_widgets.append(channel_button)
-
+            known = known_results.get(channel.get('url')) if channel.get('url') else None
+            if known is not None: self.channel_statuses[channel.get('number', i + 1)] = status_from_outcome(known)
+        return len(self.channel_statuses)
 
-    def select_channel(self, widget_button: ctk.CTkButton, channel_data: ChannelInfo):
-        # ... (код как в предыдущем примере) ...
-        if self.selected_channel_widget and self.selected_channel_widget != widget_button: self.selected_channel_widget.configure(fg_color="transparent")
-        widget_button.configure(fg_color=("gray75", "gray25")); self.selected_channel_widget = widget_button; self.selected_channel_data = channel_data
+    def populate_channel_list(self):
+        # Виджеты не пересоздаются: пул строк списка просто перепривязывается к новым данным
+        self.reset_info_panel(); self.apply_search(force=True)
+
+    def apply_search(self, force: bool = False):
+        """Живой поиск: список показывает только каналы, в названии которых есть введенный текст (по индексу)."""
+        term = self.search_entry.get().strip()
+        if term == self.applied_search_term and not force: return # Клавиша не изменила текст
+        self.applied_search_term = term
+        self.channel_list.set_items(self.channel_index.channels_at(self.channel_index.search(term)) if term else self.channels)
+        if term: self.update_statusbar(f"Найдено каналов: {len(self.channel_list.items)}")
+
+    def select_channel(self, channel_data: ChannelInfo):
+        # Выделение строки рисует сам список (VirtualChannelList), здесь - только панель информации
+        self.selected_channel_data = channel_data
         ch_name = channel_data.get('tvg_name') or channel_data.get('name', ''); ch_group = channel_data.get('group', 'N/A')
         ch_url = channel_data.get('url'); ch_num = channel_data.get('number', -1); ch_id = channel_data.get('id')
         self.info_title_label.configure(text=f"{ch_num}. {ch_name}"); self.info_group_label.configure(text=f"Группа: {ch_group}"); self.info_url_label.configure(text=f"URL: {ch_url or 'Нет'}")
-        current_program = find_current_program(ch_id, self.epg_data); self.epg_now_label.configure(text=f"{current_program or 'N/A'}")
+        self.epg_now_label.configure(text=self.format_now_and_next(ch_id))
         status_info = self.channel_statuses.get(ch_num)
         if status_info: status_text, _, status_color = status_info; self.status_label_channel.configure(text=status_text, text_color=status_color)
         else: self.status_label_channel.configure(text="Не проверен", text_color="gray")
         self.launch_button.configure(state="normal" if ch_url else "disabled"); self.update_statusbar(f"Выбран канал #{ch_num}: {ch_name}")
 
+    def format_now_and_next(self, channel_id: Optional[str]) -> str:
+        current_program, next_program = self.epg_data.now_and_next([channel_id]).get(channel_id, (None, None))
+        return f"{current_program or 'N/A'}" + (f"\nДалее: {next_program}" if next_program else "")
+
     def reset_info_panel(self):
         # ... (код как в предыдущем примере) ...
         self.info_title_label.configure(text="Канал не выбран"); self.info_group_label.configure(text="Группа: -"); self.info_url_label.configure(text="URL: -")
         self.epg_now_label.configure(text="N/A"); self.status_label_channel.configure(text="N/A", text_color=("gray10", "gray90")); self.launch_button.configure(state="disabled")
-        if self.selected_channel_widget: self.selected_channel_widget.configure(fg_color="transparent"); self.selected_channel_widget = None
-        self.selected_channel_data = None
+        self.channel_list.clear_selection(); self.selected_channel_data = None
 
     def update_statusbar(self, text: str):
         # ... (код как в предыдущем примере) ...
@@ -364,7 +454,7 @@ class App(ctk.CTk):
 
     def update_channel_status_display(self, channel_num: int, status_info: ChannelStatus):
         # ... (код как в предыдущем примере) ...
-        self.channel_statuses[channel_num] = status_info
+        self.channel_statuses[channel_num] = status_info; self.channel_list.refresh()
         if self.selected_channel_data and self.selected_channel_data.get('number') == channel_num:
             status_text, _, status_color = status_info
             self.status_label_channel.configure(text=status_text, text_color=status_color)
@@ -375,57 +465,87 @@ class App(ctk.CTk):
         epg_url_to_use = self.epg_url_from_m3u # Берем URL, полученный при парсинге M3U
         if epg_url_to_use:
             self.update_statusbar("Загрузка EPG в фоне...")
-            self.epg_result = {}
-            self.epg_thread = threading.Thread(target=download_and_parse_epg_worker, args=(epg_url_to_use, self.epg_result), daemon=True)
+            self.epg_result = {}; playlist_channel_ids = {ch['id'] for ch in self.channels if ch.get('id')}
+            self.epg_thread = threading.Thread(target=download_and_parse_epg_worker, args=(epg_url_to_use, self.epg_result, playlist_channel_ids), daemon=True)
             self.epg_thread.start(); self.after(100, self.check_epg_result)
 
     def check_epg_result(self):
         # ... (код как в предыдущем примере) ...
         if self.epg_thread and not self.epg_thread.is_alive():
-            self.epg_data = self.epg_result.get('epg', {}); status_msg = "EPG загружено." if self.epg_data else "Не удалось загрузить EPG."
+            self.epg_data = self.epg_result.get('epg', EPGIndex()); status_msg = "EPG загружено." if self.epg_data else "Не удалось загрузить EPG."
             self.update_statusbar(status_msg + " Проверка статусов может продолжаться.")
-            if self.selected_channel_data: ch_id = self.selected_channel_data.get('id'); current_program = find_current_program(ch_id, self.epg_data); self.epg_now_label.configure(text=f"{current_program or 'N/A'}")
+            if self.selected_channel_data: self.epg_now_label.configure(text=self.format_now_and_next(self.selected_channel_data.get('id')))
             self.epg_thread = None
         elif self.epg_thread and self.epg_thread.is_alive(): self.after(500, self.check_epg_result)
 
-
-    def refresh_statuses_threaded(self):
-        # ... (код как в предыдущем примере) ...
-        if any(t.is_alive() for t in self.status_threads): self.update_statusbar("Проверка статусов уже идет..."); return
-        self.update_statusbar("Запуск проверки статусов..."); self.channel_statuses.clear(); self.status_threads = []; self.stop_status_check = False
-        total_channels = len(self.channels); self.checked_count = 0
-        if total_channels == 0: self.update_statusbar("Нет каналов для проверки."); return
+    def refresh_statuses_threaded(self, only_stale: bool = False):
+        """Проверяет все каналы, а при only_stale - только те, чей сохраненный статус старше TTL."""
+        if self.status_engine is not None: self.update_statusbar("Проверка статусов уже идет..."); return
+        jobs = [((channel_data.get('number', i + 1), channel_data.get('url')), channel_data.get('url'), headers_from_vlc_opts(channel_data.get('vlc_opts')))
+                for i, channel_data in enumerate(self.channels)]
+        if only_stale:
+            ttl_seconds = float(self.config.get("status_recheck_ttl_minutes", STATUS_RECHECK_TTL_MINUTES)) * 60; now = time.time()
+            jobs = [job for job in jobs if needs_recheck(self.known_results.get(job[1]) if job[1] else None, ttl_seconds, now)]
+        else: self.channel_statuses.clear()
+        self.total_channels_to_check = len(jobs); self.checked_count = 0
+        if self.total_channels_to_check == 0: self.update_statusbar("Все статусы актуальны." if only_stale else "Нет каналов для проверки."); return
+        self.update_statusbar("Запуск проверки статусов...")
         self.progress_bar.grid(row=0, column=1, padx=10, pady=5, sticky="e"); self.progress_bar.set(0)
-        self.refresh_button.configure(state="disabled", text="Проверка...")
-        for i, channel_data in enumerate(self.channels):
-            if self.stop_status_check: break
-            channel_num = channel_data.get('number', i + 1); url = channel_data.get('url')
-            thread = threading.Thread(target=self.check_single_channel_and_update, args=(channel_num, url, total_channels), daemon=True)
-            self.status_threads.append(thread); thread.start()
-        self.after(100, self.check_status_completion)
-
-    def check_single_channel_and_update(self, channel_num, url, total_channels):
-        # ... (код как в предыдущем примере) ...
-        status_info: ChannelStatus = ("Ошибка потока", None, "gray")
-        try: check_result = {}; check_channel_availability_worker(channel_num, url, check_result); status_info = check_result.get(channel_num, status_info)
-        finally:
-            with threading.Lock(): self.checked_count += 1
-            self.after(0, lambda ch_num=channel_num, status=status_info, total=total_channels: self._update_progress_and_status(ch_num, status, total))
-
-    def _update_progress_and_status(self, channel_num, status_info, total_channels):
-        # ... (код как в предыдущем примере) ...
-        self.update_channel_status_display(channel_num, status_info)
-        progress = self.checked_count / total_channels if total_channels > 0 else 0
-        self.progress_bar.set(progress); self.update_statusbar(f"Проверка: {self.checked_count}/{total_channels}")
-
-    def check_status_completion(self):
-        # ... (код как в предыдущем примере) ...
-        active_threads = [t for t in self.status_threads if t.is_alive()]
-        if not active_threads:
-            self.update_statusbar(f"Проверка статусов завершена.")
-            self.progress_bar.grid_forget(); self.refresh_button.configure(state="normal", text="Обновить статусы")
-            self.status_threads = []
-        else: self.after(500, self.check_status_completion)
+        self.refresh_button.configure(text="Остановить проверку", command=self.stop_status_check)
+        # Фиксированный пул потоков движка пишет результаты в очередь, главный поток забирает их пачками
+        check_func = functools.partial(run_channel_check, deep=bool(self.config.get("deep_hls_check", False)), pool=self.host_pool)
+        self.host_pool.breaker.reset_counters(); self.host_pool.latency.reset_counters()
+        engine = CheckEngine(check_func, max_concurrency=CHECK_MAX_CONCURRENCY, error_result=make_outcome(), coalesce_key=check_coalesce_key, # Один запрос на одинаковый URL
+                             max_per_host=self.max_per_host)
+        results = queue.Queue(); self.status_engine = engine; self.status_results = results
+        self.status_thread = threading.Thread(target=self._run_status_engine, args=(engine, jobs, results), daemon=True)
+        self.status_thread.start(); self.after(STATUS_UI_REFRESH_MS, self.drain_status_results)
+
+    def _run_status_engine(self, engine: CheckEngine, jobs: List[Tuple[Tuple[int, Optional[str]], Optional[str], Optional[Dict[str, str]]]], results: "queue.Queue[Any]"):
+        try:
+            dns_stats = self.host_pool.dns.prefetch(url_hostnames(job[1] for job in jobs)) # Имена хостов резолвятся разом, до проверок
+            print(f"[INFO] DNS: {dns_stats['hosts']} хостов за {dns_stats['seconds']:.1f} с, не резолвится: {dns_stats['failed']}")
+            with METRICS.phase('check_pass'): asyncio.run(engine.run(jobs, lambda key, result: results.put((key, result))))
+        except Exception as e: print(f"[STATUS THREAD ERROR] {e}")
+        finally: results.put(None) # Маркер завершения
+
+    def drain_status_results(self):
+        finished = False; updated = 0; to_save: List[Tuple[str, CheckOutcome]] = []
+        while True:
+            try: item = self.status_results.get_nowait()
+            except queue.Empty: break
+            if item is None: finished = True; break
+            (channel_num, url), result = item; self.channel_statuses[channel_num] = status_from_outcome(result); updated += 1; METRICS.observe_check(url, result)
+            if url: to_save.append((url, result))
+        if to_save and self.status_store: # Одна транзакция на пачку
+            try: self.status_store.record_many(to_save)
+            except Exception as e: print(f"[STATUS STORE ERROR] {e}")
+        if updated:
+            self.checked_count += updated
+            selected_num = self.selected_channel_data.get('number') if self.selected_channel_data else None
+            if selected_num in self.channel_statuses: self.update_channel_status_display(selected_num, self.channel_statuses[selected_num])
+            self.channel_list.refresh() # Цвет статуса - только у видимых строк
+            total = self.total_channels_to_check
+            self.progress_bar.set(self.checked_count / total if total > 0 else 0); self.update_statusbar(f"Проверка: {self.checked_count}/{total}")
+        if finished: self.finish_status_check()
+        else: self.after(STATUS_UI_REFRESH_MS, self.drain_status_results)
+
+    def finish_status_check(self):
+        cancelled = self.status_engine is not None and self.status_engine.cancelled
+        saved = self.status_engine.requests_saved if self.status_engine is not None else 0
+        pool_totals = self.host_pool.totals(); print(f"[INFO] Соединения: запросов {pool_totals['requests']}, новых {pool_totals['connections']}, переиспользовано {pool_totals['reused']}")
+        breaker = self.host_pool.breaker; summary = f" Запросов сэкономлено на повторяющихся URL: {saved}." if saved else ""
+        latency = self.host_pool.latency
+        if latency.hedges_sent: print(f"[INFO] Дублирующих запросов: {latency.hedges_sent}, дубль ответил первым: {latency.hedges_won}")
+        if breaker.short_circuited: summary += f" Недоступных хостов: {breaker.open_hosts()}, пропущено проверок: {breaker.short_circuited} (~{breaker.saved_seconds:.0f} с)."
+        self.update_statusbar(("Проверка статусов остановлена." if cancelled else "Проверка статусов завершена.") + summary)
+        self.progress_bar.grid_forget(); self.refresh_button.configure(state="normal", text="Обновить статусы", command=self.refresh_statuses_threaded)
+        self.status_engine = None; self.status_thread = None
+
+    def stop_status_check(self):
+        # Новые проверки не запускаются, уже идущие запросы доживают до своего таймаута
+        if self.status_engine:
+            self.status_engine.cancel(); self.refresh_button.configure(state="disabled", text="Остановка...")
 
     def launch_channel(self):
         # ... (код как в предыдущем примере, использует self.config) ...
@@ -452,7 +572,15 @@ class App(ctk.CTk):
     def on_closing(self):
         # ... (код как в предыдущем примере) ...
         print("Завершение работы...")
-        self.stop_status_check = True
+        self.stop_status_check()
+        if self.status_store: self.status_store.close()
+        self.host_pool.close()
+        for line in METRICS.summary_lines(): print(f"[METRICS] {line}")
+        metrics_file = self.config.get('metrics_file')
+        if metrics_file:
+            try: METRICS.write_file(os.path.join(APP_DIR, metrics_file))
+            except OSError as e: print(f"[ERROR] Ошибка записи метрик '{metrics_file}': {e}")
+        METRICS.close()
         self.destroy()
 
 # --- Точка входа ---
@@ -0,0 +1,275 @@
+# --- Общий пул соединений для проверок каналов ---
+# Один потокобезопасный requests.Session на все рабочие потоки: keep-alive соединения
+# хранятся отдельно для каждого хоста (схема + хост + порт), поэтому 40 каналов одного CDN
+# платят за TCP/TLS один раз, а не 40. Число одновременных запросов к одному хосту ограничено,
+# чтобы параллельная проверка не упиралась в rate limit. Счетчики переиспользования - по хостам.
+# Автомат (circuit breaker) по хостам: после нескольких подряд отказов соединения или таймаутов
+# остальные каналы хоста сразу получают "хост недоступен", пока пробная проверка не покажет обратное.
+# Таймауты подстраиваются под каждый хост по перцентилям его задержек, а зависший дольше p95 запрос
+# дублируется (hedged request) - берется ответ, пришедший первым.
+import functools
+import math
+import threading
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from contextlib import contextmanager
+from typing import Any, Callable, Deque, Dict, Iterator, Optional, Tuple
+from urllib.parse import urlsplit
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from dns_cache import DnsCache, DnsCachingAdapter
+
+DEFAULT_MAX_PER_HOST = 4 # Одновременных запросов к одному хосту
+DEFAULT_MAX_HOSTS = 1024 # Сколько хостов держат пул соединений одновременно (дальше - вытеснение самых старых)
+CIRCUIT_FAILURE_THRESHOLD = 3 # Столько отказов подряд - и хост считается недоступным
+CIRCUIT_COOLDOWN_SECONDS = 60 # Через столько секунд на недоступный хост пускается одна пробная проверка
+TIMEOUT_FLOOR_SECONDS = 1.5 # Адаптивный таймаут не короче...
+TIMEOUT_CEILING_SECONDS = 10.0 # ...и не длиннее (он же - для хостов, о которых еще мало данных)
+TIMEOUT_P95_MULTIPLIER = 3.0 # Таймаут = p95 задержки хоста * множитель
+LATENCY_MIN_SAMPLES = 5 # Сколько ответов хоста нужно, чтобы доверять его перцентилям
+LATENCY_WINDOW = 50 # Сколько последних задержек хоста хранится
+TIMEOUT_STREAK_TO_CEILING = 2 # Столько таймаутов подряд - и хост снова получает потолок, пока не ответит
+HEDGE_MAX_WORKERS = 64 # Потоки для запросов с дублированием (основной + дубль)
+
+HostStats = Dict[str, int] # {'requests', 'connections', 'reused', 'waits'}
+
+_DEFAULT_PORTS = {'http': 80, 'https': 443}
+
+
+def _format_host(scheme: str, hostname: str, port: Optional[int]) -> str:
+    return f"{scheme}://{hostname}:{port or _DEFAULT_PORTS.get(scheme, 0)}"
+
+
+def host_key(url: Optional[str]) -> str:
+    """Ключ хоста для лимитов и статистики: 'схема://хост:порт' в нижнем регистре ('' - URL не разобрать)."""
+    try:
+        parts = urlsplit(url or ''); scheme = parts.scheme.lower(); port = parts.port
+    except ValueError: return ''
+    if not parts.hostname: return ''
+    return _format_host(scheme, parts.hostname, port)
+
+
+class HostCircuitBreaker:
+    """Автомат по хостам: closed (проверки идут) -> open (после failure_threshold отказов подряд проверки
+    не делаются) -> half-open (по истечении cooldown пропускается одна пробная проверка: успех закрывает
+    автомат, отказ снова открывает). Отказ - только ошибка соединения или таймаут, HTTP-ошибки хост не "роняют".
+
+    Счетчики short_circuited / saved_seconds: сколько проверок пропущено и сколько времени они заняли бы
+    (по средней длительности отказов этого хоста). Потокобезопасен."""
+
+    def __init__(self, failure_threshold: int = CIRCUIT_FAILURE_THRESHOLD, cooldown_seconds: float = CIRCUIT_COOLDOWN_SECONDS,
+                 clock: Callable[[], float] = time.monotonic):
+        self.failure_threshold = max(1, int(failure_threshold)); self.cooldown_seconds = cooldown_seconds; self.clock = clock
+        self._lock = threading.Lock(); self._failures: Dict[str, int] = {}; self._opened_at: Dict[str, float] = {}
+        self._probing: Dict[str, bool] = {}; self._failure_cost: Dict[str, float] = {} # Хост -> средняя длительность отказа, сек
+        self.short_circuited = 0; self.saved_seconds = 0.0
+
+    def allow(self, host: str) -> bool:
+        """Можно ли проверять хост сейчас. False - проверку нужно пропустить (засчитывается в short_circuited)."""
+        if not host: return True
+        with self._lock:
+            opened_at = self._opened_at.get(host)
+            if opened_at is None: return True
+            if not self._probing.get(host) and self.clock() - opened_at >= self.cooldown_seconds:
+                self._probing[host] = True; return True # Пробная проверка (half-open)
+            self.short_circuited += 1; self.saved_seconds += self._failure_cost.get(host, 0.0)
+            return False
+
+    def record(self, host: str, failed: bool, duration: float = 0.0) -> None:
+        """Итог проверки, разрешенной allow(): failed - отказ соединения / таймаут, duration - сколько она длилась."""
+        if not host: return
+        with self._lock:
+            if not failed:
+                self._failures.pop(host, None); self._opened_at.pop(host, None); self._probing.pop(host, None); return
+            count = self._failures[host] = self._failures.get(host, 0) + 1
+            cost = self._failure_cost.get(host); self._failure_cost[host] = duration if cost is None else (cost * (count - 1) + duration) / count
+            if self._probing.pop(host, None) or count >= self.failure_threshold: self._opened_at[host] = self.clock()
+
+    def is_open(self, host: str) -> bool:
+        with self._lock: return host in self._opened_at
+
+    def open_hosts(self) -> int:
+        with self._lock: return len(self._opened_at)
+
+    def reset_counters(self) -> None:
+        """Обнуляет счетчики пропусков (например, перед новым проходом). Состояние хостов сохраняется."""
+        with self._lock: self.short_circuited = 0; self.saved_seconds = 0.0
+
+
+def percentile(sorted_values: Any, fraction: float) -> float:
+    """Перцентиль (ближайший ранг) уже отсортированной последовательности."""
+    return sorted_values[min(len(sorted_values) - 1, max(0, math.ceil(fraction * len(sorted_values)) - 1))]
+
+
+class HostLatencyTracker:
+    """Задержки ответов по хостам за текущий запуск и производные от них таймаут и порог дублирования.
+
+    Пока у хоста меньше min_samples попыток, таймаут - ceiling и без дублирования. Дальше таймаут -
+    p95 * multiplier в пределах [floor, ceiling], а запрос, не получивший ответа за p95, дублируется.
+    Таймаут тоже идет в выборку (задержкой, равной выданному таймауту), иначе p95 быстрого хоста не смог бы
+    вырасти обратно; после streak_to_ceiling таймаутов подряд хост получает ceiling до первого ответа."""
+
+    def __init__(self, floor: float = TIMEOUT_FLOOR_SECONDS, ceiling: float = TIMEOUT_CEILING_SECONDS, multiplier: float = TIMEOUT_P95_MULTIPLIER,
+                 min_samples: int = LATENCY_MIN_SAMPLES, window: int = LATENCY_WINDOW, streak_to_ceiling: int = TIMEOUT_STREAK_TO_CEILING):
+        self.floor = floor; self.ceiling = max(ceiling, floor); self.multiplier = multiplier; self.min_samples = max(1, int(min_samples)); self.window = window
+        self.streak_to_ceiling = max(1, int(streak_to_ceiling))
+        self._lock = threading.Lock(); self._samples: Dict[str, Deque[float]] = {}; self._timeout_streaks: Dict[str, int] = {}
+        self.hedges_sent = 0; self.hedges_won = 0 # Сколько раз отправлен дубль / сколько раз он ответил первым
+
+    def record(self, host: str, seconds: float) -> None:
+        """Ответ хоста за seconds секунд."""
+        self._append(host, seconds, timed_out=False)
+
+    def record_timeout(self, host: str, timeout: float) -> None:
+        """Попытка, не дождавшаяся ответа за timeout секунд: в выборку идет сам таймаут."""
+        self._append(host, timeout, timed_out=True)
+
+    def _append(self, host: str, seconds: float, timed_out: bool) -> None:
+        if not host: return
+        with self._lock:
+            samples = self._samples.get(host)
+            if samples is None: samples = self._samples[host] = deque(maxlen=self.window)
+            samples.append(seconds)
+            if timed_out: self._timeout_streaks[host] = self._timeout_streaks.get(host, 0) + 1
+            else: self._timeout_streaks.pop(host, None)
+
+    def p95(self, host: str) -> Optional[float]:
+        """p95 задержки хоста в секундах или None, если данных мало."""
+        with self._lock: samples = sorted(self._samples.get(host, ()))
+        return percentile(samples, 0.95) if len(samples) >= self.min_samples else None
+
+    def timeout_for(self, host: str) -> float:
+        with self._lock: timing_out = self._timeout_streaks.get(host, 0) >= self.streak_to_ceiling
+        if timing_out: return self.ceiling
+        p95 = self.p95(host)
+        return self.ceiling if p95 is None else min(max(p95 * self.multiplier, self.floor), self.ceiling)
+
+    def hedge_after(self, host: str) -> Optional[float]:
+        """Через сколько секунд без ответа отправлять дубль (None - не дублировать)."""
+        return self.p95(host)
+
+    def record_hedge(self, won: bool) -> None:
+        with self._lock: self.hedges_sent += 1; self.hedges_won += int(won)
+
+    def reset_counters(self) -> None:
+        with self._lock: self.hedges_sent = 0; self.hedges_won = 0
+
+
+_hedge_executor = ThreadPoolExecutor(max_workers=HEDGE_MAX_WORKERS, thread_name_prefix="iptv-hedge")
+
+
+def _finish_loser(release: Callable[[], None], discard: Optional[Callable[[Any], None]], future: Future) -> None:
+    try:
+        if discard is not None and future.exception() is None: discard(future.result())
+    finally: release()
+
+
+def hedged_call(func: Callable[[], Any], hedge_after: Optional[float], try_slot: Optional[Callable[[], Optional[Callable[[], None]]]] = None,
+                discard: Optional[Callable[[Any], None]] = None) -> Tuple[Any, Optional[bool]]:
+    """Вызывает func; если за hedge_after секунд ответа нет - запускает второй такой же вызов и возвращает
+    результат того, кто успешно завершился первым. Второе значение: None - дубля не было, True/False - дубль
+    выиграл/проиграл. Если оба вызова упали - пробрасывается исключение основного.
+
+    try_slot() занимает место для дубля без ожидания и возвращает функцию его освобождения (None - мест нет,
+    дубль не отправляется; см. HostPool.try_host_slot). Проигравший вызов не прерывается и доживает до своего
+    таймаута, поэтому место освобождается, когда завершится он, а не победитель: вызывающий код держит одно
+    место на время hedged_call, и запросов в полете никогда не больше занятых мест. discard(результат) получает
+    результат проигравшего (например, чтобы закрыть ответ).
+    hedge_after отсчитывается с момента, когда основной вызов начал выполняться: ожидание свободного потока
+    в общем _hedge_executor (проверки из нескольких проходов сразу) не считается задержкой хоста."""
+    if hedge_after is None: return func(), None
+    started = threading.Event()
+
+    def run_primary() -> Any:
+        started.set(); return func()
+
+    primary = _hedge_executor.submit(run_primary); started.wait()
+    if wait([primary], timeout=hedge_after).done: return primary.result(), None
+    release = try_slot() if try_slot is not None else _no_release
+    if release is None: return primary.result(), None
+    hedge = _hedge_executor.submit(func); running = {primary, hedge}; winner = None
+    while running and winner is None:
+        done, running = wait(running, return_when=FIRST_COMPLETED)
+        winner = next((future for future in (primary, hedge) if future in done and future.exception() is None), None)
+    loser = hedge if winner is not hedge else primary
+    loser.add_done_callback(functools.partial(_finish_loser, release, discard))
+    if winner is None: return primary.result(), False
+    return winner.result(), winner is hedge
+
+
+def _no_release() -> None:
+    pass
+
+
+class HostPool:
+    """Session с пулом keep-alive соединений на каждый хост и лимитом одновременных запросов к хосту.
+
+    Запросы идут через self.session (он общий для всех потоков), а host_slot(url) занимает одно
+    из max_per_host мест хоста на время проверки. Если мест нет - поток ждет (счетчик 'waits').
+    breaker (если задан) решает, проверять ли хост вообще (см. HostCircuitBreaker), latency (если задан) -
+    какой таймаут давать хосту и когда дублировать запрос (см. HostLatencyTracker; дубль занимает свое место хоста - try_host_slot), dns (если задан) -
+    откуда соединения берут адреса хостов (см. DnsCache)."""
+
+    def __init__(self, max_per_host: int = DEFAULT_MAX_PER_HOST, max_hosts: int = DEFAULT_MAX_HOSTS, breaker: Optional[HostCircuitBreaker] = None,
+                 latency: Optional[HostLatencyTracker] = None, dns: Optional[DnsCache] = None):
+        self.max_per_host = max(1, int(max_per_host)); self.breaker = breaker; self.latency = latency; self.dns = dns
+        self.session = requests.Session()
+        adapter_kwargs = {'pool_connections': max_hosts, 'pool_maxsize': self.max_per_host} # Сверх лимита соединения не хранятся
+        adapter = DnsCachingAdapter(dns, **adapter_kwargs) if dns is not None else HTTPAdapter(**adapter_kwargs)
+        self.session.mount('http://', adapter); self.session.mount('https://', adapter); self._adapter = adapter
+        self._lock = threading.Lock(); self._slots: Dict[str, threading.BoundedSemaphore] = {}; self._waits: Dict[str, int] = {}
+
+    def _semaphore(self, host: str) -> threading.BoundedSemaphore:
+        with self._lock:
+            semaphore = self._slots.get(host)
+            if semaphore is None: semaphore = self._slots[host] = threading.BoundedSemaphore(self.max_per_host)
+            return semaphore
+
+    @contextmanager
+    def host_slot(self, url: Optional[str]) -> Iterator[None]:
+        """Место для запроса к хосту url на время блока with. URL без хоста не ограничивается."""
+        host = host_key(url)
+        if not host: yield; return
+        semaphore = self._semaphore(host)
+        if not semaphore.acquire(blocking=False):
+            with self._lock: self._waits[host] = self._waits.get(host, 0) + 1
+            semaphore.acquire()
+        try: yield
+        finally: semaphore.release()
+
+    def try_host_slot(self, url: Optional[str]) -> Optional[Callable[[], None]]:
+        """Место для еще одного запроса к хосту url, только если оно свободно прямо сейчас (для дубля запроса).
+        Возвращает функцию освобождения места или None, если мест нет."""
+        host = host_key(url)
+        if not host: return _no_release
+        semaphore = self._semaphore(host)
+        return semaphore.release if semaphore.acquire(blocking=False) else None
+
+    def stats(self) -> Dict[str, HostStats]:
+        """Счетчики по хостам: запросов, новых соединений, переиспользований соединения и ожиданий места.
+        Запросы и соединения считает сам urllib3 (по пулам, которые еще не вытеснены)."""
+        result: Dict[str, HostStats] = {}
+        pools = self._adapter.poolmanager.pools
+        for key in pools.keys():
+            pool = pools.get(key)
+            if pool is None: continue
+            host = _format_host(key.key_scheme, key.key_host, key.key_port)
+            entry = result.setdefault(host, {'requests': 0, 'connections': 0, 'reused': 0, 'waits': 0})
+            entry['requests'] += pool.num_requests; entry['connections'] += pool.num_connections
+            entry['reused'] = max(entry['requests'] - entry['connections'], 0)
+        with self._lock:
+            for host, waits in self._waits.items(): result.setdefault(host, {'requests': 0, 'connections': 0, 'reused': 0, 'waits': 0})['waits'] = waits
+        return result
+
+    def totals(self) -> HostStats:
+        """Сумма stats() по всем хостам."""
+        total = {'requests': 0, 'connections': 0, 'reused': 0, 'waits': 0}
+        for entry in self.stats().values():
+            for field in total: total[field] += entry[field]
+        return total
+
+    def close(self) -> None:
+        self.session.close()
@@ -1,4 +1,4 @@
-import re
+import argparse
 import requests
 import subprocess
 import sys
@@ -6,14 +6,28 @@ import platform
 import os
 import gzip
 import xml.etree.ElementTree as ET
-import json
 import shutil
-from datetime import datetime, timezone
-from dateutil.parser import parse as parse_datetime
-from typing import List, Dict, Optional, Tuple, Any
+import threading
+import time
+from typing import List, Dict, Iterator, Optional, Set, Tuple, Any
 # Убедись, что установил: pip install packaging
 from packaging import version as packaging_version
 
+from batch_report import OUTPUT_FORMATS, BatchSummary, make_result_writer, result_record
+from channel_cache import ChannelCacheData, load_channel_cache, save_channel_cache, set_channel_url, sync_channel_cache
+from channel_index import ChannelIndex, channel_group, channel_title
+from check_engine import CheckEngine, iter_check_results
+from epg_cache import EPGCache, fetch_epg
+from epg_loader import EPGIndex, epg_time_window
+from dns_cache import DnsCache, url_hostnames
+from host_pool import HostCircuitBreaker, HostLatencyTracker, HostPool
+from m3u_parser import epg_url_from_header, iter_m3u_channels, read_m3u
+from metrics import Metrics, record_epg_phases
+from playlist_export import PlaylistExporter
+from recheck_scheduler import STABILITY_HISTORY_SIZE, RecheckScheduler
+from status_store import StatusStore, needs_recheck
+from stream_probe import CheckOutcome, check_coalesce_key, check_stream, headers_from_vlc_opts, make_outcome
+
 # --- Rich Console ---
 from rich.console import Console
 from rich.table import Table
@@ -31,12 +45,30 @@ VERSION_URL = "YOUR_JSON_METADATA_URL_HERE"
 # --- Константы ---
 M3U_FILE = "channels.m3u"
 JSON_CACHE_FILE = "channels.json"
+EXPORT_M3U_FILE = "channels_clean.m3u" # Очищенный плейлист: только живые каналы, в группе - по задержке
+EPG_CACHE_FILE = "epg_cache.bin" # Отфильтрованный EPG + ETag/Last-Modified фида
+EPG_CACHE_MAX_AGE_SECONDS = 3600 # Пока кеш моложе - фид не запрашивается вовсе
 EPG_PROCESSING_TIMEOUT_SECONDS = 30 # Таймаут на СКАЧИВАНИЕ EPG
-MAX_EPG_XML_SIZE_MB = 75 # Макс. размер XML для ПАРСИНГА (в MB)
+EPG_WINDOW_PAST_HOURS = 2 # Из EPG оставляем программы от (сейчас - 2ч)...
+EPG_WINDOW_FUTURE_HOURS = 24 # ...до (сейчас + 24ч)
+CHECK_MAX_CONCURRENCY = 32 # Сколько каналов проверяется одновременно
+CHECK_MAX_PER_HOST = 4 # ...и сколько из них максимум к одному хосту (CDN режет частые запросы)
+CHECK_TIMEOUT_FLOOR_SECONDS = 1.5 # Таймаут проверки подстраивается под хост (3 x p95 его задержки), но не короче...
+CHECK_TIMEOUT_CEILING_SECONDS = 10 # ...и не длиннее этого (новым хостам - потолок)
+CHECK_DEEP_HLS = False # Глубокая проверка HLS: скачивать master/media плейлисты вместо одного HEAD
+HLS_PROBE_BYTE_BUDGET = 256 * 1024 # Лимит байт на канал при глубокой проверке HLS и при разборе DASH-манифеста
+STATUS_DB_FILE = "status_history.sqlite" # История проверок каналов
+STATUS_RECHECK_TTL_SECONDS = 30 * 60 # Статус моложе этого не перепроверяется при запуске
+STATUS_SAVE_BATCH = 20 # Сколько результатов копить перед записью в историю
+MONITOR_MAX_SLEEP_SECONDS = 5 # Мониторинг: как долго максимум ждать следующего срока (чтобы Ctrl+C срабатывал быстро)
+CHANNEL_TABLE_PAGE_SIZE = 40 # Строк на странице таблицы каналов (EPG и статусы считаются только для видимой страницы)
+BATCH_MAX_FAILURE_RATE = 0.5 # --batch: если неудачных проверок больше этой доли, код выхода 1
+BATCH_COALESCE_MEMORY = 10000 # --batch: сколько последних результатов помнить для повторяющихся URL (память не растет с плейлистом)
 
 # --- Структуры данных ---
 ChannelInfo = Dict[str, Any]
-EPGData = Dict[str, List[Tuple[datetime, datetime, str]]]
+
+METRICS = Metrics() # Время фаз, задержки по хостам и исходы проверок этого запуска (--metrics-file / --metrics-port)
 
 # --- Функция очистки консоли ---
 def clear_console():
@@ -44,138 +76,242 @@ def clear_console():
     os.system(command)
 
 # --- Функции для работы с JSON кешем каналов ---
-def load_channels_from_json(filepath: str = JSON_CACHE_FILE) -> Optional[List[ChannelInfo]]:
-    if not os.path.exists(filepath): return None
+def load_channels_from_json(filepath: str = JSON_CACHE_FILE) -> Optional[ChannelCacheData]:
     try:
-        with open(filepath, 'r', encoding='utf-8') as f: channels = json.load(f)
-        if isinstance(channels, list) and all(isinstance(ch, dict) for ch in channels):
-             for i, ch in enumerate(channels): ch.setdefault('number', i + 1)
-             return channels
-        else: return None
+        with METRICS.phase('json_load'): return load_channel_cache(filepath)
     except Exception: return None
 
-def save_channels_to_json(channels: List[ChannelInfo], filepath: str = JSON_CACHE_FILE):
+def save_channels_to_json(data: ChannelCacheData, filepath: str = JSON_CACHE_FILE):
     try:
-        with open(filepath, 'w', encoding='utf-8') as f: json.dump(channels, f, ensure_ascii=False, indent=2)
+        with METRICS.phase('json_save'): save_channel_cache(data, filepath)
     except Exception as e: console.print(f"[red]Ошибка сохранения JSON '{filepath}':[/red] {e}")
 
+def load_channel_list(m3u_paths: Optional[List[str]] = None) -> Optional[ChannelCacheData]:
+    """channels.json, сверенный с плейлистами (по умолчанию channels.m3u): неизмененные не парсятся, измененные сливаются с кешем.
+    Несколько плейлистов сводятся в один список с общей нумерацией."""
+    m3u_paths = m3u_paths or [M3U_FILE]; playlists_label = ", ".join(m3u_paths)
+    channel_data, sync_stats = sync_channel_cache(load_channels_from_json(), m3u_paths, parse_m3u)
+    action = sync_stats['action']
+    if action == 'parsed': console.print(f"\n[INFO] Загружено из [cyan]{playlists_label}[/cyan].")
+    elif action == 'merged':
+        console.print(f"\n[INFO] [cyan]{playlists_label}[/cyan] изменился: +{sync_stats['added']} / -{sync_stats['removed']} / ~{sync_stats['changed']} каналов"
+                      f" (без изменений: {sync_stats['unchanged']}, сохранено ручных URL: {sync_stats['kept_overrides']}).")
+    elif action == 'parse_failed' and channel_data: console.print(f"[yellow]Не удалось перечитать {playlists_label}, используется {JSON_CACHE_FILE}.[/yellow]")
+    if sync_stats['dirty']: save_channels_to_json(channel_data)
+    return channel_data
+
 # --- Функция парсинга M3U ---
-def parse_m3u(filepath: str = M3U_FILE) -> Tuple[Optional[str], List[ChannelInfo]]:
-    channels: List[ChannelInfo] = []; current_channel_info: ChannelInfo = {}; epg_url: Optional[str] = None
+def parse_m3u(filepath: str = M3U_FILE) -> Tuple[Dict[str, str], List[ChannelInfo]]:
     try:
-        with open(filepath, 'r', encoding='utf-8') as f:
-            for line in f:
-                line = line.strip();
-                if not line: continue
-                if line.startswith('#EXTM3U'):
-                    match = re.search(r'url-tvg="([^"]*)"', line);
-                    if match: epg_url = match.group(1)
-                    continue
-                elif line.startswith('#EXTINF:'):
-                    parts = line.split(',', 1); info_part = parts[0]; name_part = parts[1] if len(parts) > 1 else "Без имени"
-                    current_channel_info = {'name': name_part.strip()}
-                    match = re.search(r'tvg-name="([^"]*)"', info_part); current_channel_info['tvg_name'] = match.group(1) if match else current_channel_info['name']
-                    match = re.search(r'tvg-logo="([^"]*)"', info_part); current_channel_info['logo'] = match.group(1) if match else None
-                    match = re.search(r'group-title="([^"]*)"', info_part); current_channel_info['group'] = match.group(1) if match else "Без группы"
-                    match = re.search(r'tvg-id="([^"]*)"', info_part); current_channel_info['id'] = match.group(1) if match else None
-                    current_channel_info['_waiting_for_url'] = True
-                elif not line.startswith('#') and current_channel_info.get('_waiting_for_url'):
-                    current_channel_info['url'] = line; del current_channel_info['_waiting_for_url']
-                    current_channel_info['number'] = len(channels) + 1
-                    channels.append(current_channel_info); current_channel_info = {}
-    except FileNotFoundError: console.print(f"[bold red]Ошибка:[/bold red] Не найден файл '{filepath}'."); return None, []
-    except Exception as e: console.print(f"[bold red]Ошибка чтения M3U '{filepath}':[/bold red] {e}"); return None, []
-    return epg_url, channels
-
-# --- Функция загрузки и парсинга EPG (с лимитом размера XML) ---
-def download_and_parse_epg(url: Optional[str]) -> EPGData:
-    """Скачивает, распаковывает и парсит EPG, пропуская при ошибках, таймауте или слишком большом размере XML."""
+        with METRICS.phase('m3u_parse'): return read_m3u(filepath)
+    except FileNotFoundError: console.print(f"[bold red]Ошибка:[/bold red] Не найден файл '{filepath}'."); return {}, []
+    except Exception as e: console.print(f"[bold red]Ошибка чтения M3U '{filepath}':[/bold red] {e}"); return {}, []
+
+# --- Функция загрузки и парсинга EPG (потоковый парсинг + дисковый кеш) ---
+def download_and_parse_epg(url: Optional[str], channel_ids: Optional[Set[str]] = None) -> EPGIndex:
+    """Берет EPG из кеша или скачивает и парсит его на лету из gzip-потока, пропуская при ошибках или таймауте.
+    Сохраняются только каналы из channel_ids (если заданы) и программы из окна EPG_WINDOW_*."""
     if not url:
-        return {}
+        return EPGIndex()
 
     console.print(f"Попытка загрузки EPG (макс. {EPG_PROCESSING_TIMEOUT_SECONDS} сек)...", end="")
-    epg_data: EPGData = {}
     try:
         headers = {'User-Agent': 'IPTV Checker Script'}
-        response = requests.get(url, stream=True, timeout=EPG_PROCESSING_TIMEOUT_SECONDS, headers=headers)
-        response.raise_for_status()
-        console.print(" Загрузка...")
-
-        decompressed_data = bytearray()
-        gzip_stream = gzip.GzipFile(fileobj=response.raw)
-        while True:
-             try:
-                 chunk = gzip_stream.read(8192)
-                 if not chunk: break
-                 decompressed_data.extend(chunk)
-             except EOFError: break
-             except gzip.BadGzipFile: console.print(f"\n[bold red]Ошибка: неверный gzip EPG. Пропущено.[/bold red]"); return {}
-             except Exception as read_err: console.print(f"\n[bold red]Ошибка чтения EPG: {read_err}. Пропущено.[/bold red]"); return {}
-
-        xml_size_mb = len(decompressed_data) / (1024 * 1024)
-        console.print(f"  [dim]Размер XML: {xml_size_mb:.2f} MB.[/dim]")
-
-        # --- ПРОВЕРКА РАЗМЕРА ПЕРЕД ПАРСИНГОМ ---
-        if xml_size_mb > MAX_EPG_XML_SIZE_MB:
-            console.print(f"[bold yellow]Предупреждение:[/bold yellow] Размер EPG XML ({xml_size_mb:.1f}MB) > лимита ({MAX_EPG_XML_SIZE_MB}MB). Парсинг пропущен.")
-            return {}
-
-        # --- Если размер в норме, парсим ---
-        console.print("  Парсинг XML...")
-        if not decompressed_data: return {}
-
-        root = ET.fromstring(decompressed_data)
-        program_count = 0
-        programs_list = root.findall('programme')
-        for programme in programs_list:
-            channel_id = programme.get('channel'); start_str = programme.get('start'); stop_str = programme.get('stop'); title_elem = programme.find('title')
-            if channel_id and start_str and stop_str and title_elem is not None and title_elem.text:
-                try:
-                    start_time = parse_datetime(start_str); stop_time = parse_datetime(stop_str); title = title_elem.text.strip()
-                    if channel_id not in epg_data: epg_data[channel_id] = []
-                    epg_data[channel_id].append((start_time, stop_time, title)); program_count += 1
-                except Exception: pass
-
-        for channel_id in epg_data: epg_data[channel_id].sort(key=lambda x: x[0])
-        console.print(f"[green] EPG загружено ({len(epg_data)} каналов, {program_count} программ).[/green]")
+        time_window = epg_time_window(EPG_WINDOW_PAST_HOURS, EPG_WINDOW_FUTURE_HOURS)
+        try:
+            fetch_started = time.perf_counter()
+            epg_data, epg_stats = fetch_epg(url, EPGCache(EPG_CACHE_FILE), channel_ids, time_window, EPG_CACHE_MAX_AGE_SECONDS,
+                                            EPG_PROCESSING_TIMEOUT_SECONDS, headers)
+            record_epg_phases(METRICS, epg_stats, time.perf_counter() - fetch_started)
+        except gzip.BadGzipFile: console.print(f"\n[bold red]Ошибка: неверный gzip EPG. Пропущено.[/bold red]"); return EPGIndex()
+
+        source = epg_stats['source']
+        if source == 'cache': console.print(f" [green]Из кеша[/green] [dim](возраст {epg_stats['age_seconds'] // 60} мин).[/dim]")
+        elif source == 'not_modified': console.print(" [green]Не изменилось (304), взято из кеша.[/green]")
+        elif source == 'stale_cache': console.print(f" [yellow]Сеть недоступна, взят устаревший кеш[/yellow] [dim](возраст {epg_stats['age_seconds'] // 60} мин).[/dim]")
+        else:
+            console.print(" Загружено.")
+            console.print(f"  [dim]Размер XML: {epg_stats['xml_bytes'] / (1024 * 1024):.2f} MB.[/dim]")
+            console.print(f"  [dim]Отброшено программ: {epg_stats['dropped_channel']} (нет в плейлисте), {epg_stats['dropped_window']} (вне окна -{EPG_WINDOW_PAST_HOURS}ч/+{EPG_WINDOW_FUTURE_HOURS}ч).[/dim]")
+            if epg_stats['time_fallbacks']: console.print(f"  [dim]Нестандартных времен в EPG: {epg_stats['time_fallbacks']}.[/dim]")
+        console.print(f"[green] EPG загружено ({len(epg_data)} каналов, {epg_stats['programs']} программ).[/green]")
         return epg_data
 
-    except requests.exceptions.Timeout: console.print(f" [bold yellow]Таймаут! ({EPG_PROCESSING_TIMEOUT_SECONDS} сек). EPG пропущено.[/bold yellow]"); return {}
-    except requests.exceptions.RequestException as e: console.print(f" [bold red]Ошибка сети EPG! ({e}) Пропущено.[/bold red]"); return {}
-    except ET.ParseError as e: console.print(f" [bold red]Ошибка парсинга XML EPG! ({e}) Пропущено.[/bold red]"); return {}
-    except Exception as e: console.print(f" [bold red]Неизвестная ошибка EPG! ({e}) Пропущено.[/bold red]"); return {}
-
-# --- Функция поиска текущей программы ---
-def find_current_program(channel_id: Optional[str], epg_data: EPGData) -> Optional[str]:
-    if not channel_id or channel_id not in epg_data: return None
-    now = datetime.now(timezone.utc)
-    programs = epg_data[channel_id]
-    for start, stop, title in programs:
-        try:
-            start_aware = start.astimezone(timezone.utc) if start.tzinfo else start.replace(tzinfo=timezone.utc)
-            stop_aware = stop.astimezone(timezone.utc) if stop.tzinfo else stop.replace(tzinfo=timezone.utc)
-            if start_aware <= now < stop_aware: return title
-        except Exception: continue
-    return None
+    except requests.exceptions.Timeout: console.print(f" [bold yellow]Таймаут! ({EPG_PROCESSING_TIMEOUT_SECONDS} сек). EPG пропущено.[/bold yellow]"); return EPGIndex()
+    except requests.exceptions.RequestException as e: console.print(f" [bold red]Ошибка сети EPG! ({e}) Пропущено.[/bold red]"); return EPGIndex()
+    except ET.ParseError as e: console.print(f" [bold red]Ошибка парсинга XML EPG! ({e}) Пропущено.[/bold red]"); return EPGIndex()
+    except Exception as e: console.print(f" [bold red]Неизвестная ошибка EPG! ({e}) Пропущено.[/bold red]"); return EPGIndex()
 
 # --- Функция проверки доступности ---
-def check_channel_availability(url: Optional[str], timeout: int = 5) -> Tuple[str, Optional[int]]:
-    if not url or not url.lower().startswith(('http://', 'https://')): return "[grey50]⚪ Не HTTP(S)[/grey50]", None
-    headers = {'User-Agent': 'IPTV Checker Script'}; status_style, status_text, status_code = "white", "", None
+HOST_POOL = HostPool(CHECK_MAX_PER_HOST, breaker=HostCircuitBreaker(), # Keep-alive соединения по хостам + автомат для мертвых хостов
+                     latency=HostLatencyTracker(CHECK_TIMEOUT_FLOOR_SECONDS, CHECK_TIMEOUT_CEILING_SECONDS), # + таймауты по задержкам хоста
+                     dns=DnsCache()) # + адреса хостов из кеша DNS (заполняется перед проверкой)
+
+STATUS_STYLES: Dict[str, Tuple[str, str]] = {
+    'ok': ("✅ OK", "green"), 'not_found': ("❌ Не найден", "red"), 'forbidden': ("🚫 Запрещен", "yellow"),
+    'head_not_allowed': ("🟡 Метод HEAD запрещен", "yellow"), 'timeout': ("⏳ Таймаут", "orange3"),
+    'connection_error': ("🔗 Ошибка соединения", "red"), 'request_error': ("❓ Ошибка запроса", "magenta"),
+    'unknown': ("🆘 Неизвестно", "grey50"), 'not_http': ("⚪ Не HTTP(S)", "grey50"), 'too_large': ("⚠️ Плейлист больше лимита", "yellow"),
+    'host_down': ("⛔ Хост недоступен", "red"), 'dns_error': ("🌐 DNS: имя не найдено", "red"),
+}
+
+def run_channel_check(url: Optional[str], deep: Optional[bool] = None, headers: Optional[Dict[str, str]] = None) -> CheckOutcome:
+    """HEAD-проверка ссылки (при 405/501 - GET первых байт). Таймаут подбирается по хосту (HOST_POOL.latency, в пределах CHECK_TIMEOUT_*). DASH-манифесты (.mpd) разбираются и проверяется первый сегмент.
+    В глубоком режиме (deep / CHECK_DEEP_HLS) HLS-плейлисты скачиваются и проверяются на наличие свежих сегментов.
+    headers - заголовки канала из #EXTVLCOPT, они важнее стандартного User-Agent."""
+    request_headers = {'User-Agent': 'IPTV Checker Script'}
+    if headers: request_headers.update(headers)
+    return check_stream(url, timeout=HOST_POOL.latency.ceiling, headers=request_headers, deep=CHECK_DEEP_HLS if deep is None else deep, byte_budget=HLS_PROBE_BYTE_BUDGET, pool=HOST_POOL)
+
+def channel_check_job(channel: ChannelInfo, key: Any) -> Tuple[Any, Optional[str], Optional[Dict[str, str]]]:
+    """Задание для движка проверки: (ключ, URL, заголовки канала)."""
+    return key, channel.get('url'), headers_from_vlc_opts(channel.get('vlc_opts'))
+
+def format_check_status(result: CheckOutcome) -> str:
+    """Rich-разметка статуса по результату проверки (свежему или из истории)."""
+    outcome = result['outcome']; kind = result.get('kind'); details = result.get('details') or {}
+    if outcome == 'ok' and kind == 'DASH': status_text, status_style = f"✅ DASH{' live' if details.get('mpd_type') == 'dynamic' else ''}, {details.get('segment_ttfb_ms')} мс", "green"
+    elif outcome == 'ok' and kind == 'HLS': status_text, status_style = f"✅ HLS {details.get('segments')} сегм., {details.get('ttfb_ms')} мс", "green"
+    elif outcome == 'ok' and details.get('method') == 'GET': status_text, status_style = "✅ OK (GET)", "green"
+    elif outcome == 'empty': status_text, status_style = f"🟠 {kind} без сегментов", "orange3"
+    elif outcome == 'stale': status_text, status_style = f"🟠 {kind} не обновляется", "orange3"
+    elif outcome == 'segment_error': status_text, status_style = f"❌ {kind} сегмент: {details.get('segment_status')}", "red"
+    elif outcome == 'invalid': status_text, status_style = f"❌ Не {kind} плейлист", "red"
+    elif outcome == 'http_error': status_text, status_style = f"⚠️ Ошибка {result.get('status_code')}", "yellow"
+    else: status_text, status_style = STATUS_STYLES.get(outcome, STATUS_STYLES['unknown'])
+    return f"[{status_style}]{status_text}[/{status_style}]"
+
+def recheck_statuses(channels: List[ChannelInfo], statuses: Dict[int, str], store: Optional[StatusStore], show_progress: bool = True) -> int:
+    """Проверяет переданные каналы, обновляя statuses (по номеру) и сохраняя результаты в историю пачками.
+    Одинаковые потоки (с точностью до нормализации URL) запрашиваются один раз. Возвращает число сэкономленных запросов."""
+    jobs = [channel_check_job(channel, (channel.get('number'), channel.get('url'))) for channel in channels]
+    dns_stats = HOST_POOL.dns.prefetch(url_hostnames(job[1] for job in jobs)) # Все имена хостов - разом и параллельно
+    if show_progress: console.print(f"[dim]DNS: {dns_stats['hosts']} хостов за {dns_stats['seconds']:.1f} с, не резолвится: {dns_stats['failed']}.[/dim]")
+    engine = CheckEngine(run_channel_check, CHECK_MAX_CONCURRENCY, make_outcome(), coalesce_key=check_coalesce_key, max_per_host=CHECK_MAX_PER_HOST)
+    results = iter_check_results(jobs, run_channel_check, engine=engine)
+    if show_progress: results = track(results, total=len(jobs), description="Проверка...")
+    pending: List[Tuple[str, CheckOutcome]] = []
+    with METRICS.phase('check_pass'):
+        for (number, url), result in results:
+            statuses[number] = format_check_status(result); METRICS.observe_check(url, result)
+            if store and url: pending.append((url, result))
+            if store and len(pending) >= STATUS_SAVE_BATCH: store.record_many(pending); pending = []
+        if store and pending: store.record_many(pending)
+    return engine.requests_saved
+
+def monitor_channels(channels: List[ChannelInfo], statuses: Dict[int, str], store: Optional[StatusStore],
+                     scheduler: Optional[RecheckScheduler] = None, sleep=time.sleep) -> None:
+    """Непрерывный мониторинг до Ctrl+C: каждый URL проверяется, когда подошел его срок по истории стабильности."""
+    scheduler = scheduler if scheduler is not None else RecheckScheduler(); numbers_by_url: Dict[str, List[int]] = {}; channel_by_url: Dict[str, ChannelInfo] = {}
+    for i, channel in enumerate(channels):
+        if channel.get('url'): numbers_by_url.setdefault(channel['url'], []).append(channel.get('number', i + 1)); channel_by_url.setdefault(channel['url'], channel)
+    histories = store.recent_histories(STABILITY_HISTORY_SIZE) if store else {}
+    for url in numbers_by_url: scheduler.schedule(url, histories.get(url, []))
+    console.print(f"[INFO] Мониторинг {len(numbers_by_url)} URL. Остановка - Ctrl+C.")
     try:
-        if url.lower().endswith('.mpd'): status_text, status_code, status_style = "⚪ DASH (.mpd)", None, "cyan"
-        else:
-            response = requests.head(url, timeout=timeout, headers=headers, allow_redirects=True, stream=False); status_code = response.status_code
-            if 200 <= status_code < 300: status_text, status_style = "✅ OK", "green"
-            elif status_code == 404: status_text, status_style = "❌ Не найден", "red"
-            elif status_code == 403: status_text, status_style = "🚫 Запрещен", "yellow"
-            elif status_code == 405: status_text, status_style = "🟡 Метод HEAD запрещен", "yellow"
-            else: status_text, status_style = f"⚠️ Ошибка {status_code}", "yellow"
-    except requests.exceptions.Timeout: status_text, status_style = "⏳ Таймаут", "orange3"
-    except requests.exceptions.ConnectionError: status_text, status_style = "🔗 Ошибка соединения", "red"
-    except requests.exceptions.RequestException: status_text, status_style = "❓ Ошибка запроса", "magenta"
-    except Exception: status_text, status_style = f"🆘 Неизвестно", "grey50"
-    return f"[{status_style}]{status_text}[/{status_style}]", status_code
+        while True:
+            due_urls = scheduler.pop_due(CHECK_MAX_CONCURRENCY)
+            if not due_urls:
+                next_due = scheduler.next_due()
+                if next_due is None: break
+                sleep(min(max(next_due - scheduler.clock(), 0.1), MONITOR_MAX_SLEEP_SECONDS)); continue
+            checked: List[Tuple[str, CheckOutcome]] = []
+            for url, result in iter_check_results((channel_check_job(channel_by_url[url], url) for url in due_urls), run_channel_check, max_concurrency=CHECK_MAX_CONCURRENCY, error_result=make_outcome(), coalesce_key=check_coalesce_key, max_per_host=CHECK_MAX_PER_HOST):
+                result = dict(result, checked_at=scheduler.clock()); status_text = format_check_status(result); checked.append((url, result)); METRICS.observe_check(url, result)
+                for number in numbers_by_url[url]:
+                    if statuses.get(number) != status_text: console.print(f"  #{number}: {statuses.get(number, '[grey50]Не проверен[/grey50]')} → {status_text}")
+                    statuses[number] = status_text
+                history = histories[url] = [result] + histories.get(url, [])[:STABILITY_HISTORY_SIZE - 1]
+                scheduler.schedule(url, history)
+            if store: store.record_many(checked)
+    except KeyboardInterrupt: console.print("\n[INFO] Мониторинг остановлен.")
+
+# --- Пакетный режим (без меню, для cron/CI) ---
+def parse_cli_args(argv: Optional[List[str]] = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="IPTV Checker: интерактивное меню или пакетная проверка плейлистов (--batch).")
+    parser.add_argument('playlists', nargs='*', help=f"плейлисты M3U (по умолчанию {M3U_FILE})")
+    parser.add_argument('--batch', action='store_true', help="проверить все каналы без меню, отчет - построчно в stdout или --output")
+    parser.add_argument('--format', choices=OUTPUT_FORMATS, default='ndjson', help="формат отчета (по умолчанию ndjson)")
+    parser.add_argument('-o', '--output', help="файл отчета (по умолчанию stdout)")
+    parser.add_argument('--concurrency', type=int, default=CHECK_MAX_CONCURRENCY, help=f"одновременных проверок (по умолчанию {CHECK_MAX_CONCURRENCY})")
+    parser.add_argument('--timeout', type=float, default=CHECK_TIMEOUT_CEILING_SECONDS, help=f"максимальный таймаут проверки, с (по умолчанию {CHECK_TIMEOUT_CEILING_SECONDS})")
+    parser.add_argument('--epg', action=argparse.BooleanOptionalAction, default=False, help="добавить в отчет текущую передачу из EPG")
+    parser.add_argument('--export', metavar='PATH', help="записать очищенный плейлист: живые каналы, в группе - по задержке, из зеркал - самое быстрое")
+    parser.add_argument('--metrics-file', metavar='PATH', help="при выходе записать метрики (время фаз, задержки по хостам, исходы) в формате Prometheus")
+    parser.add_argument('--metrics-port', type=int, metavar='PORT', help="отдавать метрики по http://127.0.0.1:PORT/metrics, пока программа работает")
+    parser.add_argument('--max-failure-rate', type=float, default=BATCH_MAX_FAILURE_RATE, help=f"доля неудачных проверок, выше которой код выхода 1 (по умолчанию {BATCH_MAX_FAILURE_RATE})")
+    return parser.parse_args(argv)
+
+def iter_playlist_channels(paths: List[str], errors: Optional[List[str]] = None, header: Optional[Dict[str, str]] = None) -> Iterator[Tuple[str, ChannelInfo]]:
+    """Каналы плейлистов по одному, без чтения файлов целиком: (путь, канал). Ошибки чтения попадают в errors."""
+    for path in paths:
+        try:
+            with open(path, 'r', encoding='utf-8-sig', errors='replace') as f:
+                for channel in iter_m3u_channels(f, header): yield path, channel
+        except OSError as e:
+            if errors is not None: errors.append(f"{path}: {e.strerror or e}")
+
+def export_playlist(exporter: PlaylistExporter, filepath: str) -> None:
+    try: export_stats = exporter.write(filepath)
+    except OSError as e: console.print(f"[red]Ошибка записи плейлиста '{filepath}':[/red] {e}"); return
+    console.print(f"[green]Плейлист сохранен в[/green] [cyan]{filepath}[/cyan]: каналов {export_stats['kept']} [dim](мертвых убрано: {export_stats['dead']}, "
+                  f"медленных зеркал: {export_stats['duplicates']}, без проверки: {export_stats['unchecked']}).[/dim]")
+
+def finish_metrics(args: argparse.Namespace) -> None:
+    """Сводка метрик в конце запуска и, если задан --metrics-file, их запись в файл."""
+    for line in METRICS.summary_lines(): console.print(f"[dim]{line}[/dim]")
+    if args.metrics_file:
+        try: METRICS.write_file(args.metrics_file); console.print(f"[dim]Метрики записаны в {args.metrics_file}.[/dim]")
+        except OSError as e: console.print(f"[red]Ошибка записи метрик '{args.metrics_file}':[/red] {e}")
+    METRICS.close()
+
+def start_metrics_server(args: argparse.Namespace) -> None:
+    if args.metrics_port is None: return
+    try: console.print(f"[INFO] Метрики: http://127.0.0.1:{METRICS.serve(args.metrics_port)}/metrics")
+    except OSError as e: console.print(f"[yellow]Не удалось открыть порт метрик {args.metrics_port}: {e}[/yellow]")
+
+def run_batch(args: argparse.Namespace) -> int:
+    """Проверяет все каналы плейлистов и пишет результат каждой проверки, как только она завершилась.
+    Плейлисты читаются потоково дважды: сначала имена хостов для DNS (и tvg-id для EPG), затем сами проверки.
+    Код выхода: 0 - доля неудачных не выше --max-failure-rate, 1 - выше, 2 - нет каналов или не открыть отчет."""
+    paths = args.playlists or [M3U_FILE]; started = time.monotonic(); errors: List[str] = []; header: Dict[str, str] = {}
+    hostnames: Set[str] = set(); channel_ids: Set[str] = set(); total = 0
+    with METRICS.phase('m3u_parse'):
+        for _, channel in iter_playlist_channels(paths, errors, header):
+            total += 1; hostnames |= url_hostnames((channel.get('url'),))
+            if args.epg and channel.get('id'): channel_ids.add(channel['id'])
+    for error in errors: console.print(f"[bold red]Ошибка чтения плейлиста[/bold red] {error}")
+    if not total: console.print("[bold red]Каналы не найдены.[/bold red]"); return 2
+    epg = download_and_parse_epg(epg_url_from_header(header), channel_ids=channel_ids) if args.epg else None
+    try: stream = open(args.output, 'w', encoding='utf-8', newline='') if args.output else sys.stdout
+    except OSError as e: console.print(f"[bold red]Не удалось открыть отчет '{args.output}':[/bold red] {e}"); return 2
+
+    latency = HOST_POOL.latency; latency.ceiling = max(args.timeout, 0.1); latency.floor = min(latency.floor, latency.ceiling)
+    dns_stats = HOST_POOL.dns.prefetch(hostnames)
+    console.print(f"[INFO] Каналов: {total}, хостов: {dns_stats['hosts']} (не резолвится: {dns_stats['failed']}). Проверка...")
+    engine = CheckEngine(run_channel_check, args.concurrency, make_outcome(), coalesce_key=check_coalesce_key, max_per_host=CHECK_MAX_PER_HOST,
+                         max_remembered=BATCH_COALESCE_MEMORY)
+    jobs = (channel_check_job(channel, (position, path, channel)) for position, (path, channel) in enumerate(iter_playlist_channels(paths)))
+    summary = BatchSummary(); exporter = PlaylistExporter(epg_url_from_header(header), header) if args.export else None
+    try:
+        writer = make_result_writer(args.format, stream)
+        with METRICS.phase('check_pass'):
+            for (position, path, channel), result in iter_check_results(jobs, run_channel_check, engine=engine):
+                now_playing = epg.now_and_next((channel.get('id'),)).get(channel.get('id'), (None, None))[0] if epg else None
+                writer.write(result_record(path, channel, result, now_playing)); summary.add(result); METRICS.observe_check(channel.get('url'), result)
+                if exporter: exporter.add(channel, result, position)
+    finally:
+        if stream is not sys.stdout: stream.close()
+
+    for line in summary.lines(): console.print(line)
+    if exporter: export_playlist(exporter, args.export)
+    finish_metrics(args)
+    pool_totals = HOST_POOL.totals()
+    console.print(f"[dim]Время: {time.monotonic() - started:.1f} с. Запросов: {pool_totals['requests']}, сэкономлено на повторяющихся URL: {engine.requests_saved}, "
+                  f"недоступных хостов: {HOST_POOL.breaker.open_hosts()}.[/dim]")
+    if summary.failure_rate > args.max_failure_rate:
+        console.print(f"[bold red]Доля неудачных проверок {summary.failure_rate:.1%} больше порога {args.max_failure_rate:.1%}.[/bold red]"); return 1
+    return 0
 
 # --- Функция для открытия плеера (Приоритет VLC) ---
 def open_in_player(url: Optional[str]):
@@ -207,25 +343,50 @@ def open_in_player(url: Optional[str]):
         else: console.print("Убедись, что VLC установлен.")
 
 # --- Функция отображения таблицы каналов ---
-def display_channels_table(channels: List[ChannelInfo], epg: EPGData, statuses: Dict[int, str], filter_group: Optional[str] = None, search_term: Optional[str] = None) -> Optional[Dict[int, int]]:
-    table = Table(title="Список Каналов", show_header=True, header_style="bold magenta")
+def display_channels_table(channels: List[ChannelInfo], epg: EPGIndex, statuses: Dict[int, str], filter_group: Optional[str] = None, search_term: Optional[str] = None,
+                           index: Optional[ChannelIndex] = None, page: int = 1, page_size: int = CHANNEL_TABLE_PAGE_SIZE) -> Optional[Dict[int, int]]:
+    """Печатает одну страницу таблицы. Номер в списке -> позиция канала, только для строк этой страницы."""
+    index = index or ChannelIndex(channels) # Фильтр и поиск - по индексу, без прохода по всем каналам
+    positions = index.query(filter_group or None, search_term)
+    if not positions: console.print(Panel("[yellow]Каналы не найдены.[/yellow]", title="Результат")); return None
+    pages = page_count(len(positions), page_size); page = min(max(page, 1), pages); first = (page - 1) * page_size
+    table = Table(title="Список Каналов", show_header=True, header_style="bold magenta",
+                  caption=f"Страница {page} из {pages}, каналов: {len(positions)}" if pages > 1 else None)
+    table.add_column("#", style="bold", min_width=len(str(len(positions))), no_wrap=True, justify="right") # Не сжимается на узком терминале
     table.add_column("№ (ориг.)", style="dim", width=5, justify="right")
-    table.add_column("Название Канала", style="cyan", no_wrap=True, min_width=20)
-    table.add_column("Группа", style="yellow", width=15)
-    table.add_column("Статус", width=25)
-    table.add_column("Сейчас в эфире", style="green", min_width=20, overflow="fold")
-    count = 0; displayed_channel_indices = {}
-    for i, channel in enumerate(channels):
-        original_number = channel.get('number', i + 1)
-        name = channel.get('tvg_name') or channel.get('name', 'Без имени'); group = channel.get('group', 'Без группы')
-        status = statuses.get(original_number, "[grey50]Не проверен[/grey50]"); channel_id = channel.get('id')
-        if filter_group and group != filter_group: continue
-        if search_term and search_term.lower() not in name.lower(): continue
-        now_playing = find_current_program(channel_id, epg) or "[dim]N/A[/dim]"
-        count += 1; displayed_channel_indices[count] = i
-        table.add_row(str(original_number), name, group, status, now_playing)
-    if count == 0: console.print(Panel("[yellow]Каналы не найдены.[/yellow]", title="Результат")); return None
-    else: console.print(table); return displayed_channel_indices
+    table.add_column("Название Канала", style="cyan", overflow="ellipsis") # На узком терминале сжимаются только текстовые столбцы
+    table.add_column("Группа", style="yellow", max_width=15, overflow="ellipsis")
+    table.add_column("Статус", no_wrap=True, max_width=25, overflow="ellipsis")
+    table.add_column("Сейчас в эфире", style="green", overflow="ellipsis")
+    displayed_channel_indices = {first + k + 1: i for k, i in enumerate(positions[first:first + page_size])}
+    programs = epg.now_and_next(channels[i].get('id') for i in displayed_channel_indices.values()) # Только для видимых строк
+    for display_number, i in displayed_channel_indices.items():
+        channel = channels[i]; original_number = channel.get('number', i + 1)
+        status = statuses.get(original_number, "[grey50]Не проверен[/grey50]")
+        now_playing = programs.get(channel.get('id'), (None, None))[0] or "[dim]N/A[/dim]"
+        table.add_row(str(display_number), str(original_number), channel_title(channel), channel_group(channel), status, now_playing)
+    console.print(table); return displayed_channel_indices
+
+def page_count(total: int, page_size: int) -> int:
+    return max(1, -(-total // page_size))
+
+def browse_channels_table(channels: List[ChannelInfo], epg: EPGIndex, statuses: Dict[int, str], filter_group: Optional[str] = None, search_term: Optional[str] = None,
+                          index: Optional[ChannelIndex] = None, page_size: int = CHANNEL_TABLE_PAGE_SIZE) -> Optional[Dict[int, int]]:
+    """Постраничный просмотр: n/p - соседняя страница, число - переход на страницу, Enter - в меню.
+    Возвращает карту номеров последней показанной страницы (по ней запускает п.4)."""
+    index = index or ChannelIndex(channels)
+    pages = page_count(len(index.query(filter_group or None, search_term)), page_size); page = 1
+    while True:
+        displayed = display_channels_table(channels, epg, statuses, filter_group, search_term, index, page, page_size)
+        if displayed is None or pages == 1: return displayed
+        while True:
+            answer = console.input(f"[dim]\\[n] след. \\[p] пред. [1-{pages}] страница \\[Enter] меню:[/dim] ").strip().lower()
+            if not answer: return displayed
+            if answer == 'n' and page < pages: page += 1; break
+            if answer == 'p' and page > 1: page -= 1; break
+            if answer.isdigit() and 1 <= int(answer) <= pages: page = int(answer); break
+            console.print("[yellow]Неверный ввод.[/yellow]")
+        clear_console()
 
 # --- Функции для обновления ---
 def check_for_updates(current_ver: str, version_url: str) -> Optional[Tuple[str, str, str]]:
@@ -282,6 +443,9 @@ def download_and_apply_update(download_url: str) -> bool:
 
 # --- Основная часть скрипта (Главное меню) ---
 if __name__ == "__main__":
+    cli_args = parse_cli_args()
+    if cli_args.batch: console = Console(stderr=True); start_metrics_server(cli_args); sys.exit(run_batch(cli_args)) # stdout - только под отчет
+    start_metrics_server(cli_args)
     update_info = None
     clear_console()
     console.print(Panel(f"📺 IPTV Checker & Launcher v{CURRENT_VERSION} 📺",
@@ -297,53 +461,68 @@ if __name__ == "__main__":
             else: console.print("[bold red]\nНе удалось обновить. Продолжение работы.[/bold red]")
         else: console.print("Обновление отменено.")
 
-    channel_list: Optional[List[ChannelInfo]] = load_channels_from_json()
-    epg_url_from_m3u = None
-    if channel_list is None:
-        console.print(f"\n[INFO] Загрузка из [cyan]{M3U_FILE}[/cyan]...")
-        epg_url_from_m3u, channel_list = parse_m3u(M3U_FILE)
-        if channel_list: save_channels_to_json(channel_list)
-        else: console.print("[bold red]Не удалось загрузить каналы. Выход.[/bold red]"); sys.exit(1)
+    channel_data = load_channel_list(cli_args.playlists) # Пути к плейлистам можно передать аргументами
+    if not channel_data or not channel_data['channels']: console.print("[bold red]Не удалось загрузить каналы. Выход.[/bold red]"); sys.exit(1)
+    channel_list: List[ChannelInfo] = channel_data['channels']
 
     console.print(f"[INFO] Загружено каналов: {len(channel_list)}")
-    epg_url_to_use = epg_url_from_m3u
-    epg_data: EPGData = download_and_parse_epg(epg_url_to_use)
-
-    console.print("\n[INFO] Проверка доступности каналов...")
-    channel_statuses: Dict[int, str] = {}
-    for i in track(range(len(channel_list)), description="Проверка..."):
-        channel = channel_list[i]; index = channel.get('number', i + 1); url = channel.get('url')
-        status_text, _ = check_channel_availability(url); channel_statuses[index] = status_text
-    console.print("[green]Проверка завершена.[/green]")
+    channel_index = ChannelIndex(channel_list) # Поиск, группы и номер -> позиция для меню
+    epg_url_to_use = channel_data['epg_url']
+    playlist_channel_ids = {ch['id'] for ch in channel_list if ch.get('id')}
+    epg_data: EPGIndex = download_and_parse_epg(epg_url_to_use, channel_ids=playlist_channel_ids)
+
+    # Сначала показываем последние известные статусы, перепроверяем только устаревшие
+    channel_statuses: Dict[int, str] = {}; recheck_channels: List[ChannelInfo] = []
+    try: status_store: Optional[StatusStore] = StatusStore(STATUS_DB_FILE); known_results = status_store.latest()
+    except Exception as e: console.print(f"[yellow]Не удалось открыть историю статусов '{STATUS_DB_FILE}': {e}[/yellow]"); status_store = None; known_results = {}
+    now = time.time()
+    for i, channel in enumerate(channel_list):
+        number = channel.get('number', i + 1); url = channel.get('url'); known = known_results.get(url) if url else None
+        if known is not None: channel_statuses[number] = format_check_status(known)
+        if needs_recheck(known, STATUS_RECHECK_TTL_SECONDS, now): recheck_channels.append(channel)
+    if not channel_statuses:
+        console.print("\n[INFO] Проверка доступности каналов...")
+        requests_saved = recheck_statuses(recheck_channels, channel_statuses, status_store)
+        console.print(f"[green]Проверка завершена.[/green] [dim](запросов сэкономлено на повторяющихся URL: {requests_saved})[/dim]")
+        pool_totals = HOST_POOL.totals()
+        console.print(f"[dim]HTTP-запросов: {pool_totals['requests']}, новых соединений: {pool_totals['connections']}, переиспользовано: {pool_totals['reused']}, "
+                      f"ожиданий лимита хоста: {pool_totals['waits']}.[/dim]")
+        breaker = HOST_POOL.breaker
+        latency = HOST_POOL.latency
+        if latency.hedges_sent: console.print(f"[dim]Дублирующих запросов (ответ дольше p95 хоста): {latency.hedges_sent}, дубль ответил первым: {latency.hedges_won}.[/dim]")
+        if breaker.short_circuited: console.print(f"[dim]Недоступных хостов: {breaker.open_hosts()}, пропущено проверок: {breaker.short_circuited} (~{breaker.saved_seconds:.0f} с ожидания сэкономлено).[/dim]")
+    else:
+        console.print(f"\n[INFO] Статусы из истории: {len(channel_statuses)}. Перепроверка в фоне: {len(recheck_channels)}.")
+        if recheck_channels: threading.Thread(target=recheck_statuses, args=(recheck_channels, channel_statuses, status_store, False), daemon=True).start()
 
     current_filter_group = None; current_search_term = None; last_displayed_map = None
     while True:
         console.print("\n" + "="*30 + " Меню " + "="*30)
-        console.print("[1] Список [2] Фильтр [3] Поиск [4] Запуск [5] Обновить URL [u] Обновления [q] Выход")
+        console.print("[1] Список [2] Фильтр [3] Поиск [4] Запуск [5] Обновить URL \\[m] Мониторинг \\[e] Экспорт \\[u] Обновления \\[q] Выход") # \\[буква] - иначе rich примет за разметку
         console.print("-" * 70)
         choice = console.input("[bold cyan]Действие:[/bold cyan] ").strip().lower()
 
-        if choice == 'q': console.print("Выход."); break
+        if choice == 'q': finish_metrics(cli_args); console.print("Выход."); break
 
         clear_console()
         console.print(Panel(f"📺 v{CURRENT_VERSION} 📺", style="bold blue", subtitle="Автор: t.me/jeliktontech"))
 
         if choice == '1':
-            last_displayed_map = display_channels_table(channel_list, epg_data, channel_statuses, filter_group=current_filter_group, search_term=current_search_term)
+            last_displayed_map = browse_channels_table(channel_list, epg_data, channel_statuses, filter_group=current_filter_group, search_term=current_search_term, index=channel_index)
         elif choice == '2':
-            groups = sorted(list(set(ch.get('group', 'Без группы') for ch in channel_list)))
+            groups = channel_index.groups()
             console.print("Доступные группы:"); [console.print(f"  [{i+1}] {g}") for i, g in enumerate(groups)]
             try:
                 idx = int(console.input("Номер группы (0 - сброс): "))
                 if idx == 0: current_filter_group = None; console.print("[INFO] Фильтр сброшен.")
                 elif 1 <= idx <= len(groups): current_filter_group = groups[idx - 1]
                 else: console.print("[yellow]Неверный номер.[/yellow]"); continue
-                last_displayed_map = display_channels_table(channel_list, epg_data, channel_statuses, filter_group=current_filter_group, search_term=current_search_term)
+                last_displayed_map = browse_channels_table(channel_list, epg_data, channel_statuses, filter_group=current_filter_group, search_term=current_search_term, index=channel_index)
             except ValueError: console.print("[yellow]Неверный ввод.[/yellow]")
         elif choice == '3':
             search_input = console.input("Часть названия (пусто - сброс): ").strip()
             current_search_term = search_input if search_input else None
-            last_displayed_map = display_channels_table(channel_list, epg_data, channel_statuses, filter_group=current_filter_group, search_term=current_search_term)
+            last_displayed_map = browse_channels_table(channel_list, epg_data, channel_statuses, filter_group=current_filter_group, search_term=current_search_term, index=channel_index)
         elif choice == '4':
             if last_displayed_map is None: console.print("[yellow]Сначала покажите список (1).[/yellow]"); continue
             try:
@@ -359,23 +538,30 @@ if __name__ == "__main__":
         elif choice == '5':
             try:
                 target_num = int(console.input("ОРИГИНАЛЬНЫЙ номер канала для обновления URL: "))
-                ch_upd = None; ch_idx = -1
-                for i, ch in enumerate(channel_list):
-                    if ch.get('number') == target_num: ch_upd = ch; ch_idx = i; break
+                ch_idx = channel_index.position_of(target_num); ch_upd = channel_list[ch_idx] if ch_idx is not None else None
                 if ch_upd:
                     console.print(f"Канал #{target_num}: [cyan]{ch_upd.get('tvg_name') or ch_upd.get('name')}[/cyan]")
                     console.print(f"Текущий URL: [dim]{ch_upd.get('url', 'Нет')}[/dim]")
                     new_url = console.input("Новый URL: ").strip()
                     if new_url:
-                        channel_list[ch_idx]['url'] = new_url; save_channels_to_json(channel_list)
+                        set_channel_url(channel_list[ch_idx], new_url); save_channels_to_json(channel_data)
                         console.print(f"[green]URL обновлен. Перепроверка статуса...[/green]")
-                        status_text, _ = check_channel_availability(new_url)
-                        channel_statuses[target_num] = status_text
+                        check_result = run_channel_check(new_url, headers=headers_from_vlc_opts(ch_upd.get('vlc_opts')))
+                        METRICS.observe_check(new_url, check_result)
+                        if status_store: status_store.record(new_url, check_result)
+                        status_text = format_check_status(check_result); channel_statuses[target_num] = status_text
                         console.print(f"Новый статус: {status_text}")
                     else: console.print("[yellow]Обновление отменено.[/yellow]")
                 else: console.print(f"[yellow]Канал #{target_num} не найден.[/yellow]")
             except ValueError: console.print("[yellow]Неверный ввод.[/yellow]")
             except Exception as e: console.print(f"[bold red]Ошибка обновления: {e}[/bold red]")
+        elif choice == 'm':
+            monitor_channels(channel_list, channel_statuses, status_store)
+        elif choice == 'e':
+            if not status_store: console.print("[yellow]Нет истории проверок - экспортировать нечего.[/yellow]"); continue
+            export_path = console.input(f"Файл для очищенного плейлиста ({EXPORT_M3U_FILE}): ").strip() or EXPORT_M3U_FILE
+            exporter = PlaylistExporter(channel_data['epg_url'], channel_data.get('m3u_header')); exporter.add_all(channel_list, status_store.latest())
+            export_playlist(exporter, export_path)
         elif choice == 'u':
              update_info = check_for_updates(CURRENT_VERSION, VERSION_URL)
              if update_info:
@@ -391,4 +577,4 @@ if __name__ == "__main__":
 
         else:
             console.print("[yellow]Неизвестная команда.[/yellow]")
-            console.input("Нажмите Enter для возврата в меню...") # Пауза при неверной команде
\ No newline at end of file
+            console.input("Нажмите Enter для возврата в меню...") # Пауза при неверной команде
\ No newline at end of file
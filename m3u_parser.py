@@ -0,0 +1,113 @@
+# --- Общий потоковый парсер M3U ---
+# Используется и iptv_checker.py, и gui_app.py. Каналы отдаются генератором по мере чтения,
+# все атрибуты key="value" строки #EXTINF извлекаются одним скомпилированным регулярным выражением,
+# а опции плеера (#EXTVLCOPT) и группа (#EXTGRP) сохраняются в канале.
+import re
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple
+
+DEFAULT_CHANNEL_NAME = "Без имени"
+DEFAULT_GROUP = "Без группы"
+
+ChannelInfo = Dict[str, Any]
+
+_ATTRIBUTE_RE = re.compile(r'([A-Za-z0-9_-]+)="([^"]*)"')
+_KNOWN_ATTRIBUTES = frozenset(('tvg-id', 'tvg-name', 'tvg-logo', 'group-title')) # Разложены по отдельным полям канала
+_ATTRIBUTE_FIELDS = {'tvg-id': 'id', 'tvg-name': 'tvg_name', 'tvg-logo': 'logo', 'group-title': 'group'}
+
+
+def parse_attributes(line: str) -> Dict[str, str]:
+    """Все атрибуты key="value" строки за один проход."""
+    return dict(_ATTRIBUTE_RE.findall(line))
+
+
+def extinf_title(line: str) -> str:
+    """Название канала - текст после запятой, идущей за атрибутами."""
+    comma = line.find(',', line.rfind('"') + 1)
+    if comma == -1: # Кавычки в самом названии - ищем конец последнего атрибута
+        attributes_end = 8
+        for match in _ATTRIBUTE_RE.finditer(line): attributes_end = match.end()
+        comma = line.find(',', attributes_end)
+    return line[comma + 1:].strip() if comma != -1 else ""
+
+
+def _parse_option(value: str, options: Dict[str, str]) -> None:
+    key, sep, option_value = value.partition('=')
+    if sep and key.strip(): options[key.strip()] = option_value.strip()
+
+
+def iter_m3u_channels(lines: Iterable[str], header: Optional[Dict[str, str]] = None) -> Iterator[ChannelInfo]:
+    """Генератор каналов из строк M3U. В header (если передан) попадают атрибуты строки #EXTM3U (url-tvg и т.п.).
+
+    Канал: 'name', 'tvg_name', 'logo', 'group', 'id', 'url', 'number' - как и раньше, плюс, если есть,
+    'attributes' (прочие атрибуты #EXTINF, например catchup) и 'vlc_opts' (опции #EXTVLCOPT, например http-user-agent).
+    'extinf' - #EXTINF как написан, от длительности до запятой перед названием (для format_m3u_channel): одна строка на канал.
+    #EXTVLCOPT и #EXTGRP, стоящие до #EXTINF, относятся к следующему каналу."""
+    current: Optional[ChannelInfo] = None; pending_options: Dict[str, str] = {}; pending_group: Optional[str] = None
+    group_from_extinf = False; number = 0; find_attributes = _ATTRIBUTE_RE.findall
+    for line in lines:
+        line = line.strip()
+        if not line: continue
+        if line[0] == '#':
+            if line.startswith('#EXTINF:'):
+                attributes = dict(find_attributes(line)) # Горячий цикл: то же, что parse_attributes(), без лишнего вызова
+                comma = line.find(',', line.rfind('"') + 1)
+                name = (line[comma + 1:].strip() if comma != -1 else extinf_title(line)) or DEFAULT_CHANNEL_NAME
+                group = attributes.get('group-title')
+                current = {'name': name, 'tvg_name': attributes.get('tvg-name') or name, 'logo': attributes.get('tvg-logo'),
+                           'group': group or pending_group or DEFAULT_GROUP, 'id': attributes.get('tvg-id')}
+                if comma != -1: current['extinf'] = line[8:comma]
+                if not attributes.keys() <= _KNOWN_ATTRIBUTES:
+                    current['attributes'] = {key: value for key, value in attributes.items() if key not in _KNOWN_ATTRIBUTES}
+                group_from_extinf = bool(group)
+            elif line.startswith('#EXTVLCOPT:'): _parse_option(line[11:], pending_options)
+            elif line.startswith('#EXTGRP:'):
+                pending_group = line[8:].strip() or None
+                if current is not None and not group_from_extinf and pending_group: current['group'] = pending_group
+            elif line.startswith('#EXTM3U'):
+                if header is not None: header.update(parse_attributes(line))
+            continue
+        if current is None: continue # URL без #EXTINF
+        number += 1; current['url'] = line; current['number'] = number
+        if pending_options: current['vlc_opts'] = pending_options; pending_options = {}
+        pending_group = None
+        yield current; current = None
+
+
+def epg_url_from_header(header: Dict[str, str]) -> Optional[str]:
+    return header.get('url-tvg') or header.get('x-tvg-url') or None
+
+
+def format_m3u_header(epg_url: Optional[str] = None, attributes: Optional[Dict[str, str]] = None) -> str:
+    """Строка #EXTM3U: атрибуты заголовка исходного плейлиста (из iter_m3u_channels) в том же порядке.
+    url-tvg дописывается первым, только если EPG в них не указан."""
+    attributes = dict(attributes or {})
+    if epg_url and epg_url_from_header(attributes) is None: attributes = {'url-tvg': epg_url, **attributes}
+    return "#EXTM3U" + "".join(f' {key}="{value}"' for key, value in attributes.items())
+
+
+def format_m3u_channel(channel: ChannelInfo) -> List[str]:
+    """Строки M3U канала (#EXTINF, #EXTVLCOPT, #EXTGRP, URL) - обратное к iter_m3u_channels: атрибуты и опции плеера сохраняются.
+    Если парсер запомнил 'extinf', #EXTINF пишется как в исходном плейлисте (длительность, порядок атрибутов, tvg-name
+    и при совпадении с названием), значения атрибутов берутся из полей канала; группа из #EXTGRP - строкой #EXTGRP.
+    Иначе (например, channels.json старой версии) #EXTINF собирается из полей: tvg-name - если отличается от названия."""
+    name = channel.get('name') or DEFAULT_CHANNEL_NAME; extra = channel.get('attributes') or {}; extinf = channel.get('extinf')
+    options = [f"#EXTVLCOPT:{key}={value}" for key, value in (channel.get('vlc_opts') or {}).items()]
+    if extinf is not None:
+        def current_value(match: 're.Match[str]') -> str:
+            key = match.group(1); field = _ATTRIBUTE_FIELDS.get(key); value = channel.get(field) if field else extra.get(key)
+            return f'{key}="{value}"' if value else match.group(0)
+        group = channel.get('group'); group_line = []
+        if group and group != DEFAULT_GROUP and 'group-title="' not in extinf: group_line = [f"#EXTGRP:{group}"]
+        return [f"#EXTINF:{_ATTRIBUTE_RE.sub(current_value, extinf)},{name}", *options, *group_line, channel.get('url') or ""]
+    attributes = {'tvg-id': channel.get('id'), 'tvg-name': channel.get('tvg_name') if channel.get('tvg_name') != name else None,
+                  'tvg-logo': channel.get('logo'), 'group-title': channel.get('group')}
+    attributes.update(extra)
+    attribute_text = "".join(f' {key}="{value}"' for key, value in attributes.items() if value)
+    return [f"#EXTINF:-1{attribute_text},{name}", *options, channel.get('url') or ""]
+
+
+def read_m3u(filepath: str) -> Tuple[Dict[str, str], List[ChannelInfo]]:
+    """Читает файл целиком в список (атрибуты #EXTM3U, каналы). Ошибки открытия/чтения пробрасываются."""
+    header: Dict[str, str] = {}
+    with open(filepath, 'r', encoding='utf-8-sig', errors='replace') as f: channels = list(iter_m3u_channels(f, header))
+    return header, channels
@@ -0,0 +1,146 @@
+# --- Инструментирование: время фаз, задержки по хостам, исходы проверок ---
+# Общие счетчики запуска: сколько времени ушло на каждую фазу (разбор M3U, чтение/запись JSON,
+# скачивание/распаковка/разбор EPG, проход проверки), гистограммы задержек ответов по хостам
+# и число проверок по исходам. Наружу - текст в формате Prometheus (файлом или по HTTP /metrics)
+# и короткая сводка в конце запуска. Потокобезопасно: проверки идут из пула потоков.
+import http.server
+import math
+import os
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+from host_pool import host_key
+
+LATENCY_BUCKETS_SECONDS = (0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0) # Границы гистограммы задержек (+Inf добавляется сама)
+METRICS_MAX_HOSTS = 200 # Хостов с отдельной гистограммой; остальные идут в host="other" (чтобы не раздувать метрики)
+METRICS_PREFIX = "iptv_checker"
+OTHER_HOST = "other"
+
+
+class LatencyHistogram:
+    """Счетчики по корзинам LATENCY_BUCKETS_SECONDS + сумма и максимум."""
+
+    def __init__(self):
+        self.buckets = [0] * (len(LATENCY_BUCKETS_SECONDS) + 1); self.count = 0; self.total = 0.0; self.max = 0.0
+
+    def observe(self, seconds: float) -> None:
+        index = 0
+        while index < len(LATENCY_BUCKETS_SECONDS) and seconds > LATENCY_BUCKETS_SECONDS[index]: index += 1
+        self.buckets[index] += 1; self.count += 1; self.total += seconds; self.max = max(self.max, seconds)
+
+    def quantile(self, q: float) -> float:
+        """Оценка квантиля - верхняя граница корзины, в которую он попал (для +Inf - максимум)."""
+        rank = q * self.count; seen = 0
+        for index, bucket_count in enumerate(self.buckets):
+            seen += bucket_count
+            if seen >= rank and bucket_count: return LATENCY_BUCKETS_SECONDS[index] if index < len(LATENCY_BUCKETS_SECONDS) else self.max
+        return self.max
+
+
+def _label(value: str) -> str:
+    return value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _number(value: float) -> str:
+    return "+Inf" if value == math.inf else repr(float(value)) if isinstance(value, float) else str(value)
+
+
+def record_epg_phases(metrics: "Metrics", epg_stats: Dict[str, Any], seconds: float) -> None:
+    """Фазы EPG по статистике fetch_epg: скачивание / распаковка / разбор XML, если фид скачивался, иначе - чтение кеша."""
+    if 'download_seconds' not in epg_stats: metrics.add_phase('epg_cache', seconds); return
+    for phase in ('download', 'decompress', 'xml_parse'): metrics.add_phase(f'epg_{phase}', epg_stats[f'{phase}_seconds'])
+
+
+class Metrics:
+    """Метрики одного запуска программы."""
+
+    def __init__(self, max_hosts: int = METRICS_MAX_HOSTS, clock=time.perf_counter):
+        self.max_hosts = max_hosts; self.clock = clock; self._lock = threading.Lock()
+        self.phases: Dict[str, Tuple[int, float, float]] = {} # Фаза -> (запусков, всего секунд, последний запуск)
+        self.latency: Dict[str, LatencyHistogram] = {}; self.outcomes: Dict[str, int] = {}
+        self._server: Optional[http.server.ThreadingHTTPServer] = None
+
+    @contextmanager
+    def phase(self, name: str) -> Iterator[None]:
+        """with metrics.phase('m3u_parse'): ... - время блока добавляется к фазе (и при исключении)."""
+        started = self.clock()
+        try: yield
+        finally: self.add_phase(name, self.clock() - started)
+
+    def add_phase(self, name: str, seconds: float) -> None:
+        with self._lock:
+            runs, total, _ = self.phases.get(name, (0, 0.0, 0.0))
+            self.phases[name] = (runs + 1, total + seconds, seconds)
+
+    def observe_check(self, url: Optional[str], result: dict) -> None:
+        """Учитывает результат проверки: исход и (если есть) задержку ответа хоста."""
+        outcome = result.get('outcome') or 'unknown'; latency_ms = result.get('latency_ms')
+        with self._lock:
+            self.outcomes[outcome] = self.outcomes.get(outcome, 0) + 1
+            if latency_ms is None or not url: return
+            host = host_key(url) or OTHER_HOST
+            histogram = self.latency.get(host)
+            if histogram is None:
+                if len(self.latency) >= self.max_hosts: host = OTHER_HOST; histogram = self.latency.get(host)
+                if histogram is None: histogram = self.latency[host] = LatencyHistogram()
+            histogram.observe(latency_ms / 1000)
+
+    def render_prometheus(self) -> str:
+        """Текстовый формат Prometheus (exposition format 0.0.4)."""
+        name = METRICS_PREFIX; lines: List[str] = []
+        with self._lock:
+            lines += [f"# HELP {name}_phase_seconds_total Суммарное время фазы, с.", f"# TYPE {name}_phase_seconds_total counter"]
+            lines += [f'{name}_phase_seconds_total{{phase="{_label(phase)}"}} {_number(total)}' for phase, (_, total, _) in sorted(self.phases.items())]
+            lines += [f"# HELP {name}_phase_runs_total Сколько раз выполнялась фаза.", f"# TYPE {name}_phase_runs_total counter"]
+            lines += [f'{name}_phase_runs_total{{phase="{_label(phase)}"}} {runs}' for phase, (runs, _, _) in sorted(self.phases.items())]
+            lines += [f"# HELP {name}_phase_last_seconds Время последнего выполнения фазы, с.", f"# TYPE {name}_phase_last_seconds gauge"]
+            lines += [f'{name}_phase_last_seconds{{phase="{_label(phase)}"}} {_number(last)}' for phase, (_, _, last) in sorted(self.phases.items())]
+            lines += [f"# HELP {name}_check_latency_seconds Задержка ответа при проверке канала, по хостам.", f"# TYPE {name}_check_latency_seconds histogram"]
+            for host, histogram in sorted(self.latency.items()):
+                host_label = _label(host); cumulative = 0
+                for bound, bucket_count in zip(LATENCY_BUCKETS_SECONDS + (math.inf,), histogram.buckets):
+                    cumulative += bucket_count; lines.append(f'{name}_check_latency_seconds_bucket{{host="{host_label}",le="{_number(bound)}"}} {cumulative}')
+                lines.append(f'{name}_check_latency_seconds_sum{{host="{host_label}"}} {_number(histogram.total)}')
+                lines.append(f'{name}_check_latency_seconds_count{{host="{host_label}"}} {histogram.count}')
+            lines += [f"# HELP {name}_check_outcomes_total Проверок по исходам.", f"# TYPE {name}_check_outcomes_total counter"]
+            lines += [f'{name}_check_outcomes_total{{outcome="{_label(outcome)}"}} {count}' for outcome, count in sorted(self.outcomes.items())]
+        return "\n".join(lines) + "\n"
+
+    def write_file(self, filepath: str) -> None:
+        """Атомарно пишет метрики в файл (например, для node_exporter textfile collector). Ошибки записи пробрасываются."""
+        tmp_path = filepath + '.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f: f.write(self.render_prometheus())
+        os.replace(tmp_path, filepath)
+
+    def serve(self, port: int, address: str = '127.0.0.1') -> int:
+        """Отдает метрики по HTTP (GET /metrics) из фонового потока. Возвращает фактический порт (0 - любой свободный)."""
+        metrics = self
+
+        class Handler(http.server.BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path.split('?')[0] not in ('/', '/metrics'): self.send_error(404); return
+                body = metrics.render_prometheus().encode('utf-8')
+                self.send_response(200); self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+                self.send_header("Content-Length", str(len(body))); self.end_headers(); self.wfile.write(body)
+
+            def log_message(self, *args): pass
+
+        self._server = http.server.ThreadingHTTPServer((address, port), Handler); self._server.daemon_threads = True
+        threading.Thread(target=self._server.serve_forever, name="iptv-metrics", daemon=True).start()
+        return self._server.server_address[1]
+
+    def close(self) -> None:
+        if self._server is not None: self._server.shutdown(); self._server.server_close(); self._server = None
+
+    def summary_lines(self, slowest_hosts: int = 3) -> List[str]:
+        """Сводка для конца запуска: время фаз, исходы проверок, самые медленные хосты (по p95)."""
+        with self._lock:
+            phases = ", ".join(f"{phase} {total:.2f} с" + (f" (x{runs})" if runs > 1 else "") for phase, (runs, total, _) in self.phases.items())
+            outcomes = ", ".join(f"{outcome}: {count}" for outcome, count in sorted(self.outcomes.items(), key=lambda item: -item[1]))
+            slowest = sorted(((histogram.quantile(0.95), host, histogram) for host, histogram in self.latency.items()), key=lambda item: -item[0])[:slowest_hosts]
+        lines = [f"Фазы: {phases or 'нет'}."]
+        if outcomes: lines.append(f"Исходы проверок: {outcomes}.")
+        if slowest: lines.append("Медленные хосты (p95): " + ", ".join(f"{host} ~{p95 * 1000:.0f} мс (n={histogram.count})" for p95, host, histogram in slowest) + ".")
+        return lines
@@ -0,0 +1,71 @@
+# --- Экспорт очищенного плейлиста по результатам проверки ---
+# Каналы с результатами проверки подаются по одному (в любом порядке, например по мере завершения проверок,
+# вместе с позицией в исходном плейлисте), мертвые сразу отбрасываются, а из зеркал одного канала (тот же tvg-id,
+# иначе название, в той же группе) остается самое быстрое. При записи группы идут в порядке исходного плейлиста,
+# а каналы в группе - по измеренной задержке ответа: плеер первым получает источник, который быстрее всего стартует.
+import math
+import os
+from typing import Dict, Hashable, Iterable, Iterator, Optional, Tuple
+
+from channel_index import channel_group, channel_title
+from m3u_parser import ChannelInfo, format_m3u_channel, format_m3u_header
+from stream_probe import CheckOutcome
+
+UNMEASURED_OUTCOMES = ('not_http',) # Не проверяются по HTTP: не считаются мертвыми, но идут после измеренных
+
+ExportStats = Dict[str, int]
+
+
+def export_rank(result: CheckOutcome) -> float:
+    """Ключ сортировки: задержка в мс (без измерения - в конец группы)."""
+    latency_ms = result.get('latency_ms')
+    return float(latency_ms) if latency_ms is not None else math.inf
+
+
+class PlaylistExporter:
+    """Копит живые каналы по группам, для каждого канала - только лучшее зеркало. Память - по числу оставленных каналов."""
+
+    def __init__(self, epg_url: Optional[str] = None, header: Optional[Dict[str, str]] = None):
+        self.epg_url = epg_url; self.header = header # Атрибуты #EXTM3U исходного плейлиста - пишутся обратно
+        self._groups: Dict[str, Dict[Hashable, Tuple[float, int, ChannelInfo]]] = {} # Группа -> ключ канала -> (задержка, позиция, канал)
+        self._group_starts: Dict[str, int] = {} # Группа -> наименьшая позиция ее канала в исходном плейлисте
+        self._added = 0; self.dead = 0; self.unchecked = 0; self.duplicates = 0
+
+    def add(self, channel: ChannelInfo, result: Optional[CheckOutcome], position: Optional[int] = None) -> bool:
+        """Учитывает канал с его результатом (None - не проверялся); position - место канала в исходном плейлисте
+        (по умолчанию - порядок вызовов). True, если канал пока в экспорте."""
+        position = self._added if position is None else position; self._added += 1
+        if result is None: self.unchecked += 1; return False
+        if result.get('outcome') != 'ok' and result.get('outcome') not in UNMEASURED_OUTCOMES: self.dead += 1; return False
+        group_name = channel_group(channel); key = channel.get('id') or channel_title(channel).casefold()
+        group = self._groups.setdefault(group_name, {}); self._group_starts[group_name] = min(self._group_starts.get(group_name, position), position)
+        entry = (export_rank(result), position, channel)
+        best = group.get(key)
+        if best is not None:
+            self.duplicates += 1
+            if best[:2] <= entry[:2]: return False
+        group[key] = entry; return True
+
+    def add_all(self, channels: Iterable[ChannelInfo], results: Dict[str, CheckOutcome]) -> None:
+        """Каналы и результаты по URL (например, StatusStore.latest())."""
+        for position, channel in enumerate(channels): self.add(channel, results.get(channel.get('url')) if channel.get('url') else None, position)
+
+    @property
+    def kept(self) -> int:
+        return sum(len(group) for group in self._groups.values())
+
+    def iter_lines(self) -> Iterator[str]:
+        yield format_m3u_header(self.epg_url, self.header)
+        for group_name in sorted(self._groups, key=self._group_starts.__getitem__):
+            for _, _, channel in sorted(self._groups[group_name].values(), key=lambda entry: entry[:2]): yield from format_m3u_channel(channel)
+
+    def write(self, filepath: str) -> ExportStats:
+        """Атомарно пишет плейлист (через временный файл). Ошибки записи пробрасываются."""
+        tmp_path = filepath + '.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            for line in self.iter_lines(): f.write(line + "\n")
+        os.replace(tmp_path, filepath)
+        return self.stats()
+
+    def stats(self) -> ExportStats:
+        return {'kept': self.kept, 'dead': self.dead, 'unchecked': self.unchecked, 'duplicates': self.duplicates}
@@ -0,0 +1,106 @@
+# --- Адаптивное расписание перепроверок ---
+# Срок следующей проверки канала считается по его истории (см. status_store): стабильный канал
+# проверяется все реже (экспоненциально, до потолка), а недавно упавший или "мигающий" - часто.
+# Готовые к проверке каналы берутся из кучи по сроку, так что бюджет запросов тратится
+# там, где статус скорее всего изменится. Часы подставляются - для детерминированных прогонов.
+import heapq
+import itertools
+import time
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple
+
+from stream_probe import CheckOutcome
+
+MIN_RECHECK_INTERVAL_SECONDS = 5 * 60 # Упавшие и нестабильные каналы
+MAX_RECHECK_INTERVAL_SECONDS = 24 * 3600 # Потолок для самых стабильных
+RECHECK_BACKOFF_FACTOR = 2.0 # Во сколько раз растет интервал с каждой одинаковой проверкой подряд
+FAILED_RECHECK_MAX_MULTIPLE = 4 # Неработающий канал проверяется не реже, чем раз в min_interval * 4
+STABILITY_HISTORY_SIZE = 20 # Сколько последних проверок учитывается
+
+Clock = Callable[[], float]
+
+
+class ManualClock:
+    """Часы для тестов и отладки: время двигается только через advance()."""
+
+    def __init__(self, start: float = 0.0):
+        self.now = start
+
+    def __call__(self) -> float:
+        return self.now
+
+    def advance(self, seconds: float) -> float:
+        self.now += seconds
+        return self.now
+
+
+def is_up(result: CheckOutcome) -> bool:
+    return result.get('outcome') == 'ok'
+
+
+def recheck_interval(history: Sequence[CheckOutcome], min_interval: float = MIN_RECHECK_INTERVAL_SECONDS,
+                     max_interval: float = MAX_RECHECK_INTERVAL_SECONDS, factor: float = RECHECK_BACKOFF_FACTOR,
+                     failed_max_multiple: float = FAILED_RECHECK_MAX_MULTIPLE) -> float:
+    """Интервал до следующей проверки по истории (от новых к старым).
+
+    Базовый интервал растет как min_interval * factor^(серия-1), где серия - сколько последних проверок
+    подряд дали то же "работает / не работает", что и последняя. Для неработающего канала рост ограничен
+    min_interval * failed_max_multiple: упавший канал должен проверяться часто, чтобы быстро заметить, что он ожил.
+    Каждая смена состояния в истории делит интервал пополам, но не ниже min_interval. Без истории - min_interval."""
+    if not history: return min_interval
+    latest_up = is_up(history[0]); streak = 0
+    for result in history:
+        if is_up(result) != latest_up: break
+        streak += 1
+    flips = sum(1 for newer, older in zip(history, history[1:]) if is_up(newer) != is_up(older))
+    ceiling = max_interval if latest_up else min(max_interval, min_interval * failed_max_multiple)
+    interval = min(min_interval * factor ** (streak - 1), ceiling) / 2 ** flips
+    return max(interval, min_interval)
+
+
+class RecheckScheduler:
+    """Очередь с приоритетом по сроку проверки. Ключ - обычно URL потока.
+
+    Повторный schedule() того же ключа заменяет срок: старая запись в куче остается,
+    но пропускается при выдаче (ленивое удаление)."""
+
+    def __init__(self, clock: Clock = time.time, min_interval: float = MIN_RECHECK_INTERVAL_SECONDS,
+                 max_interval: float = MAX_RECHECK_INTERVAL_SECONDS, factor: float = RECHECK_BACKOFF_FACTOR):
+        self.clock = clock; self.min_interval = min_interval; self.max_interval = max_interval; self.factor = factor
+        self._heap: List[Tuple[float, int, Any]] = []; self._due: Dict[Any, float] = {}; self._counter = itertools.count()
+
+    def __len__(self) -> int:
+        return len(self._due)
+
+    def __contains__(self, key: object) -> bool:
+        return key in self._due
+
+    def schedule_at(self, key: Any, due_at: float) -> None:
+        self._due[key] = due_at; heapq.heappush(self._heap, (due_at, next(self._counter), key))
+
+    def schedule(self, key: Any, history: Sequence[CheckOutcome]) -> float:
+        """Ставит ключ в очередь по истории проверок (от новых к старым) и возвращает срок.
+        Отсчет идет от времени последней проверки; без истории ключ готов сразу."""
+        if not history: due_at = self.clock()
+        else: due_at = history[0].get('checked_at', self.clock()) + recheck_interval(history, self.min_interval, self.max_interval, self.factor)
+        self.schedule_at(key, due_at)
+        return due_at
+
+    def remove(self, key: Any) -> None:
+        self._due.pop(key, None)
+
+    def _drop_outdated(self) -> None:
+        while self._heap and self._due.get(self._heap[0][2]) != self._heap[0][0]: heapq.heappop(self._heap)
+
+    def next_due(self) -> Optional[float]:
+        """Ближайший срок или None, если очередь пуста."""
+        self._drop_outdated()
+        return self._heap[0][0] if self._heap else None
+
+    def pop_due(self, limit: Optional[int] = None) -> List[Any]:
+        """Забирает из очереди ключи с наступившим сроком, самые просроченные первыми."""
+        now = self.clock(); keys: List[Any] = []
+        while limit is None or len(keys) < limit:
+            self._drop_outdated()
+            if not self._heap or self._heap[0][0] > now: break
+            _, _, key = heapq.heappop(self._heap); del self._due[key]; keys.append(key)
+        return keys
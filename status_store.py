@@ -0,0 +1,87 @@
+# --- История статусов каналов (SQLite) ---
+# Каждая проверка сохраняется с временем, задержкой и кодом ответа. При запуске приложение
+# сразу показывает последний известный статус и перепроверяет только устаревшие записи.
+# Статусы привязаны к URL потока, а не к номеру канала: номера меняются при правке плейлиста.
+import json
+import sqlite3
+import threading
+import time
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from stream_probe import CheckOutcome
+
+HISTORY_KEEP_DAYS = 30 # Более старые записи истории удаляются при открытии базы
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS checks (
+    url TEXT NOT NULL, checked_at REAL NOT NULL, outcome TEXT NOT NULL,
+    status_code INTEGER, latency_ms INTEGER, kind TEXT, details TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_checks_url_time ON checks(url, checked_at);
+CREATE TABLE IF NOT EXISTS latest (
+    url TEXT PRIMARY KEY, checked_at REAL NOT NULL, outcome TEXT NOT NULL,
+    status_code INTEGER, latency_ms INTEGER, kind TEXT, details TEXT
+);
+"""
+
+
+def _row_to_outcome(row: Tuple[Any, ...]) -> CheckOutcome:
+    url, checked_at, outcome, status_code, latency_ms, kind, details = row
+    return {'url': url, 'checked_at': checked_at, 'outcome': outcome, 'status_code': status_code, 'latency_ms': latency_ms,
+            'kind': kind, 'details': json.loads(details) if details else {}}
+
+
+class StatusStore:
+    """Хранилище результатов проверок. Потокобезопасно: одно соединение под замком."""
+
+    def __init__(self, filepath: str, keep_days: float = HISTORY_KEEP_DAYS):
+        self.filepath = filepath; self._lock = threading.Lock()
+        self._conn = sqlite3.connect(filepath, check_same_thread=False)
+        with self._lock, self._conn:
+            self._conn.executescript(_SCHEMA)
+            if keep_days: self._conn.execute("DELETE FROM checks WHERE checked_at < ?", (time.time() - keep_days * 86400,))
+
+    def record_many(self, results: Iterable[Tuple[str, CheckOutcome]], checked_at: Optional[float] = None) -> None:
+        """Сохраняет пачку результатов (url, результат check_stream) одной транзакцией."""
+        checked_at = time.time() if checked_at is None else checked_at
+        rows = [(url, result.get('checked_at', checked_at), result['outcome'], result.get('status_code'), result.get('latency_ms'),
+                 result.get('kind'), json.dumps(result.get('details') or {}, ensure_ascii=False)) for url, result in results if url]
+        if not rows: return
+        with self._lock, self._conn:
+            self._conn.executemany("INSERT INTO checks VALUES (?, ?, ?, ?, ?, ?, ?)", rows)
+            self._conn.executemany("INSERT OR REPLACE INTO latest VALUES (?, ?, ?, ?, ?, ?, ?)", rows)
+
+    def record(self, url: str, result: CheckOutcome, checked_at: Optional[float] = None) -> None:
+        self.record_many([(url, result)], checked_at)
+
+    def latest(self) -> Dict[str, CheckOutcome]:
+        """Последний результат для каждого URL (с 'checked_at')."""
+        with self._lock:
+            rows = self._conn.execute("SELECT url, checked_at, outcome, status_code, latency_ms, kind, details FROM latest").fetchall()
+        return {row[0]: _row_to_outcome(row) for row in rows}
+
+    def history(self, url: str, limit: int = 50) -> List[CheckOutcome]:
+        """Последние limit проверок URL, от новых к старым."""
+        with self._lock:
+            rows = self._conn.execute("SELECT url, checked_at, outcome, status_code, latency_ms, kind, details FROM checks "
+                                      "WHERE url = ? ORDER BY checked_at DESC LIMIT ?", (url, limit)).fetchall()
+        return [_row_to_outcome(row) for row in rows]
+
+    def recent_histories(self, limit: int = 20) -> Dict[str, List[CheckOutcome]]:
+        """Последние limit проверок сразу для всех URL (от новых к старым) - одним запросом."""
+        with self._lock:
+            rows = self._conn.execute("SELECT url, checked_at, outcome, status_code, latency_ms, kind, details FROM ("
+                                      "SELECT *, ROW_NUMBER() OVER (PARTITION BY url ORDER BY checked_at DESC) AS position FROM checks"
+                                      ") WHERE position <= ? ORDER BY url, checked_at DESC", (limit,)).fetchall()
+        histories: Dict[str, List[CheckOutcome]] = {}
+        for row in rows: histories.setdefault(row[0], []).append(_row_to_outcome(row))
+        return histories
+
+    def close(self) -> None:
+        with self._lock: self._conn.close()
+
+
+def needs_recheck(known: Optional[CheckOutcome], ttl_seconds: float, now: Optional[float] = None) -> bool:
+    """True, если результата нет или он старше ttl_seconds."""
+    if known is None: return True
+    return (time.time() if now is None else now) - known['checked_at'] >= ttl_seconds
@@ -0,0 +1,449 @@
+# --- Глубокая проверка потоков (HLS и DASH) ---
+# HEAD на .m3u8 говорит только о том, что файл есть. Здесь скачивается master-плейлист,
+# выбирается вариант, скачивается media-плейлист и проверяется, что в нем есть сегменты
+# и что он обновляется. Для DASH манифест разбирается потоково до первой Representation,
+# по ее SegmentTemplate строится URL сегмента, и сегмент запрашивается с Range.
+# Чтение ограничено бюджетом байт на канал, соединения переиспользуются (общий пул host_pool).
+import functools
+import re
+import threading
+import time
+import xml.etree.ElementTree as ET
+from datetime import datetime
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+from urllib.parse import urljoin, urlsplit, urlunsplit
+
+import requests
+
+from dns_cache import DnsResolutionError
+from host_pool import HostPool, hedged_call, host_key
+
+DEFAULT_BYTE_BUDGET = 256 * 1024 # Сколько байт максимум читаем на один канал (все плейлисты вместе)
+STALE_AFTER_TARGET_DURATIONS = 3 # Плейлист "устарел", если не двигался дольше N * TARGETDURATION
+SEGMENT_PROBE_BYTES = 16 * 1024 # Сколько байт сегмента DASH запрашиваем (Range) для проверки
+DASH_LIVE_EDGE_SAFETY_SEGMENTS = 2 # Насколько сегментов отступаем от расчетного "края" живого потока
+RANGE_PROBE_BYTES = 1024 # Сколько байт потока запрашивает GET, если сервер отверг HEAD
+HEAD_REFUSED_STATUSES = (405, 501) # Ответы на HEAD, после которых проверяем ранжированным GET
+
+ProbeResult = Dict[str, Any]
+
+_default_pool: Optional[HostPool] = None # Общий пул соединений, если вызывающий не передал свой
+_default_pool_lock = threading.Lock()
+_sequence_lock = threading.Lock()
+_last_sequences: Dict[str, Tuple[int, float]] = {} # URL media-плейлиста -> (MEDIA-SEQUENCE, когда видели)
+
+
+class ByteBudgetExceeded(Exception):
+    """Плейлист оказался больше, чем разрешено бюджетом."""
+
+
+def get_host_pool() -> HostPool:
+    global _default_pool
+    with _default_pool_lock:
+        if _default_pool is None: _default_pool = HostPool()
+        return _default_pool
+
+
+def is_hls_url(url: Optional[str]) -> bool:
+    return bool(url) and url.lower().split('?', 1)[0].endswith(('.m3u8', '.m3u'))
+
+
+def is_dash_url(url: Optional[str]) -> bool:
+    return bool(url) and url.lower().split('?', 1)[0].endswith('.mpd')
+
+
+_DEFAULT_PORTS = {'http': 80, 'https': 443}
+
+
+def normalize_url(url: str) -> str:
+    """Канонический вид URL для сравнения: схема и хост в нижнем регистре, без порта по умолчанию и без #фрагмента.
+    Путь и параметры не меняются - регистр в них значим."""
+    try:
+        parts = urlsplit(url.strip()); scheme = parts.scheme.lower(); port = parts.port
+    except ValueError: return url
+    host = parts.hostname or ''; userinfo = parts.netloc.rpartition('@')[0]
+    netloc = (f"{userinfo}@" if userinfo else '') + (f"[{host}]" if ':' in host else host)
+    if port is not None and port != _DEFAULT_PORTS.get(scheme): netloc += f":{port}"
+    return urlunsplit((scheme, netloc, parts.path or '/', parts.query, ''))
+
+
+def _iter_limited(response: requests.Response, limit: int, chunk_size: int = 8192) -> Iterator[bytes]:
+    """Тело ответа кусками (после распаковки), всего не больше limit байт: каждый кусок запрашивается
+    не больше остатка, так что лишнее не читается."""
+    remaining = limit
+    while remaining > 0:
+        chunk = response.raw.read(min(chunk_size, remaining), decode_content=True)
+        if not chunk: return
+        chunk = chunk[:remaining]; remaining -= len(chunk) # urllib3 1.x может распаковать больше запрошенного
+        yield chunk
+
+
+def _fetch_text(session: requests.Session, url: str, headers: Dict[str, str], timeout: float, budget: List[int]) -> Tuple[requests.Response, str, float]:
+    """GET с ограничением по байтам. budget - изменяемый остаток [байт]: уменьшается на прочитанное, при превышении
+    (читается не больше остатка + 1 байт) становится отрицательным и бросается ByteBudgetExceeded.
+    Возвращает (ответ, текст, TTFB в сек)."""
+    response = session.get(url, headers=headers, timeout=timeout, stream=True, allow_redirects=True)
+    try:
+        ttfb = response.elapsed.total_seconds(); body = bytearray()
+        if response.status_code < 400:
+            for chunk in _iter_limited(response, budget[0] + 1): body.extend(chunk)
+        budget[0] -= len(body)
+        if budget[0] < 0: raise ByteBudgetExceeded(url)
+        return response, body.decode('utf-8', errors='replace'), ttfb
+    finally:
+        response.close()
+
+
+def _attribute_list(line: str) -> Dict[str, str]:
+    attributes = {}; _, _, rest = line.partition(':')
+    for part in rest.split(','):
+        key, sep, value = part.partition('=')
+        if sep: attributes[key.strip().upper()] = value.strip().strip('"')
+    return attributes
+
+
+def parse_master_playlist(text: str, base_url: str) -> List[Tuple[int, str]]:
+    """Варианты master-плейлиста: [(BANDWIDTH, абсолютный URL)]."""
+    variants = []; pending_bandwidth: Optional[int] = None
+    for line in text.splitlines():
+        line = line.strip()
+        if not line: continue
+        if line.startswith('#EXT-X-STREAM-INF'):
+            try: pending_bandwidth = int(_attribute_list(line).get('BANDWIDTH', '0'))
+            except ValueError: pending_bandwidth = 0
+        elif not line.startswith('#') and pending_bandwidth is not None:
+            variants.append((pending_bandwidth, urljoin(base_url, line))); pending_bandwidth = None
+    return variants
+
+
+def parse_media_playlist(text: str) -> Dict[str, Any]:
+    """Разбор media-плейлиста: число сегментов, TARGETDURATION, MEDIA-SEQUENCE, ENDLIST, последний PROGRAM-DATE-TIME."""
+    info: Dict[str, Any] = {'segments': 0, 'target_duration': None, 'media_sequence': 0, 'endlist': False, 'last_program_date_time': None}
+    for line in text.splitlines():
+        line = line.strip()
+        if line.startswith('#EXTINF'): info['segments'] += 1
+        elif line.startswith('#EXT-X-TARGETDURATION:'):
+            try: info['target_duration'] = float(line.split(':', 1)[1])
+            except ValueError: pass
+        elif line.startswith('#EXT-X-MEDIA-SEQUENCE:'):
+            try: info['media_sequence'] = int(line.split(':', 1)[1])
+            except ValueError: pass
+        elif line.startswith('#EXT-X-ENDLIST'): info['endlist'] = True
+        elif line.startswith('#EXT-X-PROGRAM-DATE-TIME:'): info['last_program_date_time'] = line.split(':', 1)[1]
+    return info
+
+
+def _playlist_lag_seconds(info: Dict[str, Any], now: float) -> Optional[float]:
+    """На сколько секунд последний сегмент отстает от текущего времени (по PROGRAM-DATE-TIME), если известно."""
+    value = info.get('last_program_date_time')
+    if not value: return None
+    try: program_time = datetime.fromisoformat(value.replace('Z', '+00:00'))
+    except ValueError: return None
+    if program_time.tzinfo is None: return None
+    return now - program_time.timestamp()
+
+
+def _is_stale(media_url: str, info: Dict[str, Any], now: float) -> bool:
+    """Живой плейлист устарел, если PROGRAM-DATE-TIME сильно отстает или MEDIA-SEQUENCE не растет между проверками."""
+    if info['endlist'] or not info['target_duration']: return False
+    max_lag = STALE_AFTER_TARGET_DURATIONS * info['target_duration']
+    lag = _playlist_lag_seconds(info, now)
+    # Последний сегмент начинается максимум за (число сегментов * TARGETDURATION) до "сейчас"
+    if lag is not None and lag > max_lag + info['segments'] * info['target_duration']: return True
+    with _sequence_lock:
+        previous = _last_sequences.get(media_url)
+        _last_sequences[media_url] = (info['media_sequence'], now) if previous is None or previous[0] != info['media_sequence'] else previous
+    return previous is not None and previous[0] == info['media_sequence'] and now - previous[1] > max_lag
+
+
+def probe_hls(url: str, timeout: float = 5, headers: Optional[Dict[str, str]] = None, byte_budget: int = DEFAULT_BYTE_BUDGET,
+              session: Optional[requests.Session] = None) -> ProbeResult:
+    """Глубокая проверка HLS. Сетевые исключения requests пробрасываются вызывающему коду.
+
+    Результат: 'state' - 'ok' | 'empty' | 'stale' | 'http_error' | 'invalid' | 'too_large',
+    плюс 'kind' ('HLS'), 'status_code', 'ttfb_ms', 'variant_url', 'segments', 'target_duration', 'media_sequence', 'bytes_read'."""
+    session = session or get_host_pool().session; headers = headers or {}; budget = [byte_budget]
+    result: ProbeResult = {'kind': 'HLS', 'state': 'ok', 'status_code': None, 'ttfb_ms': None, 'variant_url': None, 'segments': 0,
+                           'target_duration': None, 'media_sequence': None, 'bytes_read': 0}
+    try:
+        response, text, ttfb = _fetch_text(session, url, headers, timeout, budget)
+        result['status_code'] = response.status_code; result['ttfb_ms'] = int(ttfb * 1000)
+        if response.status_code >= 400: result['state'] = 'http_error'; return result
+        if not text.lstrip('\ufeff').startswith('#EXTM3U'): result['state'] = 'invalid'; return result
+
+        media_url, media_text = response.url, text
+        variants = parse_master_playlist(text, response.url)
+        if variants:
+            media_url = min(variants)[1]; result['variant_url'] = media_url # Самый "легкий" вариант - дешевле проверить
+            media_response, media_text, _ = _fetch_text(session, media_url, headers, timeout, budget)
+            result['status_code'] = media_response.status_code
+            if media_response.status_code >= 400: result['state'] = 'http_error'; return result
+            if not media_text.lstrip('\ufeff').startswith('#EXTM3U'): result['state'] = 'invalid'; return result
+
+        info = parse_media_playlist(media_text)
+        result.update(segments=info['segments'], target_duration=info['target_duration'], media_sequence=info['media_sequence'])
+        if info['segments'] == 0: result['state'] = 'empty'
+        elif _is_stale(media_url, info, time.time()): result['state'] = 'stale'
+        return result
+    except ByteBudgetExceeded:
+        result['state'] = 'too_large'; return result
+    finally:
+        result['bytes_read'] = byte_budget - budget[0] # Сколько прочитано на самом деле (при превышении - бюджет + 1)
+
+
+# --- DASH ---
+_TEMPLATE_RE = re.compile(r'\$(RepresentationID|Number|Bandwidth|Time)(?:%0(\d+)d)?\$|\$\$')
+_ISO_DURATION_RE = re.compile(r'^P(?:(\d+(?:\.\d+)?)D)?(?:T(?:(\d+(?:\.\d+)?)H)?(?:(\d+(?:\.\d+)?)M)?(?:(\d+(?:\.\d+)?)S)?)?$')
+
+
+def _local_name(tag: str) -> str:
+    return tag.rsplit('}', 1)[-1]
+
+
+def parse_iso_duration(value: Optional[str]) -> float:
+    """'PT1H2M3.5S' -> секунды (дни тоже понимаются, месяцы/годы в MPD не встречаются)."""
+    match = _ISO_DURATION_RE.match(value.strip()) if value else None
+    if not match: return 0.0
+    days, hours, minutes, seconds = (float(part) if part else 0.0 for part in match.groups())
+    return days * 86400 + hours * 3600 + minutes * 60 + seconds
+
+
+def _parse_iso_datetime(value: Optional[str]) -> Optional[float]:
+    if not value: return None
+    try: parsed = datetime.fromisoformat(value.strip().replace('Z', '+00:00'))
+    except ValueError: return None
+    return parsed.timestamp() if parsed.tzinfo else None
+
+
+def fill_segment_template(template: str, representation_id: str, number: int, bandwidth: str, time_value: int) -> str:
+    values = {'RepresentationID': representation_id, 'Number': number, 'Bandwidth': bandwidth, 'Time': time_value}
+    def substitute(match: "re.Match[str]") -> str:
+        if match.group(0) == '$$': return '$'
+        value = values[match.group(1)]
+        return str(value).zfill(int(match.group(2))) if match.group(2) else str(value)
+    return _TEMPLATE_RE.sub(substitute, template)
+
+
+class _MPDScanner:
+    """Потоковый разбор MPD до конца первой Representation, для которой известен URL сегмента."""
+    _LEVELS = ('MPD', 'Period', 'AdaptationSet', 'Representation')
+
+    def __init__(self):
+        self.parser = ET.XMLPullParser(events=('start', 'end')); self.stack: List[str] = []
+        self.attributes: Dict[str, Dict[str, str]] = {}; self.base_urls: Dict[str, str] = {}; self.templates: Dict[str, Dict[str, Any]] = {}
+        self.done = False; self.is_mpd: Optional[bool] = None
+
+    def feed(self, chunk: bytes) -> None:
+        self.parser.feed(chunk)
+        for event, elem in self.parser.read_events():
+            name = _local_name(elem.tag)
+            if event == 'start':
+                if self.is_mpd is None: self.is_mpd = name == 'MPD'
+                self.stack.append(name)
+                if name in self._LEVELS: self.attributes[name] = dict(elem.attrib)
+                if name == 'AdaptationSet': self.templates.pop('AdaptationSet', None); self.base_urls.pop('AdaptationSet', None)
+                if name == 'Representation': self.templates.pop('Representation', None); self.base_urls.pop('Representation', None)
+                continue
+            self.stack.pop()
+            level = next((tag for tag in reversed(self.stack) if tag in self._LEVELS), None)
+            if name == 'BaseURL' and level and elem.text: self.base_urls.setdefault(level, elem.text.strip())
+            elif name == 'SegmentTemplate' and level:
+                timeline = [dict(s.attrib) for child in elem if _local_name(child.tag) == 'SegmentTimeline' for s in child if _local_name(s.tag) == 'S']
+                self.templates[level] = {**dict(elem.attrib), 'timeline': timeline}
+            elif name == 'Representation' and (self.segment_template() is not None or 'Representation' in self.base_urls): self.done = True; return
+
+    def segment_template(self) -> Optional[Dict[str, Any]]:
+        """Итоговый SegmentTemplate Representation (атрибуты наследуются с уровней выше)."""
+        merged: Dict[str, Any] = {}
+        for level in ('Period', 'AdaptationSet', 'Representation'):
+            if level in self.templates: merged.update({k: v for k, v in self.templates[level].items() if v or k != 'timeline'})
+        return merged if merged.get('media') or merged.get('initialization') else None
+
+    def base_url(self, manifest_url: str) -> str:
+        url = manifest_url
+        for level in self._LEVELS:
+            if level in self.base_urls: url = urljoin(url, self.base_urls[level])
+        return url
+
+
+def _dash_segment_url(scanner: _MPDScanner, manifest_url: str, now: float) -> Optional[str]:
+    template = scanner.segment_template()
+    if template is None: # SegmentBase / один файл на Representation - проверяем его начало
+        return scanner.base_url(manifest_url) if 'Representation' in scanner.base_urls else None
+    representation = scanner.attributes.get('Representation', {}); mpd = scanner.attributes.get('MPD', {})
+    rep_id = representation.get('id', ''); bandwidth = representation.get('bandwidth', '')
+    start_number = int(template.get('startNumber', 1)); timescale = float(template.get('timescale', 1)) or 1.0
+    number, time_value = start_number, 0
+    if template.get('timeline'):
+        # Последний сегмент из SegmentTimeline - самый свежий
+        current_time = 0; index = -1
+        for entry in template['timeline']:
+            if 't' in entry: current_time = int(entry['t'])
+            duration = int(entry.get('d', 0)); repeats = max(int(entry.get('r', 0)), 0)
+            for _ in range(repeats + 1): time_value = current_time; current_time += duration; index += 1
+        number = start_number + max(index, 0)
+    elif mpd.get('type') == 'dynamic' and template.get('duration'):
+        availability_start = _parse_iso_datetime(mpd.get('availabilityStartTime'))
+        period_start = parse_iso_duration(scanner.attributes.get('Period', {}).get('start'))
+        segment_seconds = float(template['duration']) / timescale
+        if availability_start is not None and segment_seconds > 0:
+            elapsed = now - availability_start - period_start
+            number = start_number + max(int(elapsed // segment_seconds) - DASH_LIVE_EDGE_SAFETY_SEGMENTS, 0)
+    media = template.get('media') or template.get('initialization')
+    return urljoin(scanner.base_url(manifest_url), fill_segment_template(media, rep_id, number, bandwidth, time_value))
+
+
+def probe_dash(url: str, timeout: float = 5, headers: Optional[Dict[str, str]] = None, byte_budget: int = DEFAULT_BYTE_BUDGET,
+               session: Optional[requests.Session] = None) -> ProbeResult:
+    """Проверка DASH: манифест + Range-запрос одного сегмента. Сетевые исключения requests пробрасываются.
+
+    Результат в том же виде, что и у probe_hls: 'kind' = 'DASH', 'state' - 'ok' | 'empty' (нет SegmentTemplate) |
+    'segment_error' | 'http_error' | 'invalid' | 'too_large', плюс 'status_code', 'ttfb_ms', 'segment_url',
+    'segment_status', 'segment_ttfb_ms', 'mpd_type', 'availability_start_time', 'publish_time', 'bytes_read'."""
+    session = session or get_host_pool().session; headers = headers or {}
+    result: ProbeResult = {'kind': 'DASH', 'state': 'ok', 'status_code': None, 'ttfb_ms': None, 'segment_url': None, 'segment_status': None,
+                           'segment_ttfb_ms': None, 'mpd_type': None, 'availability_start_time': None, 'publish_time': None, 'bytes_read': 0}
+    scanner = _MPDScanner(); bytes_read = 0
+    response = session.get(url, headers=headers, timeout=timeout, stream=True, allow_redirects=True)
+    try:
+        result['status_code'] = response.status_code; result['ttfb_ms'] = int(response.elapsed.total_seconds() * 1000)
+        if response.status_code >= 400: result['state'] = 'http_error'; return result
+        try:
+            for chunk in _iter_limited(response, byte_budget + 1):
+                bytes_read += len(chunk); scanner.feed(chunk)
+                if scanner.is_mpd is False or scanner.done: break # Дальше манифест не нужен
+                if bytes_read > byte_budget: result['state'] = 'too_large'; return result
+        except ET.ParseError:
+            if not scanner.done: result['state'] = 'invalid'; return result
+    finally:
+        response.close(); result['bytes_read'] = bytes_read
+    if not scanner.is_mpd: result['state'] = 'invalid'; return result
+
+    mpd = scanner.attributes.get('MPD', {})
+    result.update(mpd_type=mpd.get('type', 'static'), availability_start_time=mpd.get('availabilityStartTime'), publish_time=mpd.get('publishTime'))
+    segment_url = _dash_segment_url(scanner, response.url, time.time())
+    if segment_url is None: result['state'] = 'empty'; return result
+    result['segment_url'] = segment_url
+
+    segment_headers = dict(headers); segment_headers['Range'] = f"bytes=0-{SEGMENT_PROBE_BYTES - 1}"
+    segment_response = session.get(segment_url, headers=segment_headers, timeout=timeout, stream=True, allow_redirects=True)
+    try:
+        result['segment_status'] = segment_response.status_code; result['segment_ttfb_ms'] = int(segment_response.elapsed.total_seconds() * 1000)
+        if segment_response.status_code >= 400: result['state'] = 'segment_error'; return result
+        received = 0
+        for chunk in _iter_limited(segment_response, SEGMENT_PROBE_BYTES): received += len(chunk) # Сервер мог проигнорировать Range - дальше не качаем
+        result['bytes_read'] += received
+        if received == 0: result['state'] = 'segment_error'
+        return result
+    finally:
+        segment_response.close()
+
+
+# --- Общая проверка канала ---
+CheckOutcome = Dict[str, Any]
+HOST_FAILURE_OUTCOMES = ('timeout', 'connection_error') # Исходы, которые засчитываются хосту как отказ (см. HostCircuitBreaker)
+_HTTP_OUTCOMES = {404: 'not_found', 403: 'forbidden', 405: 'head_not_allowed'}
+VLC_OPTION_HEADERS = {'http-user-agent': 'User-Agent', 'http-referrer': 'Referer', 'http-referer': 'Referer'}
+
+
+def headers_from_vlc_opts(vlc_opts: Optional[Dict[str, str]]) -> Optional[Dict[str, str]]:
+    """HTTP-заголовки канала из его #EXTVLCOPT (http-user-agent, http-referrer). None - своих заголовков нет."""
+    if not vlc_opts: return None
+    headers = {VLC_OPTION_HEADERS[key]: value for key, value in vlc_opts.items() if key in VLC_OPTION_HEADERS and value}
+    return headers or None
+
+
+def ranged_get(url: str, timeout: float, headers: Dict[str, str], probe_bytes: int = RANGE_PROBE_BYTES,
+               session: Optional[requests.Session] = None) -> Tuple[requests.Response, int]:
+    """GET с Range: bytes=0-(probe_bytes-1). Читается не больше probe_bytes, даже если сервер игнорирует Range
+    и отдает поток целиком, после чего соединение закрывается. Возвращает (ответ, сколько байт прочитано)."""
+    session = session or get_host_pool().session; range_headers = dict(headers); range_headers['Range'] = f"bytes=0-{probe_bytes - 1}"
+    response = session.get(url, headers=range_headers, timeout=timeout, stream=True, allow_redirects=True)
+    try:
+        received = 0
+        if response.status_code < 400:
+            for chunk in response.iter_content(chunk_size=probe_bytes):
+                received += len(chunk)
+                if received >= probe_bytes: break
+        return response, received
+    finally:
+        response.close()
+
+
+def head_or_range(session: requests.Session, url: str, timeout: float, headers: Dict[str, str]) -> Tuple[requests.Response, Optional[int]]:
+    """HEAD, а если сервер его отвергает (405/501) - ранжированный GET. Возвращает (ответ, прочитано байт GET или None)."""
+    response = session.head(url, timeout=timeout, headers=headers, allow_redirects=True); response.close()
+    if response.status_code not in HEAD_REFUSED_STATUSES: return response, None
+    return ranged_get(url, timeout, headers, session=session)
+
+
+def _close_response(result: Tuple[requests.Response, Optional[int]]) -> None:
+    result[0].close()
+
+
+def check_coalesce_key(url: str, headers: Optional[Dict[str, str]] = None) -> Tuple[str, Tuple[Tuple[str, str], ...]]:
+    """Ключ объединения проверок: нормализованный URL + заголовки канала (с другим User-Agent ответ может отличаться)."""
+    return normalize_url(url), tuple(sorted(headers.items())) if headers else ()
+
+
+def make_outcome(outcome: str = 'unknown') -> CheckOutcome:
+    return {'outcome': outcome, 'status_code': None, 'latency_ms': None, 'kind': None, 'details': {}}
+
+
+def outcome_for_status(status_code: int) -> str:
+    if 200 <= status_code < 300: return 'ok'
+    return _HTTP_OUTCOMES.get(status_code, 'http_error')
+
+
+def check_stream(url: Optional[str], timeout: float = 5, headers: Optional[Dict[str, str]] = None, deep: bool = False,
+                 byte_budget: int = DEFAULT_BYTE_BUDGET, pool: Optional[HostPool] = None) -> CheckOutcome:
+    """Проверка одного канала без привязки к интерфейсу: HEAD, DASH-манифест или (deep) HLS-плейлисты.
+    Если сервер отвергает HEAD (405/501), поток проверяется ранжированным GET (details['method'] = 'GET').
+    Запросы идут через пул соединений pool (по умолчанию общий) и занимают место в лимите хоста.
+    Если имя хоста не резолвится (кеш DNS пула) или автомат пула считает хост недоступным, запрос не делается
+    вовсе ('dns_error' / 'host_down'). Если у пула есть
+    трекер задержек, таймаут берется по хосту (а не timeout), и HEAD, не ответивший за p95 хоста, дублируется,
+    если у хоста есть свободное место (дубль его занимает).
+
+    Результат: 'outcome' - 'ok' | 'not_found' | 'forbidden' | 'head_not_allowed' | 'http_error' | 'timeout' |
+    'connection_error' | 'request_error' | 'unknown' | 'not_http' | 'empty' | 'stale' | 'segment_error' | 'invalid' | 'too_large' | 'host_down' | 'dns_error',
+    плюс 'status_code', 'latency_ms', 'kind' ('HLS' / 'DASH', None для HEAD) и 'details' (непустые поля пробы)."""
+    result = make_outcome('not_http')
+    if not url or not url.lower().startswith(('http://', 'https://')): return result
+    headers = headers or {}; pool = pool or get_host_pool(); session = pool.session
+    host = host_key(url); breaker = pool.breaker; latency = pool.latency
+    if pool.dns is not None and host:
+        try: pool.dns.resolve(urlsplit(url).hostname)
+        except DnsResolutionError as e: result.update(outcome='dns_error', details={'error': str(e)}); return result
+    if breaker is not None and not breaker.allow(host): result['outcome'] = 'host_down'; return result
+    if latency is not None: timeout = latency.timeout_for(host)
+    started = time.monotonic()
+    try:
+        with pool.host_slot(url):
+            if is_dash_url(url): probe = probe_dash(url, timeout=timeout, headers=headers, byte_budget=byte_budget, session=session)
+            elif deep and is_hls_url(url): probe = probe_hls(url, timeout=timeout, headers=headers, byte_budget=byte_budget, session=session)
+            else: probe = None
+            if probe is None:
+                (response, received), hedge_won = hedged_call(functools.partial(head_or_range, session, url, timeout, headers),
+                                                              latency.hedge_after(host) if latency is not None else None,
+                                                              try_slot=functools.partial(pool.try_host_slot, url), discard=_close_response)
+                if hedge_won is not None: latency.record_hedge(hedge_won)
+                outcome = outcome_for_status(response.status_code)
+                if received is not None: # HEAD не поддерживается - проверено началом потока
+                    result['details'] = {'method': 'GET', 'bytes_read': received}
+                    if outcome == 'head_not_allowed': outcome = 'http_error'
+                result.update(outcome=outcome, status_code=response.status_code, latency_ms=int(response.elapsed.total_seconds() * 1000))
+        if probe is not None:
+            state = probe['state']
+            result.update(kind=probe['kind'], status_code=probe['status_code'], latency_ms=probe.get('segment_ttfb_ms') or probe['ttfb_ms'],
+                          details={key: value for key, value in probe.items() if key not in ('kind', 'state', 'status_code') and value is not None})
+            result['outcome'] = outcome_for_status(probe['status_code']) if state == 'http_error' else state
+    except requests.exceptions.Timeout: result['outcome'] = 'timeout'
+    except requests.exceptions.ConnectionError: result['outcome'] = 'connection_error'
+    except requests.exceptions.RequestException: result['outcome'] = 'request_error'
+    except Exception: result['outcome'] = 'unknown'
+    if breaker is not None: breaker.record(host, result['outcome'] in HOST_FAILURE_OUTCOMES, time.monotonic() - started)
+    if latency is not None:
+        if result['outcome'] == 'timeout': latency.record_timeout(host, timeout)
+        elif result['status_code'] is not None and result['latency_ms'] is not None: latency.record(host, result['latency_ms'] / 1000)
+    return result
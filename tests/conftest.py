@@ -0,0 +1,24 @@
+# --- Общие фикстуры тестов ---
+# Модули лежат в корне репозитория (как и для benchmarks/), локальные HTTP-серверы - на 127.0.0.1 со случайным портом.
+import http.server
+import os
+import sys
+import threading
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+@pytest.fixture
+def local_server():
+    """local_server(Handler) -> 'http://127.0.0.1:порт'; серверы останавливаются после теста."""
+    servers = []
+
+    def start(handler_class):
+        server = http.server.ThreadingHTTPServer(('127.0.0.1', 0), handler_class); server.daemon_threads = True
+        threading.Thread(target=server.serve_forever, daemon=True).start(); servers.append(server)
+        return f"http://127.0.0.1:{server.server_address[1]}"
+
+    yield start
+    for server in servers: server.shutdown(); server.server_close()
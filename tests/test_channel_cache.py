@@ -0,0 +1,87 @@
+# --- channels.json: сверка с плейлистом, слияние, старый формат ---
+import json
+import os
+
+from channel_cache import load_channel_cache, save_channel_cache, set_channel_url, sync_channel_cache
+from m3u_parser import read_m3u
+
+
+def write_playlist(path, channels, mtime=None):
+    with open(path, 'w', encoding='utf-8') as f:
+        f.write('#EXTM3U url-tvg="http://epg.example/epg.xml.gz" catchup="shift"\n')
+        for name, url in channels: f.write(f'#EXTINF:-1 tvg-id="{name.lower()}" group-title="Общие",{name}\n{url}\n')
+    if mtime is not None: os.utime(path, ns=(mtime, mtime))
+
+
+class CountingParse:
+    def __init__(self): self.calls = 0
+
+    def __call__(self, path):
+        self.calls += 1; return read_m3u(path)
+
+
+def sync(tmp_path, cached, parse=None):
+    return sync_channel_cache(cached, str(tmp_path / 'channels.m3u'), parse or CountingParse())
+
+
+def first_sync(tmp_path):
+    write_playlist(tmp_path / 'channels.m3u', [('One', 'http://a/1'), ('Two', 'http://a/2')], mtime=10**18)
+    data, stats = sync(tmp_path, None)
+    assert stats == {'action': 'parsed', 'dirty': True, 'added': 2} and data['epg_url'] == 'http://epg.example/epg.xml.gz'
+    save_channel_cache(data, str(tmp_path / 'channels.json'))
+    cached = load_channel_cache(str(tmp_path / 'channels.json'))
+    assert cached['m3u_header'] == {'url-tvg': 'http://epg.example/epg.xml.gz', 'catchup': 'shift'}
+    return cached
+
+
+def test_unchanged_fingerprint_skips_parse(tmp_path):
+    cached = first_sync(tmp_path); parse = CountingParse()
+    data, stats = sync(tmp_path, cached, parse)
+    assert stats == {'action': 'unchanged', 'dirty': False} and data is cached and parse.calls == 0
+    os.utime(tmp_path / 'channels.m3u', ns=(2 * 10**18, 2 * 10**18)) # Тот же файл, другое mtime - по хешу
+    data, stats = sync(tmp_path, cached, parse)
+    assert stats['action'] == 'touched' and stats['dirty'] and parse.calls == 0
+
+
+def test_url_override_survives_playlist_edit(tmp_path):
+    cached = first_sync(tmp_path)
+    set_channel_url(cached['channels'][0], 'http://mirror/1')
+    write_playlist(tmp_path / 'channels.m3u', [('One', 'http://a/1'), ('Two', 'http://a/2'), ('Three', 'http://a/3')])
+    data, stats = sync(tmp_path, cached)
+    assert stats['action'] == 'merged' and (stats['added'], stats['removed'], stats['kept_overrides']) == (1, 0, 1)
+    one = data['channels'][0]
+    assert one['url'] == 'http://mirror/1' and one['m3u_url'] == 'http://a/1' and [ch['number'] for ch in data['channels']] == [1, 2, 3]
+
+
+def test_new_url_in_playlist_wins_over_override(tmp_path):
+    cached = first_sync(tmp_path)
+    set_channel_url(cached['channels'][0], 'http://mirror/1')
+    write_playlist(tmp_path / 'channels.m3u', [('One', 'http://b/1'), ('Two', 'http://a/2')])
+    data, stats = sync(tmp_path, cached)
+    assert data['channels'][0]['url'] == 'http://b/1' and 'm3u_url' not in data['channels'][0]
+    assert (stats['kept_overrides'], stats['changed'], stats['unchanged']) == (0, 1, 1)
+
+
+def test_legacy_list_cache_is_merged(tmp_path):
+    write_playlist(tmp_path / 'channels.m3u', [('One', 'http://a/1'), ('Two', 'http://a/2')])
+    legacy = [{'name': 'One', 'tvg_name': 'One', 'group': 'Общие', 'id': 'one', 'url': 'http://edited/1'},
+              {'name': 'Old', 'tvg_name': 'Old', 'group': 'Общие', 'id': 'old', 'url': 'http://a/9'}]
+    with open(tmp_path / 'channels.json', 'w', encoding='utf-8') as f: json.dump(legacy, f)
+    cached = load_channel_cache(str(tmp_path / 'channels.json'))
+    assert cached['source'] is None and [ch['number'] for ch in cached['channels']] == [1, 2]
+    data, stats = sync(tmp_path, cached)
+    assert stats['action'] == 'merged' and (stats['added'], stats['removed'], stats['kept_overrides']) == (1, 1, 1)
+    assert data['channels'][0]['url'] == 'http://edited/1' and data['channels'][0]['m3u_url'] == 'http://a/1' # В старом кеше JSON побеждает
+    assert data['source']['files'][0]['sha256']
+
+
+def test_parse_failure_keeps_cache(tmp_path):
+    cached = first_sync(tmp_path); before = json.dumps(cached, sort_keys=True)
+    with open(tmp_path / 'channels.m3u', 'w', encoding='utf-8') as f: f.write('#EXTM3U\n')
+    data, stats = sync(tmp_path, cached)
+    assert stats == {'action': 'parse_failed', 'dirty': False} and data is cached and json.dumps(data, sort_keys=True) == before
+
+
+def test_missing_playlist_uses_cache(tmp_path):
+    cached = first_sync(tmp_path); os.remove(tmp_path / 'channels.m3u')
+    assert sync(tmp_path, cached) == (cached, {'action': 'no_playlist', 'dirty': False})
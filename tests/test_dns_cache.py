@@ -0,0 +1,67 @@
+# --- Кеш DNS: подставной резолвер и часы ---
+import http.server
+import socket
+
+import pytest
+
+from dns_cache import DnsCache, DnsResolutionError
+from host_pool import HostPool
+from recheck_scheduler import ManualClock
+from stream_probe import check_stream
+
+
+class StubResolver:
+    def __init__(self, answers):
+        self.answers = answers; self.calls = []
+
+    def __call__(self, hostname):
+        self.calls.append(hostname); answer = self.answers.get(hostname)
+        if answer is None: raise socket.gaierror(socket.EAI_NONAME, "Name or service not known")
+        return answer
+
+
+def test_answers_are_cached_until_ttl():
+    clock = ManualClock(); resolver = StubResolver({'tv.example': ['10.0.0.1']}); cache = DnsCache(resolver, ttl_seconds=300, clock=clock)
+    assert cache.resolve('TV.example.') == ['10.0.0.1']
+    clock.advance(299)
+    assert cache.resolve('tv.example') == ['10.0.0.1'] and resolver.calls == ['tv.example'] and cache.hits == 1
+    clock.advance(1)
+    cache.resolve('tv.example')
+    assert resolver.calls == ['tv.example', 'tv.example']
+
+
+def test_failures_are_cached_for_negative_ttl():
+    clock = ManualClock(); resolver = StubResolver({}); cache = DnsCache(resolver, negative_ttl_seconds=60, clock=clock)
+    for _ in range(2):
+        with pytest.raises(DnsResolutionError): cache.resolve('gone.example')
+    assert resolver.calls == ['gone.example']
+    clock.advance(60); resolver.answers['gone.example'] = ['10.0.0.2']
+    assert cache.resolve('gone.example') == ['10.0.0.2']
+
+
+def test_ip_literals_skip_resolver():
+    resolver = StubResolver({}); cache = DnsCache(resolver)
+    assert cache.resolve('127.0.0.1') == ['127.0.0.1'] and cache.resolve('[::1]') == ['::1'] and resolver.calls == []
+
+
+def test_prefetch_resolves_unique_names_once():
+    resolver = StubResolver({'a.example': ['10.0.0.1'], 'b.example': ['10.0.0.2']}); cache = DnsCache(resolver, clock=ManualClock())
+    stats = cache.prefetch(['a.example', 'A.example', 'b.example', 'gone.example', ''])
+    assert (stats['hosts'], stats['resolved'], stats['failed']) == (3, 2, 1)
+    cache.prefetch(['a.example', 'b.example'])
+    assert sorted(resolver.calls) == ['a.example', 'b.example', 'gone.example']
+
+
+def test_check_stream_uses_cached_address(local_server):
+    class Handler(http.server.BaseHTTPRequestHandler):
+        def do_HEAD(self):
+            self.send_response(200); self.send_header('Content-Length', '0'); self.end_headers()
+
+        def log_message(self, *args): pass
+
+    port = local_server(Handler).rsplit(':', 1)[1]
+    resolver = StubResolver({'tv.example': ['127.0.0.1']}); pool = HostPool(dns=DnsCache(resolver, clock=ManualClock()))
+    assert check_stream(f'http://tv.example:{port}/live', pool=pool)['outcome'] == 'ok' # Имя знает только подставной резолвер
+    result = check_stream(f'http://gone.example:{port}/live', pool=pool)
+    assert result['outcome'] == 'dns_error' and 'gone.example' in result['details']['error']
+    pool.close()
@@ -0,0 +1,81 @@
+# --- Кеш EPG: условная перепроверка и запасной кеш без сети ---
+import gzip
+import time
+
+import requests
+
+from epg_cache import EPGCache, fetch_epg
+from epg_loader import epg_time_window
+
+MAX_AGE = 3600
+
+
+def _xmltv_time(timestamp):
+    return time.strftime('%Y%m%d%H%M%S +0000', time.gmtime(timestamp))
+
+
+def make_feed(now, days=3):
+    """Фид на несколько суток вперед (как у реальных провайдеров) - дальше окна кеша."""
+    programmes = "".join(f'<programme channel="c1" start="{_xmltv_time(now + hour * 3600)}" stop="{_xmltv_time(now + (hour + 1) * 3600)}">'
+                         f'<title>P{hour}</title></programme>' for hour in range(-2, days * 24))
+    return gzip.compress(f'<?xml version="1.0"?><tv>{programmes}</tv>'.encode('utf-8'))
+
+
+def feed_handler(body, requests_log):
+    import http.server
+
+    class Handler(http.server.BaseHTTPRequestHandler):
+        def do_GET(self):
+            requests_log.append(dict(self.headers))
+            if self.headers.get('If-None-Match') == '"v1"': self.send_response(304); self.end_headers(); return
+            self.send_response(200); self.send_header('ETag', '"v1"'); self.send_header('Content-Length', str(len(body))); self.end_headers(); self.wfile.write(body)
+
+        def log_message(self, *args): pass
+
+    return Handler
+
+
+def age_cache(cache, url, seconds):
+    """Делает кеш таким, каким он был бы, если бы фид скачали seconds назад (время и окно сдвигаются)."""
+    entry = cache.load(url, ['c1']); meta = entry.meta; covered_until = meta['covered_until']
+    cache.save(url, entry.epg, meta['channel_ids'], [edge - seconds for edge in meta['time_window']], meta['etag'], meta['last_modified'],
+               fetched_at=time.time() - seconds, covered_until=None if covered_until is None else covered_until - seconds)
+
+
+def fetch(url, cache):
+    return fetch_epg(url, cache, ['c1'], epg_time_window(2, 24), MAX_AGE, 5, {})
+
+
+def test_fresh_cache_is_used_without_request(tmp_path, local_server):
+    log = []; url = local_server(feed_handler(make_feed(time.time()), log)) + "/epg.xml.gz"; cache = EPGCache(str(tmp_path / "epg.bin"))
+    assert fetch(url, cache)[1]['source'] == 'network'
+    assert fetch(url, cache)[1]['source'] == 'cache' and len(log) == 1
+
+
+def test_aged_cache_is_revalidated_with_304(tmp_path, local_server):
+    log = []; url = local_server(feed_handler(make_feed(time.time()), log)) + "/epg.xml.gz"; cache = EPGCache(str(tmp_path / "epg.bin"))
+    epg, stats = fetch(url, cache)
+    age_cache(cache, url, MAX_AGE + 1)
+    cached_epg, stats = fetch(url, cache)
+    assert stats['source'] == 'not_modified'
+    assert log[-1].get('If-None-Match') == '"v1"'
+    assert len(cached_epg) == len(epg) and cache.load(url, ['c1']).age_seconds < 60 # touch() обновил время
+    assert fetch(url, cache)[1]['source'] == 'cache'
+
+
+def test_aged_cache_is_used_when_network_fails(tmp_path, local_server):
+    log = []; url = local_server(feed_handler(make_feed(time.time()), log)) + "/epg.xml.gz"; cache = EPGCache(str(tmp_path / "epg.bin"))
+    fetch(url, cache); age_cache(cache, url, 2 * 24 * 3600) # Старше окна кеша: без сети - все равно лучше, чем ничего
+    dead_url = url; cache_file = cache.filepath
+
+    def failing_get(*args, **kwargs): raise requests.exceptions.ConnectionError("down")
+
+    epg, stats = fetch_epg(dead_url, EPGCache(cache_file), ['c1'], epg_time_window(2, 24), MAX_AGE, 5, {}, http_get=failing_get)
+    assert stats['source'] == 'stale_cache' and len(epg) == 1
+
+
+def test_cache_beyond_its_window_is_downloaded_again(tmp_path, local_server):
+    log = []; url = local_server(feed_handler(make_feed(time.time()), log)) + "/epg.xml.gz"; cache = EPGCache(str(tmp_path / "epg.bin"))
+    fetch(url, cache); age_cache(cache, url, 2 * 24 * 3600)
+    epg, stats = fetch(url, cache)
+    assert stats['source'] == 'network' and 'If-None-Match' not in log[-1]
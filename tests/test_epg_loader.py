@@ -0,0 +1,38 @@
+# --- Время XMLTV: быстрый разбор дает то же, что dateutil ---
+from datetime import timezone
+
+import pytest
+from dateutil.parser import parse as parse_datetime
+
+from epg_loader import XMLTVTimeParser
+
+FAST_VALUES = ['20240131235959 +0000', '20240229120000 +0300', '20231231230000 -0000', '20240615083000 +0530', '20240615083000 -0930',
+               '20240615083000 +1400', '20240615083000', '20240615083000+0200', '19700101000000 +0000', '21000228000000 +0100']
+FALLBACK_VALUES = ['20240615083000 +05', '20240615083000 UTC', '20240615083000 +0000 ', '2024-06-15T08:30:00+02:00']
+BROKEN_VALUES = ['20240615083000 +0000 XYZ', '20240230120000 +0000', '20241315083000 +0000', 'garbage']
+
+
+def dateutil_timestamp(value):
+    """Прежний путь: dateutil, время без смещения - UTC."""
+    parsed = parse_datetime(value)
+    if parsed.tzinfo is None: parsed = parsed.replace(tzinfo=timezone.utc)
+    return int(parsed.timestamp())
+
+
+@pytest.mark.parametrize('value', FAST_VALUES)
+def test_fast_path_matches_dateutil(value):
+    parser = XMLTVTimeParser()
+    assert parser(value) == dateutil_timestamp(value) and parser.fallback_count == 0
+
+
+@pytest.mark.parametrize('value', FALLBACK_VALUES)
+def test_other_formats_go_to_dateutil(value):
+    parser = XMLTVTimeParser()
+    assert parser(value) == dateutil_timestamp(value) and parser.fallback_count == 1
+
+
+@pytest.mark.parametrize('value', BROKEN_VALUES)
+def test_malformed_values_are_counted_and_raise(value):
+    parser = XMLTVTimeParser()
+    with pytest.raises(Exception): parser(value)
+    assert parser.fallback_count == 1
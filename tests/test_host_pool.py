@@ -0,0 +1,139 @@
+# --- Пул хостов: адаптивные таймауты, дублирование запросов, автомат по хостам ---
+import http.server
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import host_pool
+from host_pool import HostCircuitBreaker, HostLatencyTracker, HostPool, hedged_call, host_key
+from recheck_scheduler import ManualClock
+from stream_probe import check_stream
+
+HOST = 'http://cdn.example'
+
+
+def fast_tracker(**kwargs):
+    tracker = HostLatencyTracker(floor=0.2, ceiling=2.0, multiplier=3.0, min_samples=5, **kwargs)
+    for _ in range(5): tracker.record(HOST, 0.01)
+    return tracker
+
+
+def test_fast_host_gets_floor_timeout():
+    assert fast_tracker().timeout_for(HOST) == 0.2
+
+
+def test_timeouts_raise_p95():
+    tracker = fast_tracker(streak_to_ceiling=100)
+    tracker.record_timeout(HOST, 0.2); tracker.record(HOST, 0.01)
+    assert tracker.p95(HOST) == 0.2 and abs(tracker.timeout_for(HOST) - 0.6) < 1e-9 # Хост, которому не хватило 0,2 с, получает больше
+
+
+def test_timeout_streak_returns_ceiling_until_answer():
+    tracker = fast_tracker()
+    tracker.record_timeout(HOST, 0.2)
+    assert tracker.timeout_for(HOST) < 2.0
+    tracker.record_timeout(HOST, 0.2)
+    assert tracker.timeout_for(HOST) == 2.0
+    tracker.record(HOST, 0.01)
+    assert tracker.timeout_for(HOST) < 2.0
+
+
+def test_check_stream_records_timeout(local_server):
+    class SlowHandler(http.server.BaseHTTPRequestHandler):
+        def do_HEAD(self):
+            if self.path == '/slow': time.sleep(0.5)
+            self.send_response(200); self.send_header('Content-Length', '0'); self.end_headers()
+
+        def log_message(self, *args): pass
+
+    base = local_server(SlowHandler); host = host_key(base)
+    latency = HostLatencyTracker(floor=0.1, ceiling=2.0, min_samples=5)
+    pool = HostPool(latency=latency)
+    for _ in range(5): assert check_stream(base + '/fast', pool=pool)['outcome'] == 'ok'
+    assert latency.timeout_for(host) == 0.1
+    assert check_stream(base + '/slow', pool=pool)['outcome'] == 'timeout'
+    assert check_stream(base + '/slow', pool=pool)['outcome'] == 'timeout'
+    assert latency.timeout_for(host) == 2.0
+    assert check_stream(base + '/slow', pool=pool)['outcome'] == 'ok'
+
+
+class Answer:
+    def __init__(self): self.closed = False
+
+    def close(self): self.closed = True
+
+
+def slow_then_fast(delays):
+    """func для hedged_call: i-й вызов отвечает через delays[i] секунд."""
+    calls = []
+
+    def func():
+        calls.append(None); time.sleep(delays[len(calls) - 1]); return Answer()
+    return func, calls
+
+
+def test_hedge_needs_free_host_slot():
+    pool = HostPool(max_per_host=1); url = HOST + '/a'
+    func, calls = slow_then_fast([0.3, 0.0])
+    with pool.host_slot(url): result, hedge_won = hedged_call(func, 0.05, try_slot=lambda: pool.try_host_slot(url))
+    assert hedge_won is None and len(calls) == 1
+
+
+def test_hedge_holds_slot_until_loser_finishes_and_closes_it():
+    pool = HostPool(max_per_host=2); url = HOST + '/a'; losers = []
+    func, calls = slow_then_fast([0.3, 0.0])
+    with pool.host_slot(url): result, hedge_won = hedged_call(func, 0.05, try_slot=lambda: pool.try_host_slot(url), discard=losers.append)
+    assert hedge_won is True and len(calls) == 2
+    assert pool.try_host_slot(url) is not None # Одно место свободно, второе держит основной вызов, который еще идет
+    assert pool.try_host_slot(url) is None
+    time.sleep(0.4)
+    assert len(losers) == 1 and losers[0] is not result
+
+
+# --- Автомат по хостам ---
+def tripped_breaker():
+    clock = ManualClock(); breaker = HostCircuitBreaker(failure_threshold=3, cooldown_seconds=60, clock=clock)
+    for _ in range(3):
+        assert breaker.allow(HOST); breaker.record(HOST, True, duration=2.0)
+    return breaker, clock
+
+
+def test_breaker_trips_after_consecutive_failures():
+    clock = ManualClock(); breaker = HostCircuitBreaker(failure_threshold=3, cooldown_seconds=60, clock=clock)
+    breaker.record(HOST, True); breaker.record(HOST, True); breaker.record(HOST, False) # Успех обнуляет серию
+    breaker.record(HOST, True); breaker.record(HOST, True)
+    assert not breaker.is_open(HOST)
+    breaker.record(HOST, True)
+    assert breaker.is_open(HOST) and breaker.open_hosts() == 1
+
+
+def test_open_breaker_rejects_until_cooldown():
+    breaker, clock = tripped_breaker()
+    clock.advance(59)
+    assert not breaker.allow(HOST) and not breaker.allow(HOST)
+    assert breaker.short_circuited == 2 and breaker.saved_seconds == 4.0
+    assert breaker.allow('http://other.example') # Другие хосты не затронуты
+
+
+def test_cooldown_lets_one_probe_and_success_closes():
+    breaker, clock = tripped_breaker(); clock.advance(60)
+    assert breaker.allow(HOST) and not breaker.allow(HOST) # Пока идет пробная проверка - остальные пропускаются
+    breaker.record(HOST, False)
+    assert not breaker.is_open(HOST) and breaker.allow(HOST) and breaker.allow(HOST)
+
+
+def test_failed_probe_reopens_for_another_cooldown():
+    breaker, clock = tripped_breaker(); clock.advance(60)
+    assert breaker.allow(HOST)
+    breaker.record(HOST, True)
+    assert breaker.is_open(HOST) and not breaker.allow(HOST)
+    clock.advance(59); assert not breaker.allow(HOST)
+    clock.advance(1); assert breaker.allow(HOST)
+
+
+def test_hedge_timer_starts_when_primary_runs(monkeypatch):
+    executor = ThreadPoolExecutor(max_workers=1); monkeypatch.setattr(host_pool, '_hedge_executor', executor)
+    executor.submit(time.sleep, 0.3) # Все потоки заняты другим проходом
+    func, calls = slow_then_fast([0.05, 0.0])
+    result, hedge_won = hedged_call(func, 0.1)
+    assert hedge_won is None and len(calls) == 1 # Очередь в 0,3 с не вызвала дубль
+    executor.shutdown()
@@ -0,0 +1,32 @@
+# --- M3U: запись канала обратно в том виде, в каком он был в плейлисте ---
+import json
+
+from m3u_parser import format_m3u_channel, iter_m3u_channels
+
+PLAYLIST = '''#EXTM3U
+#EXTINF:0 group-title="News" tvg-name="BBC" tvg-id="bbc.uk" catchup="default",BBC
+#EXTVLCOPT:http-user-agent=Player/1.0
+http://a.example/1
+#EXTINF:-1,Plain
+#EXTGRP:Movies
+http://a.example/2
+#EXTINF:3600 tvg-logo="logo.png",VOD, part 2
+http://a.example/3'''
+
+
+def test_extinf_is_written_back_as_is():
+    lines = []
+    for channel in iter_m3u_channels(PLAYLIST.splitlines()): lines += format_m3u_channel(json.loads(json.dumps(channel))) # Как после channels.json
+    assert lines == PLAYLIST.splitlines()[1:]
+
+
+def test_changed_fields_are_written():
+    channel = next(iter_m3u_channels(PLAYLIST.splitlines()))
+    channel.update(url='http://b.example/1', logo='new.png', group='World')
+    assert format_m3u_channel(channel) == ['#EXTINF:0 group-title="World" tvg-name="BBC" tvg-id="bbc.uk" catchup="default",BBC',
+                                           '#EXTVLCOPT:http-user-agent=Player/1.0', 'http://b.example/1']
+
+
+def test_channel_without_extinf_is_rebuilt_from_fields():
+    channel = {'name': 'BBC', 'tvg_name': 'BBC', 'id': 'bbc.uk', 'group': 'News', 'url': 'http://a.example/1'}
+    assert format_m3u_channel(channel) == ['#EXTINF:-1 tvg-id="bbc.uk" group-title="News",BBC', 'http://a.example/1']
@@ -0,0 +1,72 @@
+# --- Экспорт очищенного плейлиста: зеркала, мертвые каналы, порядок ---
+from m3u_parser import format_m3u_header, iter_m3u_channels
+from playlist_export import PlaylistExporter
+
+
+def channel(name, url, group='Новости', channel_id=None):
+    return {'name': name, 'tvg_name': name, 'group': group, 'id': channel_id, 'url': url}
+
+
+def ok(latency_ms):
+    return {'outcome': 'ok', 'latency_ms': latency_ms}
+
+
+def urls(exporter):
+    return [line for line in exporter.iter_lines() if not line.startswith('#')]
+
+
+def test_fastest_mirror_wins_by_tvg_id_or_title():
+    exporter = PlaylistExporter()
+    exporter.add(channel('BBC', 'http://slow/bbc', channel_id='bbc.uk'), ok(900))
+    exporter.add(channel('BBC World', 'http://fast/bbc', channel_id='bbc.uk'), ok(100)) # Тот же tvg-id, другое название
+    exporter.add(channel('Euronews', 'http://a/euronews'), ok(300))
+    exporter.add(channel('EURONEWS', 'http://b/euronews'), ok(200)) # Без tvg-id - по названию без учета регистра
+    exporter.add(channel('Euronews', 'http://c/euronews', group='Другая'), ok(50)) # В другой группе - отдельный канал
+    assert urls(exporter) == ['http://fast/bbc', 'http://b/euronews', 'http://c/euronews']
+    assert exporter.stats() == {'kept': 3, 'dead': 0, 'unchecked': 0, 'duplicates': 2}
+
+
+def test_equal_latency_keeps_first_position():
+    exporter = PlaylistExporter()
+    exporter.add(channel('A', 'http://second/a'), ok(100), position=5)
+    exporter.add(channel('A', 'http://first/a'), ok(100), position=1)
+    assert urls(exporter) == ['http://first/a']
+
+
+def test_dead_and_unchecked_are_dropped_not_http_goes_last():
+    exporter = PlaylistExporter()
+    assert not exporter.add(channel('Dead', 'http://a/dead'), {'outcome': 'timeout', 'latency_ms': None})
+    assert not exporter.add(channel('NotFound', 'http://a/404'), {'outcome': 'not_found', 'latency_ms': 40})
+    assert not exporter.add(channel('Unchecked', 'http://a/new'), None)
+    assert exporter.add(channel('Multicast', 'udp://@239.0.0.1:1234'), {'outcome': 'not_http', 'latency_ms': None})
+    assert exporter.add(channel('Slow', 'http://a/slow'), ok(2000))
+    assert urls(exporter) == ['http://a/slow', 'udp://@239.0.0.1:1234']
+    assert exporter.stats() == {'kept': 2, 'dead': 2, 'unchecked': 1, 'duplicates': 0}
+
+
+def test_groups_follow_source_order_channels_follow_latency():
+    exporter = PlaylistExporter()
+    results = [(channel('Kino1', 'http://k/1', 'Кино'), ok(500), 3), (channel('News1', 'http://n/1'), ok(300), 0),
+               (channel('Kino2', 'http://k/2', 'Кино'), ok(100), 2), (channel('News2', 'http://n/2'), ok(100), 1)]
+    for ch, result, position in results: exporter.add(ch, result, position) # В порядке завершения проверок
+    assert urls(exporter) == ['http://n/2', 'http://n/1', 'http://k/2', 'http://k/1']
+
+
+def test_export_keeps_extinf_as_in_source(tmp_path):
+    source = ['#EXTINF:0 group-title="News" tvg-name="BBC" tvg-id="bbc.uk" catchup="default" catchup-days="3",BBC',
+              '#EXTVLCOPT:http-user-agent=Player/1.0', 'http://a.example/bbc',
+              '#EXTINF:-1 tvg-logo="l.png",Plain', '#EXTGRP:Movies', 'http://a.example/plain']
+    exporter = PlaylistExporter(epg_url='http://epg.example/epg.xml.gz')
+    for position, ch in enumerate(iter_m3u_channels(source)): exporter.add(ch, ok(100), position)
+    exporter.write(str(tmp_path / 'clean.m3u'))
+    with open(tmp_path / 'clean.m3u', encoding='utf-8') as f: lines = f.read().splitlines()
+    assert lines == ['#EXTM3U url-tvg="http://epg.example/epg.xml.gz"'] + source
+
+
+def test_export_writes_back_source_header():
+    header = {}; source = ['#EXTM3U x-tvg-url="http://epg.example/a.xml" catchup="shift" refresh="3600"', '#EXTINF:-1,BBC', 'http://a.example/bbc']
+    exporter = PlaylistExporter('http://epg.example/a.xml', header)
+    for ch in iter_m3u_channels(source, header): exporter.add(ch, ok(100))
+    assert list(exporter.iter_lines()) == source
+    assert format_m3u_header('http://epg.example/b.xml', {'catchup': 'shift'}) == '#EXTM3U url-tvg="http://epg.example/b.xml" catchup="shift"'
+    assert format_m3u_header() == '#EXTM3U'
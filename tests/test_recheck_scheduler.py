@@ -0,0 +1,49 @@
+# --- Адаптивное расписание перепроверок (часы - ManualClock) ---
+from recheck_scheduler import FAILED_RECHECK_MAX_MULTIPLE, MAX_RECHECK_INTERVAL_SECONDS, MIN_RECHECK_INTERVAL_SECONDS, ManualClock, RecheckScheduler, recheck_interval
+
+UP = {'outcome': 'ok'}
+DOWN = {'outcome': 'timeout'}
+
+
+def test_stable_channel_backs_off_to_ceiling():
+    assert recheck_interval([]) == MIN_RECHECK_INTERVAL_SECONDS
+    assert recheck_interval([UP]) == MIN_RECHECK_INTERVAL_SECONDS
+    assert recheck_interval([UP] * 4) == MIN_RECHECK_INTERVAL_SECONDS * 8
+    assert recheck_interval([UP] * 20) == MAX_RECHECK_INTERVAL_SECONDS
+
+
+def test_down_channel_does_not_back_off_like_healthy_one():
+    assert recheck_interval([DOWN]) == MIN_RECHECK_INTERVAL_SECONDS
+    assert recheck_interval([DOWN] * 2) == MIN_RECHECK_INTERVAL_SECONDS * 2
+    assert recheck_interval([DOWN] * 20) == MIN_RECHECK_INTERVAL_SECONDS * FAILED_RECHECK_MAX_MULTIPLE
+    assert recheck_interval([UP] * 20) == MAX_RECHECK_INTERVAL_SECONDS
+
+
+def test_flapping_and_failed_channels_are_checked_often():
+    assert recheck_interval([DOWN] + [UP] * 10) == MIN_RECHECK_INTERVAL_SECONDS
+    assert recheck_interval([UP, UP, UP, DOWN, UP, DOWN]) == MIN_RECHECK_INTERVAL_SECONDS
+    assert recheck_interval([UP] * 6 + [DOWN]) == MIN_RECHECK_INTERVAL_SECONDS * 32 / 2
+
+
+def test_pop_due_follows_clock_and_order():
+    clock = ManualClock(1000.0); scheduler = RecheckScheduler(clock=clock)
+    assert scheduler.schedule('new', []) == 1000.0
+    scheduler.schedule('stable', [dict(UP, checked_at=1000.0)] * 4) # +40 мин
+    scheduler.schedule('down', [dict(DOWN, checked_at=990.0)]) # +5 мин от последней проверки
+    assert scheduler.pop_due() == ['new'] and len(scheduler) == 2
+    clock.advance(MIN_RECHECK_INTERVAL_SECONDS)
+    assert scheduler.pop_due() == ['down']
+    assert scheduler.next_due() == 1000.0 + MIN_RECHECK_INTERVAL_SECONDS * 8
+    clock.advance(MIN_RECHECK_INTERVAL_SECONDS * 8)
+    assert scheduler.pop_due() == ['stable'] and scheduler.next_due() is None
+
+
+def test_reschedule_replaces_due_and_limit_takes_most_overdue():
+    clock = ManualClock(); scheduler = RecheckScheduler(clock=clock)
+    scheduler.schedule_at('a', 30); scheduler.schedule_at('b', 10); scheduler.schedule_at('c', 20)
+    scheduler.schedule_at('b', 50) # Старая запись в куче пропускается
+    scheduler.remove('c')
+    clock.advance(40)
+    assert scheduler.pop_due(limit=5) == ['a'] and 'b' in scheduler and 'c' not in scheduler
+    scheduler.schedule_at('d', 45); scheduler.schedule_at('e', 42); clock.advance(20)
+    assert scheduler.pop_due(limit=2) == ['e', 'd'] and scheduler.pop_due() == ['b']
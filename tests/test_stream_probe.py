@@ -0,0 +1,153 @@
+# --- Глубокая проверка HLS и проверка DASH на локальном сервере ---
+import http.server
+import time
+
+from host_pool import HostPool
+from stream_probe import DASH_LIVE_EDGE_SAFETY_SEGMENTS, check_stream, probe_dash, probe_hls
+
+MASTER = '''#EXTM3U
+#EXT-X-STREAM-INF:BANDWIDTH=2000000
+high.m3u8
+#EXT-X-STREAM-INF:BANDWIDTH=500000
+{low}
+'''
+
+
+def media_playlist(segments=3, program_time=None, endlist=False):
+    lines = ['#EXTM3U', '#EXT-X-TARGETDURATION:6', '#EXT-X-MEDIA-SEQUENCE:100']
+    if program_time is not None: lines.append('#EXT-X-PROGRAM-DATE-TIME:' + time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime(program_time)))
+    for index in range(segments): lines += ['#EXTINF:6.0,', f'seg{index}.ts']
+    if endlist: lines.append('#EXT-X-ENDLIST')
+    return "\n".join(lines) + "\n"
+
+
+def playlist_handler(documents, requested):
+    class Handler(http.server.BaseHTTPRequestHandler):
+        def do_GET(self):
+            requested.append(self.path); body = documents.get(self.path)
+            if body is None: self.send_error(404); return
+            body = body.encode('utf-8'); self.send_response(200); self.send_header('Content-Type', 'application/vnd.apple.mpegurl')
+            self.send_header('Content-Length', str(len(body))); self.end_headers(); self.wfile.write(body)
+
+        def log_message(self, *args): pass
+
+    return Handler
+
+
+def test_master_playlist_checks_lightest_variant(local_server):
+    requested = []
+    base = local_server(playlist_handler({'/live/master.m3u8': MASTER.format(low='low.m3u8'), '/live/low.m3u8': media_playlist(program_time=time.time() - 18)}, requested))
+    result = probe_hls(base + '/live/master.m3u8')
+    assert result['state'] == 'ok' and result['variant_url'] == base + '/live/low.m3u8'
+    assert result['segments'] == 3 and result['target_duration'] == 6 and result['media_sequence'] == 100
+    assert requested == ['/live/master.m3u8', '/live/low.m3u8'] and result['bytes_read'] > 0
+
+
+def test_empty_stale_and_missing_variant(local_server):
+    base = local_server(playlist_handler({'/empty.m3u8': media_playlist(segments=0), '/old.m3u8': media_playlist(program_time=time.time() - 3600),
+                                          '/vod.m3u8': media_playlist(program_time=time.time() - 3600, endlist=True),
+                                          '/broken.m3u8': MASTER.format(low='gone.m3u8'), '/page.m3u8': '<html></html>'}, []))
+    assert probe_hls(base + '/empty.m3u8')['state'] == 'empty'
+    assert probe_hls(base + '/old.m3u8')['state'] == 'stale'
+    assert probe_hls(base + '/vod.m3u8')['state'] == 'ok' # Запись (ENDLIST) не устаревает
+    broken = probe_hls(base + '/broken.m3u8')
+    assert broken['state'] == 'http_error' and broken['status_code'] == 404
+    assert probe_hls(base + '/page.m3u8')['state'] == 'invalid'
+
+
+def test_byte_budget_stops_download(local_server):
+    base = local_server(playlist_handler({'/big.m3u8': media_playlist(segments=2000)}, []))
+    result = probe_hls(base + '/big.m3u8', byte_budget=4096)
+    assert result['state'] == 'too_large' and 4096 < result['bytes_read'] <= 4096 + 1 # Сверх бюджета читается не больше байта
+    small = probe_hls(base + '/big.m3u8', byte_budget=len(media_playlist(segments=2000)))
+    assert small['state'] == 'ok' and small['bytes_read'] == len(media_playlist(segments=2000))
+
+
+def test_check_stream_deep_outcome(local_server):
+    base = local_server(playlist_handler({'/stale.m3u8': media_playlist(program_time=time.time() - 3600)}, []))
+    result = check_stream(base + '/stale.m3u8', deep=True, pool=HostPool())
+    assert result['outcome'] == 'stale' and result['kind'] == 'HLS' and result['status_code'] == 200
+    assert check_stream(base + '/stale.m3u8', deep=False, pool=HostPool())['kind'] is None # Без deep - только HEAD
+
+
+# --- DASH ---
+STATIC_MPD = '''<?xml version="1.0"?>
+<MPD xmlns="urn:mpeg:dash:schema:mpd:2011" type="static" mediaPresentationDuration="PT60S">
+  <Period><BaseURL>video/</BaseURL>
+    <AdaptationSet mimeType="video/mp4">
+      <SegmentTemplate media="seg-$RepresentationID$-$Number%05d$.m4s" initialization="init-$RepresentationID$.mp4" startNumber="1" duration="4" timescale="1"/>
+      <Representation id="v1" bandwidth="800000"/>
+    </AdaptationSet>
+  </Period>
+</MPD>'''
+
+DYNAMIC_MPD = '''<?xml version="1.0"?>
+<MPD xmlns="urn:mpeg:dash:schema:mpd:2011" type="dynamic" availabilityStartTime="{start}" publishTime="{start}">
+  <Period start="PT0S">
+    <AdaptationSet mimeType="video/mp4">
+      <Representation id="live" bandwidth="500000">
+        <SegmentTemplate media="live/$Number$.m4s" startNumber="10" duration="4000" timescale="1000"/>
+      </Representation>
+    </AdaptationSet>
+  </Period>
+</MPD>'''
+
+TIMELINE_MPD = '''<?xml version="1.0"?>
+<MPD xmlns="urn:mpeg:dash:schema:mpd:2011" type="dynamic" availabilityStartTime="1970-01-01T00:00:00Z">
+  <Period>
+    <AdaptationSet mimeType="video/mp4">
+      <SegmentTemplate media="chunk-$RepresentationID$-$Time$.m4s" timescale="90000" startNumber="5">
+        <SegmentTimeline><S t="9000" d="1800" r="2"/><S d="1800"/></SegmentTimeline>
+      </SegmentTemplate>
+      <Representation id="tl" bandwidth="300000"/>
+    </AdaptationSet>
+  </Period>
+</MPD>'''
+
+
+def dash_handler(manifests, requested, missing=()):
+    class Handler(http.server.BaseHTTPRequestHandler):
+        def do_GET(self):
+            requested.append(self.path)
+            if self.path in manifests: body = manifests[self.path].encode('utf-8'); status = 200
+            elif self.path.endswith('.m4s') and self.path not in missing: body = b'\0' * 1024; status = 206
+            else: self.send_error(404); return
+            self.send_response(status); self.send_header('Content-Length', str(len(body))); self.end_headers(); self.wfile.write(body)
+
+        def log_message(self, *args): pass
+
+    return Handler
+
+
+def test_static_mpd_uses_first_segment_of_template(local_server):
+    requested = []
+    base = local_server(dash_handler({'/dash/static.mpd': STATIC_MPD}, requested))
+    result = probe_dash(base + '/dash/static.mpd')
+    assert result['state'] == 'ok' and result['mpd_type'] == 'static'
+    assert result['segment_url'] == base + '/dash/video/seg-v1-00001.m4s' and result['segment_status'] == 206
+    assert requested == ['/dash/static.mpd', '/dash/video/seg-v1-00001.m4s'] and result['bytes_read'] == len(STATIC_MPD) + 1024
+
+
+def test_dynamic_mpd_number_follows_availability_window(local_server):
+    start = int(time.time()) - 1002 # Середина сегмента: номер не поменяется за время теста
+    manifest = DYNAMIC_MPD.format(start=time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime(start)))
+    base = local_server(dash_handler({'/live.mpd': manifest}, []))
+    result = probe_dash(base + '/live.mpd')
+    # 1002 с / 4 с = 250 сегментов от startNumber=10, минус запас от края живого потока
+    assert result['mpd_type'] == 'dynamic' and result['segment_url'] == base + f'/live/{10 + 250 - DASH_LIVE_EDGE_SAFETY_SEGMENTS}.m4s'
+    assert result['state'] == 'ok'
+
+
+def test_segment_timeline_picks_latest_segment(local_server):
+    base = local_server(dash_handler({'/tl.mpd': TIMELINE_MPD}, [], missing=('/chunk-tl-14400.m4s',)))
+    result = probe_dash(base + '/tl.mpd')
+    assert result['segment_url'] == base + '/chunk-tl-14400.m4s' # t = 9000 + 3 * 1800
+    assert result['state'] == 'segment_error' and result['segment_status'] == 404
+
+
+def test_mpd_byte_budget(local_server):
+    padded = STATIC_MPD.replace('<Period>', '<!--' + 'x' * 20000 + '--><Period>')
+    base = local_server(dash_handler({'/big.mpd': padded}, []))
+    result = probe_dash(base + '/big.mpd', byte_budget=4096)
+    assert result['state'] == 'too_large' and 4096 < result['bytes_read'] <= 4096 + 1 and result['segment_url'] is None
+    assert check_stream(base + '/big.mpd', byte_budget=4096, pool=HostPool())['outcome'] == 'too_large'